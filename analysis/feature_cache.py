@@ -0,0 +1,162 @@
+"""
+Caché de rasgos derivados por detección
+
+Entre inferencias el worker reenvía la última pose (confianza
+'interpolated' o 'fading') con el mismo detection_frame, y varios
+consumidores (reconocimiento de stance, análisis del stance elegido,
+overlay) derivan lo mismo de cada pose. FeatureCache guarda un
+FrameFeatures por detección: puntos clave, rasgos de stance y puntos del
+overlay se calculan la primera vez que alguien los pide, y los resultados
+de cada consumidor se memorizan con cached(), de modo que una pose
+repetida reutiliza el análisis completo.
+
+Los analizadores de golpes, patadas y katas no pasan por aquí: trabajan
+con la cinemática de cada detección nueva (velocidades en el tiempo, en
+torsos y con la escala del frame), no con la geometría de una pose suelta.
+
+Las medidas están en coordenadas normalizadas de MediaPipe, igual que en
+StanceAnalyzer.
+
+Ejecutar `python -m analysis.feature_cache` compara el coste de una pose
+nueva y de una repetida.
+"""
+import math
+import time
+from collections import OrderedDict
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .stance_analyzer import StanceAnalyzer, frame_stance_features
+
+
+class FrameFeatures:
+    """Rasgos de una detección, calculados bajo demanda una sola vez"""
+
+    def __init__(self, key, landmarks: np.ndarray, analyzer: StanceAnalyzer):
+        self.key = key
+        self.landmarks = landmarks
+        self.analyzer = analyzer
+        self._values: Dict[Any, Any] = {}
+
+    def __contains__(self, name) -> bool:
+        return name in self._values
+
+    def cached(self, name, compute: Callable[[], Any]) -> Any:
+        """Valor memorizado bajo name, calculado con compute() la primera vez"""
+        try:
+            return self._values[name]
+        except KeyError:
+            value = self._values[name] = compute()
+            return value
+
+    @property
+    def key_points(self) -> Optional[np.ndarray]:
+        """Puntos clave (10, 3) de StanceAnalyzer"""
+        return self.cached('key_points', lambda: self.analyzer.key_point_array(self.landmarks))
+
+    @property
+    def stance_features(self) -> Optional[Dict]:
+        """Rasgos de stance del frame (frame_stance_features), None sin puntos clave"""
+        def compute():
+            points = self.key_points
+            if points is None or points.ndim != 2:
+                return None
+            return frame_stance_features(points)
+        return self.cached('stance_features', compute)
+
+    def overlay_points(self, min_visibility: float = 0.3) -> List[Optional[Tuple[float, float]]]:
+        """Puntos (x, y) normalizados para el overlay (None si poco visibles)"""
+        def compute():
+            points = self.landmarks[:, :2].tolist()
+            visible = (self.landmarks[:, 3] > min_visibility).tolist()
+            return [tuple(point) if seen else None for point, seen in zip(points, visible)]
+        return self.cached(('overlay_points', min_visibility), compute)
+
+
+class FeatureCache:
+    """FrameFeatures de las últimas detecciones, por (detection_frame, detection_timestamp)"""
+
+    def __init__(self, analyzer: Optional[StanceAnalyzer] = None, capacity: int = 4):
+        self.analyzer = analyzer or StanceAnalyzer()
+        self.capacity = capacity
+        self._entries: 'OrderedDict[Any, FrameFeatures]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """Olvida todas las detecciones"""
+        self._entries.clear()
+
+    def lookup(self, result: Dict) -> Optional[FrameFeatures]:
+        """
+        Rasgos de la detección de un resultado del worker, o None sin pose.
+        El timestamp de la detección forma parte de la clave porque el
+        contador de frames vuelve a 0 si el worker se reinicia.
+        """
+        landmarks = result.get('landmarks')
+        if not result.get('pose_detected') or landmarks is None:
+            return None
+        detection_frame = result.get('detection_frame')
+        if detection_frame is None:
+            # Sin identificador de detección (modo pipe): no se puede reutilizar
+            self.misses += 1
+            return FrameFeatures(None, landmarks, self.analyzer)
+
+        key = (detection_frame, result.get('detection_timestamp'))
+        features = self._entries.get(key)
+        if features is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return features
+
+        self.misses += 1
+        features = self._entries[key] = FrameFeatures(key, landmarks, self.analyzer)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return features
+
+
+def benchmark(iterations: int = 2000) -> Dict[str, float]:
+    """
+    Coste en µs de reconocer y analizar el stance de una pose: sin caché,
+    con la primera consulta de una detección y con una pose repetida
+    """
+    from .stance_classifier import StanceClassifier
+
+    landmarks = np.random.default_rng(0).uniform(0, 1, (33, 4)).astype(np.float32)
+    cache = FeatureCache()
+    classifier = StanceClassifier(cache.analyzer)
+
+    def consume(features):
+        features.cached('scores', lambda: classifier.score_features(
+            features.key_points, features.stance_features))
+        features.cached('metrics', lambda: cache.analyzer.analyze_stance(
+            'sanchin-dachi', features.landmarks, features.stance_features))
+        features.overlay_points()
+
+    def per_call(function):
+        best = math.inf
+        for _ in range(3):
+            start = time.perf_counter()
+            for index in range(iterations):
+                function(index)
+            best = min(best, (time.perf_counter() - start) / iterations)
+        return best * 1e6
+
+    def uncached(index):
+        classifier.score_frame(landmarks)
+        cache.analyzer.analyze_stance('sanchin-dachi', landmarks)
+
+    return {
+        'sin caché': per_call(uncached),
+        'detección nueva': per_call(lambda index: consume(cache.lookup(
+            {'pose_detected': True, 'landmarks': landmarks, 'detection_frame': index,
+             'detection_timestamp': float(index)}))),
+        'pose repetida': per_call(lambda index: consume(cache.lookup(
+            {'pose_detected': True, 'landmarks': landmarks, 'detection_frame': 0,
+             'detection_timestamp': 0.0}))),
+    }
+
+
+if __name__ == '__main__':
+    for name, microseconds in benchmark().items():
+        print(f"{name:<20} {microseconds:8.2f} µs/frame")
@@ -0,0 +1,312 @@
+"""
+Alineamiento en línea de katas contra una ejecución de referencia
+
+La pose de cada frame se reduce a un vector de rasgos normalizado (12
+articulaciones en el plano de la imagen, centradas en la cadera y
+escaladas por el torso) y se compara con la secuencia de referencia con
+un DTW en línea de banda fija: cada frame añade una columna de la matriz
+de costes acumulados, calculada solo dentro de una banda alrededor de la
+posición actual en la referencia, con un coste O(banda) y sin recalcular
+la matriz completa.
+
+Los pasos permitidos son (i-1, j), (i-1, j-1) y (i-1, j-2): la ejecución
+en vivo puede ir tan lenta como quiera y hasta el doble de rápida que la
+referencia. Al no haber pasos horizontales, cada columna depende solo de
+la anterior y se calcula con operaciones vectorizadas; además todos los
+caminos hasta la columna i tienen i + 1 celdas, así que sus costes
+acumulados son comparables y la posición actual es el mínimo de la
+columna.
+
+Ejecutar `python -m analysis.kata_alignment` alinea una kata sintética
+ejecutada a velocidad variable y mide el coste por frame.
+"""
+import json
+import math
+import os
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .stance_analyzer import GRADES, LOWEST_GRADE, _row_dot
+
+
+# Articulaciones comparadas (índices MediaPipe)
+KATA_POINT_INDICES = {
+    'left_shoulder': 11, 'right_shoulder': 12,
+    'left_elbow': 13, 'right_elbow': 14,
+    'left_wrist': 15, 'right_wrist': 16,
+    'left_hip': 23, 'right_hip': 24,
+    'left_knee': 25, 'right_knee': 26,
+    'left_ankle': 27, 'right_ankle': 28,
+}
+_KATA_ROWS = np.array(list(KATA_POINT_INDICES.values()), dtype=np.intp)
+FEATURE_SIZE = 2 * len(_KATA_ROWS)
+
+# Directorio de las ejecuciones de referencia (<kata>.npz de analyze_video.py)
+KATA_REFERENCE_DIRECTORY = 'data/references/katas'
+
+
+def pose_features(landmarks: np.ndarray, aspect_ratio: float = 480 / 640) -> np.ndarray:
+    """
+    Vectores de rasgos (..., 24) de landmarks (..., 33, 4): x, y de las
+    articulaciones de KATA_POINT_INDICES relativas al centro de la cadera
+    y divididas por la longitud del torso. NaN si el torso es degenerado.
+    """
+    planar = landmarks[..., _KATA_ROWS, :2].astype(np.float64)
+    planar[..., 1] *= aspect_ratio
+    hip_center = (planar[..., 6, :] + planar[..., 7, :]) / 2
+    shoulder_center = (planar[..., 0, :] + planar[..., 1, :]) / 2
+    torso = np.sqrt(((shoulder_center - hip_center) ** 2).sum(axis=-1))
+    torso = np.where(torso > 0, torso, np.nan)
+    shape = (planar - hip_center[..., None, :]) / torso[..., None, None]
+    return shape.reshape(shape.shape[:-2] + (FEATURE_SIZE,))
+
+
+def _frame_features(landmarks: np.ndarray, aspect_ratio: float) -> Optional[np.ndarray]:
+    """pose_features() de un solo frame (floats de Python para el torso), None si es degenerado"""
+    planar = landmarks[_KATA_ROWS, :2].astype(np.float64)
+    torso_points = planar[[0, 1, 6, 7]].tolist()
+    (ls_x, ls_y), (rs_x, rs_y), (lh_x, lh_y), (rh_x, rh_y) = torso_points
+    hip_x, hip_y = (lh_x + rh_x) / 2, (lh_y + rh_y) / 2
+    torso = math.hypot((ls_x + rs_x) / 2 - hip_x, ((ls_y + rs_y) / 2 - hip_y) * aspect_ratio)
+    if not torso > 0:
+        return None
+    features = ((planar - (hip_x, hip_y)) * (1 / torso, aspect_ratio / torso)).reshape(FEATURE_SIZE)
+    return features if np.isfinite(features).all() else None
+
+
+class KataReference:
+    """Ejecución de referencia de una kata: rasgos por frame y tramos con nombre"""
+
+    def __init__(self, name: str, timestamps: np.ndarray, features: np.ndarray,
+                 segments: Optional[List[Tuple[str, int, int]]] = None,
+                 segment_seconds: float = 2.0):
+        valid = np.isfinite(features).all(axis=1)
+        if not valid.any():
+            raise ValueError(f"La referencia de {name} no tiene frames con pose")
+        self.name = name
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)[valid]
+        self.features = np.ascontiguousarray(features[valid], dtype=np.float64)
+        # Tramos (nombre, frame inicial, frame final exclusivo); por defecto,
+        # trozos de segment_seconds
+        if segments is None:
+            bounds = np.searchsorted(self.timestamps, np.arange(
+                self.timestamps[0], self.timestamps[-1], segment_seconds))
+            bounds = list(bounds) + [len(self.timestamps)]
+            segments = [(f"tramo {index + 1}", int(start), int(stop))
+                        for index, (start, stop) in enumerate(zip(bounds, bounds[1:]))
+                        if stop > start]
+        self.segments = segments
+        self.segment_index = np.zeros(len(self.timestamps), dtype=np.intp)
+        for index, (_, start, stop) in enumerate(segments):
+            self.segment_index[start:stop] = index
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_landmarks(cls, name: str, timestamps: np.ndarray, landmarks: np.ndarray,
+                       aspect_ratio: float = 480 / 640, **kwargs) -> 'KataReference':
+        """Referencia a partir de landmarks (T, 33, 4) (NaN en frames sin pose)"""
+        return cls(name, timestamps, pose_features(landmarks, aspect_ratio), **kwargs)
+
+    @classmethod
+    def load(cls, path: str, name: Optional[str] = None,
+             aspect_ratio: float = 480 / 640) -> 'KataReference':
+        """
+        Carga una pista de landmarks guardada por analyze_video.py (.npz).
+        Los rasgos usan la relación de aspecto del video de la pista (la
+        de la cámara en vivo puede ser otra); aspect_ratio solo se usa con
+        pistas antiguas que no guardan el tamaño del video.
+        Un .json con el mismo nombre puede definir los tramos:
+        {"segments": [{"name": ..., "start": s, "end": s}, ...]} en segundos.
+        """
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        with np.load(path) as data:
+            if 'frame_width' in data and int(data['frame_width']) > 0:
+                aspect_ratio = int(data['frame_height']) / int(data['frame_width'])
+            reference = cls.from_landmarks(name, data['timestamp'], data['landmarks'],
+                                           aspect_ratio)
+        segments_path = os.path.splitext(path)[0] + '.json'
+        if os.path.exists(segments_path):
+            with open(segments_path, 'r') as f:
+                definitions = json.load(f).get('segments', [])
+            times = reference.timestamps
+            segments = [(item['name'], int(np.searchsorted(times, item['start'])),
+                         int(np.searchsorted(times, item['end'])))
+                        for item in definitions]
+            reference = cls(name, times, reference.features,
+                            [segment for segment in segments if segment[2] > segment[1]])
+        return reference
+
+
+class KataAligner:
+    """DTW en línea de banda fija entre la pose en vivo y una KataReference"""
+
+    def __init__(self, reference: KataReference, band: int = 30,
+                 aspect_ratio: float = 480 / 640, cost_tolerance: float = 0.5):
+        self.reference = reference
+        # Semianchura de la banda en frames de la referencia
+        self.band = band
+        self.aspect_ratio = aspect_ratio
+        # Distancia RMS (torsos) a la que la puntuación de un frame llega a 0
+        self.cost_tolerance = cost_tolerance
+        # Dos columnas de costes acumulados (anterior y actual), con dos
+        # celdas de relleno a la izquierda para los pasos j-1 y j-2
+        self._columns = np.full((2, len(reference) + 2), np.inf)
+        self.reset()
+
+    def reset(self):
+        """Vuelve al principio de la kata"""
+        self._columns.fill(np.inf)
+        self._windows = [(0, 0), (0, 0)]   # Tramo [lo, hi) escrito en cada columna
+        self._current = 0
+        self.frames = 0
+        self.position = 0
+        self.start_time = None
+        self.segment_sums = [0.0] * len(self.reference.segments)
+        self.segment_counts = [0] * len(self.reference.segments)
+        self._segment_costs = {}
+
+    @property
+    def finished(self) -> bool:
+        """True cuando la alineación ha llegado al último frame de la referencia"""
+        return self.position == len(self.reference) - 1
+
+    def update(self, timestamp: float, landmarks: np.ndarray) -> Optional[Dict]:
+        """
+        Añade un frame (landmarks (33, 4)) y devuelve el estado de la
+        alineación, o None si la pose no sirve: {'kata', 'position',
+        'progress', 'reference_time', 'timing_offset', 'cost', 'score',
+        'grade', 'segment', 'segment_costs', 'finished'}. timing_offset es el
+        retraso (s) respecto a la referencia (negativo si va adelantada).
+        """
+        features = _frame_features(landmarks, self.aspect_ratio)
+        if features is None:
+            return None
+        reference = self.reference
+        count = len(reference)
+
+        previous = self._columns[self._current]
+        previous_lo, previous_hi = self._windows[self._current]
+        self._current ^= 1
+        column = self._columns[self._current]
+        # Limpiar solo lo que escribió esta columna hace dos frames: O(banda)
+        old_lo, old_hi = self._windows[self._current]
+        column[old_lo + 2:old_hi + 2] = np.inf
+
+        if self.frames == 0:
+            # La kata empieza en el primer frame de la referencia
+            lo, hi = 0, 1
+        else:
+            lo = max(previous_lo, self.position - self.band)
+            hi = min(previous_hi + 2, count, self.position + self.band + 1)
+        difference = reference.features[lo:hi] - features
+        costs = np.sqrt(_row_dot(difference, difference) / len(_KATA_ROWS))
+        if self.frames == 0:
+            column[2] = costs[0]
+            self.start_time = timestamp
+        else:
+            best = np.minimum(np.minimum(previous[lo + 2:hi + 2], previous[lo + 1:hi + 1]),
+                              previous[lo:hi])
+            column[lo + 2:hi + 2] = costs + best
+        self._windows[self._current] = (lo, hi)
+        self.frames += 1
+
+        offset = int(np.argmin(column[lo + 2:hi + 2]))
+        self.position = position = lo + offset
+        cost = float(costs[offset])
+        segment = int(reference.segment_index[position])
+        self.segment_sums[segment] += cost
+        self.segment_counts[segment] += 1
+        name = reference.segments[segment][0]
+        self._segment_costs[name] = self.segment_sums[segment] / self.segment_counts[segment]
+
+        reference_time = reference.timestamps[position] - reference.timestamps[0]
+        score = 100 * max(0.0, 1 - cost / self.cost_tolerance)
+        return {
+            'kata': reference.name,
+            'position': position,
+            'progress': position / max(count - 1, 1),
+            'reference_time': float(reference_time),
+            'timing_offset': float(timestamp - self.start_time - reference_time),
+            'cost': cost,
+            'score': score,
+            'grade': next((grade for threshold, grade in GRADES if score >= threshold), LOWEST_GRADE),
+            'segment': name,
+            'segment_costs': self.segment_costs(),
+            'finished': self.finished,
+        }
+
+    def segment_costs(self) -> Dict[str, float]:
+        """Coste medio (distancia RMS en torsos) de los frames alineados con cada tramo"""
+        return dict(self._segment_costs)
+
+
+def synthetic_kata(seconds: float = 20.0, fps: float = 30.0, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Kata sintética: (timestamps, landmarks (T, 33, 4)) con las
+    articulaciones oscilando suavemente alrededor de una pose de pie.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(int(seconds * fps)) / fps
+    landmarks = np.zeros((len(timestamps), 33, 4))
+    landmarks[:, :, 3] = 1.0
+    base = {11: (0.45, 0.30), 12: (0.55, 0.30), 13: (0.42, 0.42), 14: (0.58, 0.42),
+            15: (0.42, 0.52), 16: (0.58, 0.52), 23: (0.46, 0.55), 24: (0.54, 0.55),
+            25: (0.45, 0.72), 26: (0.55, 0.72), 27: (0.45, 0.90), 28: (0.55, 0.90)}
+    for index, (x, y) in base.items():
+        # Brazos y piernas se mueven más que el tronco
+        amplitude = 0.08 if index in (13, 14, 15, 16, 25, 26, 27, 28) else 0.01
+        frequencies = rng.uniform(0.1, 0.5, (2, 3))
+        phases = rng.uniform(0, 2 * np.pi, (2, 3))
+        for axis, center in enumerate((x, y)):
+            motion = np.sin(2 * np.pi * frequencies[axis] * timestamps[:, None] + phases[axis]).sum(axis=1)
+            landmarks[:, index, axis] = center + amplitude * motion / 3
+    return timestamps, landmarks.astype(np.float32)
+
+
+def benchmark(band: int = 30) -> Dict[str, float]:
+    """
+    Alinea la kata sintética ejecutada con velocidad variable (0.7x-1.3x)
+    y ruido; devuelve el coste por frame y el error de posición (frames de
+    la referencia) y del retraso estimado (s).
+    """
+    fps = 30.0
+    timestamps, landmarks = synthetic_kata(fps=fps)
+    reference = KataReference.from_landmarks('sintética', timestamps, landmarks)
+
+    # Ejecución en vivo: el tiempo de referencia avanza a velocidad variable
+    live_times = np.arange(int(25 * fps)) / fps
+    speed = 1 + 0.3 * np.sin(2 * np.pi * live_times / 9)
+    reference_times = np.minimum(np.cumsum(speed) / fps - speed[0] / fps, timestamps[-1])
+    live = np.empty((len(live_times), 33, 4), dtype=np.float32)
+    for joint in range(33):
+        for axis in range(4):
+            live[:, joint, axis] = np.interp(reference_times, timestamps, landmarks[:, joint, axis])
+    live[:, :, :2] += np.random.default_rng(1).normal(0, 0.004, live[:, :, :2].shape)
+
+    aligner = KataAligner(reference, band=band)
+    best, positions, offsets = math.inf, [], []
+    for _ in range(3):
+        aligner.reset()
+        positions, offsets = [], []
+        start = time.perf_counter()
+        for timestamp, frame in zip(live_times, live):
+            state = aligner.update(timestamp, frame)
+            positions.append(state['position'])
+            offsets.append(state['timing_offset'])
+        best = min(best, (time.perf_counter() - start) / len(live_times))
+
+    true_positions = reference_times * fps
+    true_offsets = live_times - reference_times
+    return {
+        'µs/frame': best * 1e6,
+        'error posición (frames)': float(np.mean(np.abs(np.array(positions) - true_positions))),
+        'error retraso (s)': float(np.mean(np.abs(np.array(offsets) - true_offsets))),
+        'tramos': len(aligner.segment_costs()),
+    }
+
+
+if __name__ == '__main__':
+    for name, value in benchmark().items():
+        print(f"{name:<26} {value:8.3f}")
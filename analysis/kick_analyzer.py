@@ -0,0 +1,345 @@
+"""
+Analizador incremental de patadas (mae-geri, yoko-geri, mawashi-geri,
+kansetsu-geri) con métricas de equilibrio
+
+Cada frame se añade a un KinematicsBuffer con hombros, caderas, rodillas
+y tobillos. El centro de masas horizontal sale de un producto con pesos
+segmentarios fijos y su balanceo (desviación típica en una ventana
+deslizante) se mantiene con sumas acumuladas en O(1). Una máquina de
+estados por pierna detecta la patada (el tobillo sube por encima del de
+apoyo) y su final (vuelve al suelo); solo entonces se recorre el tramo de
+la patada en el buffer para calcular sus métricas. Con TechniqueSegmenter,
+push() solo llena el buffer y analyze_segment() mide los segmentos de la
+pierna que este publica.
+
+Las distancias se miden en longitudes de torso y se pasan a metros con
+REFERENCE_TORSO_LENGTH (ver kinematics.py).
+
+Ejecutar `python -m analysis.kick_analyzer` analiza patadas sintéticas
+y mide el coste por frame.
+"""
+import math
+import time
+from collections import deque
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .kinematics import REFERENCE_TORSO_LENGTH, KinematicsBuffer, torso_length
+
+
+# Puntos seguidos (índices MediaPipe) en el orden del buffer
+KICK_POINT_INDICES = {
+    'left_shoulder': 11, 'right_shoulder': 12,
+    'left_hip': 23, 'right_hip': 24,
+    'left_knee': 25, 'right_knee': 26,
+    'left_ankle': 27, 'right_ankle': 28,
+}
+_KICK_ROWS = np.array(list(KICK_POINT_INDICES.values()), dtype=np.intp)
+_SHOULDER, _HIP, _KNEE, _ANKLE = 0, 2, 4, 6   # + 0 izquierda, + 1 derecha
+LEGS = ('left', 'right')
+
+
+def _center_of_mass_weights() -> np.ndarray:
+    """
+    Pesos (8,) de los puntos seguidos para el centro de masas, a partir de
+    las fracciones de masa y posición del centro de cada segmento de
+    Dempster (Winter, 2009): cabeza-brazos-tronco, muslos y piernas.
+    """
+    weights = np.zeros(len(_KICK_ROWS))
+    for side in (0, 1):
+        # Cabeza, brazos y tronco (0.578, centro al 62.6 % desde el hombro)
+        weights[_SHOULDER + side] += 0.578 / 2 * 0.374
+        weights[_HIP + side] += 0.578 / 2 * 0.626
+        # Muslo (0.100, centro al 43.3 % desde la cadera)
+        weights[_HIP + side] += 0.100 * 0.567
+        weights[_KNEE + side] += 0.100 * 0.433
+        # Pierna y pie (0.061, centro al 60.6 % desde la rodilla)
+        weights[_KNEE + side] += 0.061 * 0.394
+        weights[_ANKLE + side] += 0.061 * 0.606
+    return weights / weights.sum()
+
+
+COM_WEIGHTS = _center_of_mass_weights()
+
+
+def _joint_angle(first: np.ndarray, vertex: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """Ángulo (grados) en vertex de las series de puntos (n, 3)"""
+    a, b = first - vertex, last - vertex
+    cosine = (a * b).sum(axis=1) / np.maximum(
+        np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+class KickAnalyzer:
+    """Detecta patadas en el flujo de landmarks y mide cada una al terminar"""
+
+    def __init__(self, aspect_ratio: float = 480 / 640, start_lift: float = 0.25,
+                 end_lift: float = 0.1, min_peak_lift: float = 0.8,
+                 max_duration: float = 2.0, sway_window: float = 0.5,
+                 sway_tolerance: float = 0.1, capacity: int = 180, window: int = 5):
+        # Alto / ancho del frame: x e y normalizados pasan a la misma escala
+        self.aspect_ratio = aspect_ratio
+        # Altura del tobillo sobre el de apoyo (torsos): inicio, fin y pico mínimo
+        self.start_lift = start_lift
+        self.end_lift = end_lift
+        self.min_peak_lift = min_peak_lift
+        self.max_duration = max_duration
+        # Balanceo: ventana deslizante (s) y desviación (torsos) con estabilidad 0
+        self.sway_window = sway_window
+        self.sway_tolerance = sway_tolerance
+        # 180 frames: 3 s a 60 fps, más que la patada más larga
+        self.buffer = KinematicsBuffer(len(_KICK_ROWS), capacity=capacity,
+                                       window=window, polyorder=2)
+        # Balanceo de cada frame del buffer: (timestamp, torsos)
+        self.sway_history = deque(maxlen=capacity)
+        self.reset()
+
+    def reset(self):
+        """Olvida el historial y las patadas en curso"""
+        self.buffer.reset()
+        self._reset_sway()
+        # Patada en curso por pierna: None o [frame inicial, timestamp inicial,
+        # elevación máxima, balanceo máximo]
+        self._active = [None, None]
+
+    def _reset_sway(self):
+        # Ventana del centro de masas horizontal: (timestamp, x) con sumas acumuladas
+        self._sway_samples = []
+        self._sway_start = 0
+        self._sway_sum = 0.0
+        self._sway_squares = 0.0
+        self._last_sway = 0.0
+        self.sway_history.clear()
+
+    def _update_sway(self, timestamp: float, com_x: float) -> float:
+        """Añade una muestra y devuelve la desviación típica de la ventana"""
+        samples = self._sway_samples
+        samples.append((timestamp, com_x))
+        self._sway_sum += com_x
+        self._sway_squares += com_x * com_x
+        while timestamp - samples[self._sway_start][0] > self.sway_window:
+            old = samples[self._sway_start][1]
+            self._sway_sum -= old
+            self._sway_squares -= old * old
+            self._sway_start += 1
+        if self._sway_start > 256:
+            # Compactar de vez en cuando en vez de desplazar la lista en cada frame
+            del samples[:self._sway_start]
+            self._sway_start = 0
+        count = len(samples) - self._sway_start
+        mean = self._sway_sum / count
+        return math.sqrt(max(0.0, self._sway_squares / count - mean * mean))
+
+    @property
+    def sway(self) -> float:
+        """Balanceo actual del centro de masas (torsos), 0 sin historial"""
+        return self._last_sway
+
+    def push(self, timestamp: float, landmarks: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Añade un frame (landmarks (33, 4) de una detección nueva) al buffer
+        y al balanceo, y devuelve sus estimaciones (3, P, 3), o None sin
+        ventana completa o con el torso degenerado.
+        """
+        points = landmarks[_KICK_ROWS, :3].astype(np.float64)
+        points[:, 1] *= self.aspect_ratio
+        state = self.buffer.push(timestamp, points)
+        if self.buffer.count == 1:
+            # Hueco: el historial se reinició
+            self._active = [None, None]
+            self._reset_sway()
+        if not self.buffer.ready:
+            return None
+
+        position = state[0]
+        self._torso = torso = float(torso_length(position, _SHOULDER, _HIP))
+        if not torso > 0:
+            return None
+        sway = self._update_sway(timestamp, float(COM_WEIGHTS @ position[:, 0])) / torso
+        self._last_sway = sway
+        self.sway_history.append((timestamp, sway))
+        return state
+
+    def analyze_segment(self, segment: Dict) -> List[Dict]:
+        """
+        Métricas del segmento de TechniqueSegmenter (lista vacía si no es
+        de una pierna o el tobillo no subió lo suficiente).
+        """
+        limb = segment['limb']
+        if not limb.endswith('_leg'):
+            return []
+        leg = LEGS.index(limb[:-len('_leg')])
+        start, end = segment['start_time'], segment['end_time']
+        times, states = self.buffer.span(start, end)
+        if len(times) < 3:
+            return []
+        position = states[:, 0]
+        lift = ((position[:, _ANKLE + 1 - leg, 1] - position[:, _ANKLE + leg, 1]) /
+                torso_length(position, _SHOULDER, _HIP))
+        if not np.nanmax(lift) >= self.min_peak_lift:
+            return []
+        max_sway = max((sway for timestamp, sway in self.sway_history
+                        if start <= timestamp <= end), default=0.0)
+        kick = self._kick_metrics(leg, times, states, max_sway)
+        return [kick] if kick is not None else []
+
+    def update(self, timestamp: float, landmarks: np.ndarray) -> List[Dict]:
+        """
+        Añade un frame (landmarks (33, 4) de una detección nueva) y devuelve
+        las métricas de las patadas que terminan en él (normalmente ninguna),
+        detectadas por la máquina de estados propia.
+        """
+        state = self.push(timestamp, landmarks)
+        if state is None:
+            return []
+
+        position, torso, sway = state[0], self._torso, self._last_sway
+
+        ankle_y = position[_ANKLE:_ANKLE + 2, 1].tolist()
+        kicks = []
+        frame = self.buffer.total
+        for leg in (0, 1):
+            # y crece hacia abajo: elevación del tobillo sobre el de apoyo
+            lift = (ankle_y[1 - leg] - ankle_y[leg]) / torso
+            active = self._active[leg]
+
+            if active is None:
+                if lift >= self.start_lift and self._active[1 - leg] is None:
+                    self._active[leg] = [frame, timestamp, lift, sway]
+                continue
+
+            active[2] = max(active[2], lift)
+            active[3] = max(active[3], sway)
+            if timestamp - active[1] > self.max_duration:
+                # Pierna levantada demasiado tiempo para una patada: descartar
+                self._active[leg] = None
+            elif lift < self.end_lift:
+                self._active[leg] = None
+                if active[2] >= self.min_peak_lift:
+                    kick = self._kick_metrics(leg, *self.buffer.history(frame - active[0] + 2),
+                                              active[3])
+                    if kick is not None:
+                        kicks.append(kick)
+        return kicks
+
+    def _kick_metrics(self, leg: int, times: np.ndarray, states: np.ndarray,
+                      max_sway: float) -> Optional[Dict]:
+        """
+        Métricas de la patada de la pierna indicada a partir de su tramo del
+        buffer, con el balanceo máximo (torsos) medido durante la patada.
+        """
+        position, velocity = states[:, 0], states[:, 1]
+        valid = ~np.isnan(velocity[:, _ANKLE + leg, 0])
+        times, position, velocity = times[valid], position[valid], velocity[valid]
+        if len(times) < 3:
+            return None
+        torso = np.median(torso_length(position, _SHOULDER, _HIP))
+        scale = REFERENCE_TORSO_LENGTH / torso
+        support = 1 - leg
+
+        shoulder, hip = position[:, _SHOULDER + leg], position[:, _HIP + leg]
+        knee, ankle = position[:, _KNEE + leg], position[:, _ANKLE + leg]
+
+        # Altura del tobillo respecto a la cadera (positiva por encima)
+        ankle_height = hip[:, 1] - ankle[:, 1]
+
+        # Rodilla (cadera-rodilla-tobillo) y cadera (hombro-cadera-rodilla)
+        knee_angle = _joint_angle(hip, knee, ankle)
+        hip_angle = _joint_angle(shoulder, hip, knee)
+        knee_angular_velocity = np.abs(np.gradient(knee_angle, times))
+        hip_angular_velocity = np.abs(np.gradient(hip_angle, times))
+
+        # Centro de masas horizontal frente al tobillo de apoyo
+        com_x = position[:, :, 0] @ COM_WEIGHTS
+        com_offset = np.abs(com_x - position[:, _ANKLE + support, 0])
+        stability = max(0.0, 1 - max_sway / self.sway_tolerance)
+
+        return {
+            'kicking_leg': LEGS[leg],
+            'timestamp': float(times[-1]),
+            'duration': float(times[-1] - times[0]),
+            'max_ankle_height': float(ankle_height.max() * scale),          # m
+            'knee_extension': float(knee_angle.max()),                      # grados
+            'peak_knee_angular_velocity': float(knee_angular_velocity.max()),  # grados/s
+            'peak_hip_angular_velocity': float(hip_angular_velocity.max()),
+            'peak_foot_speed': float(np.linalg.norm(velocity[:, _ANKLE + leg], axis=1).max() * scale),
+            'support_sway': float(max_sway * REFERENCE_TORSO_LENGTH),       # m
+            'com_offset': float(com_offset.mean() * scale),                 # m
+            'support_stability': float(stability),
+        }
+
+
+def _smoothstep(times: np.ndarray, keys: List[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Tramo de keys en el que cae cada instante y avance suavizado 0-1 en él"""
+    segment = np.clip(np.searchsorted(keys, times, side='right') - 1, 0, len(keys) - 2)
+    start, end = np.asarray(keys)[segment], np.asarray(keys)[segment + 1]
+    progress = np.clip((times - start) / (end - start), 0, 1)
+    return segment, progress * progress * (3 - 2 * progress)
+
+
+def synthetic_kicks(seconds: float = 10.0, fps: float = 60.0, noise: float = 0.003,
+                    seed: Optional[int] = 0):
+    """
+    Secuencia (timestamps, landmarks (T, 33, 4)) de un karateka de frente
+    que alterna cada 1.5 s un mae-geri de 0.8 s con cada pierna (recogida,
+    extensión a la altura de la cadera, recogida y apoyo), desplazando el
+    cuerpo hacia la pierna de apoyo, con ruido gaussiano.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(int(seconds * fps)) / fps
+    landmarks = np.zeros((len(timestamps), 33, 4))
+    landmarks[:, :, 3] = 1.0
+    # (x, y, z) en reposo de la pierna izquierda y el tronco (derecha en espejo)
+    rest = {11: (0.45, 0.30, 0.0), 23: (0.46, 0.55, 0.0),
+            25: (0.46, 0.72, 0.0), 27: (0.46, 0.90, 0.0)}
+    # Rodilla y tobillo: reposo, recogida, extensión, recogida, reposo
+    keys = [0.0, 0.3, 0.5, 0.65, 0.8]
+    knee_path = [(0.46, 0.72, 0.0), (0.47, 0.57, -0.17), (0.47, 0.56, -0.18),
+                 (0.47, 0.57, -0.17), (0.46, 0.72, 0.0)]
+    ankle_path = [(0.46, 0.90, 0.0), (0.47, 0.74, -0.12), (0.47, 0.55, -0.36),
+                  (0.47, 0.74, -0.12), (0.46, 0.90, 0.0)]
+
+    period = timestamps % 1.5
+    kicking = period < keys[-1]
+    leg = (timestamps // 1.5).astype(int) % 2
+    segment, progress = _smoothstep(period, keys)
+    for side in (0, 1):
+        mirror = np.array((1 - side * 2, 1, 1)), np.array((side, 0, 0))
+        for index, point in rest.items():
+            landmarks[:, index + side, :3] = np.array(point) * mirror[0] + mirror[1]
+        moving = kicking & (leg == side)
+        for index, path in ((25, knee_path), (27, ankle_path)):
+            path = np.array(path) * mirror[0] + mirror[1]
+            start, end = path[segment], path[segment + 1]
+            trajectory = start + progress[:, None] * (end - start)
+            landmarks[moving, index + side, :3] = trajectory[moving]
+
+    # Desplazamiento del tronco hacia la pierna de apoyo durante la patada
+    lean = np.where(kicking, np.sin(np.pi * period / keys[-1]), 0.0) * 0.02 * (1 - 2 * leg)
+    for index in (11, 12, 23, 24):
+        landmarks[:, index, 0] += lean
+    landmarks[:, :, :3] += rng.normal(0, noise, landmarks[:, :, :3].shape)
+    return timestamps, landmarks.astype(np.float32)
+
+
+def benchmark() -> Dict[str, float]:
+    """Coste por frame de KickAnalyzer.update() sobre patadas sintéticas a 60 fps"""
+    timestamps, landmarks = synthetic_kicks(seconds=60)
+    analyzer = KickAnalyzer()
+    best, kicks = math.inf, []
+    for _ in range(3):
+        analyzer.reset()
+        start = time.perf_counter()
+        kicks = [kick for timestamp, frame in zip(timestamps, landmarks)
+                 for kick in analyzer.update(timestamp, frame)]
+        best = min(best, (time.perf_counter() - start) / len(timestamps))
+    return {'µs/frame': best * 1e6, 'patadas': len(kicks), 'segundos': float(timestamps[-1])}
+
+
+if __name__ == '__main__':
+    timestamps, landmarks = synthetic_kicks(seconds=4)
+    analyzer = KickAnalyzer()
+    for timestamp, frame in zip(timestamps, landmarks):
+        for kick in analyzer.update(timestamp, frame):
+            print({name: round(value, 3) if isinstance(value, float) else value
+                   for name, value in kick.items()})
+    print(benchmark())
@@ -0,0 +1,155 @@
+"""
+Cinemática incremental de landmarks
+
+KinematicsBuffer guarda en un buffer circular de tamaño fijo los puntos
+seguidos de cada frame con su timestamp, y en cada frame estima posición,
+velocidad y aceleración con un filtro Savitzky-Golay causal: los
+coeficientes se calculan una vez y cada frame cuesta un producto
+(3, W) @ (W, puntos * 3) sobre la ventana más reciente, sin recalcular
+el historial.
+
+El buffer se escribe dos veces (en i y en i + capacidad), de modo que
+cualquier tramo de los últimos `capacity` frames es un slice contiguo,
+sin copias ni índices modulares.
+
+Los analizadores dinámicos miden distancias en longitudes de torso
+(centro de hombros a centro de caderas), que apenas cambian al girar el
+cuerpo, y las pasan a metros con REFERENCE_TORSO_LENGTH: son
+estimaciones, no medidas absolutas.
+"""
+import math
+import numpy as np
+from typing import Optional, Tuple
+
+
+# Longitud media del torso de un adulto (m) para pasar a unidades físicas
+REFERENCE_TORSO_LENGTH = 0.50
+
+
+def torso_length(position: np.ndarray, shoulder: int, hip: int) -> np.ndarray:
+    """
+    Distancia del centro de hombros al de caderas para posiciones (..., P, 3),
+    con los hombros en las filas shoulder, shoulder + 1 y las caderas en
+    hip, hip + 1.
+    """
+    shoulders = (position[..., shoulder, :] + position[..., shoulder + 1, :]) / 2
+    hips = (position[..., hip, :] + position[..., hip + 1, :]) / 2
+    return np.sqrt(((shoulders - hips) ** 2).sum(axis=-1))
+
+
+def savgol_coefficients(window: int, polyorder: int, derivative: int = 0,
+                        position: Optional[int] = None) -> np.ndarray:
+    """
+    Coeficientes (window,) que, aplicados a window muestras equiespaciadas
+    (periodo 1), dan la derivada indicada del polinomio de grado polyorder
+    ajustado por mínimos cuadrados, evaluada en la muestra position
+    (por defecto la última: filtro causal, sin retardo de media ventana).
+    """
+    if position is None:
+        position = window - 1
+    offsets = np.arange(window, dtype=np.float64) - position
+    design = np.vander(offsets, polyorder + 1, increasing=True)
+    return math.factorial(derivative) * np.linalg.pinv(design)[derivative]
+
+
+class KinematicsBuffer:
+    """
+    Historial circular de puntos (P, 3) con posición, velocidad y
+    aceleración suavizadas por Savitzky-Golay en O(1) por frame.
+
+    Las derivadas asumen muestreo uniforme: se escalan con el periodo medio
+    de la ventana ((t_último - t_primero) / (W - 1)), que absorbe las
+    variaciones lentas de la tasa de inferencia. Un hueco mayor que max_gap
+    vacía el historial.
+    """
+
+    def __init__(self, point_count: int, capacity: int = 120, window: int = 7,
+                 polyorder: int = 2, max_gap: float = 0.25):
+        if not polyorder < window <= capacity:
+            raise ValueError("Se requiere polyorder < window <= capacity")
+        self.point_count = point_count
+        self.capacity = capacity
+        self.window = window
+        self.max_gap = max_gap
+        # Filas: posición, velocidad y aceleración (periodo 1)
+        self.coefficients = np.stack([savgol_coefficients(window, polyorder, derivative)
+                                      for derivative in range(3)])
+
+        size = 2 * capacity
+        self._times = np.zeros(size)
+        self._raw = np.zeros((size, point_count * 3))
+        # Estimaciones de cada frame: (frame, [posición, velocidad, aceleración], P, 3)
+        self._states = np.full((size, 3, point_count, 3), np.nan)
+        self.reset()
+
+    def reset(self):
+        """Vacía el historial"""
+        self.count = 0        # Frames desde el último reinicio
+        self.total = 0        # Frames recibidos en total (índice absoluto)
+        self._slot = -1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def ready(self) -> bool:
+        """True cuando hay una ventana completa y las derivadas son válidas"""
+        return self.count >= self.window
+
+    def push(self, timestamp: float, points: np.ndarray) -> np.ndarray:
+        """
+        Añade los puntos (P, 3) del frame y devuelve sus estimaciones
+        (3, P, 3): posición, velocidad (unidades/s) y aceleración
+        (unidades/s²), NaN hasta completar la primera ventana.
+        """
+        if self.count and timestamp - self._times[self._slot + self.capacity] > self.max_gap:
+            self.reset()
+
+        slot = (self._slot + 1) % self.capacity
+        self._slot = slot
+        self.count += 1
+        self.total += 1
+        flat = points.reshape(-1)
+        self._times[slot] = self._times[slot + self.capacity] = timestamp
+        self._raw[slot] = self._raw[slot + self.capacity] = flat
+
+        state = self._states[slot + self.capacity]
+        if self.count < self.window:
+            state.fill(np.nan)
+            state[0] = points
+        else:
+            end = slot + self.capacity + 1
+            start = end - self.window
+            period = (timestamp - self._times[start]) / (self.window - 1)
+            if period <= 0:
+                period = math.inf  # Timestamps repetidos: derivadas nulas
+            estimates = self.coefficients @ self._raw[start:end]
+            estimates[1] /= period
+            estimates[2] /= period * period
+            state[:] = estimates.reshape(3, self.point_count, 3)
+        self._states[slot] = state
+        return state
+
+    def latest(self) -> np.ndarray:
+        """Estimaciones (3, P, 3) del último frame"""
+        return self._states[self._slot + self.capacity]
+
+    def history(self, frames: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vistas de los últimos frames (como mucho len(self)): timestamps
+        (n,) y estimaciones (n, 3, P, 3), del más antiguo al más reciente.
+        Válidas hasta el siguiente push().
+        """
+        frames = min(frames, len(self))
+        end = self._slot + self.capacity + 1
+        return self._times[end - frames:end], self._states[end - frames:end]
+
+    def span(self, start_time: float, end_time: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Como history(), pero con los frames del historial cuyo timestamp
+        está entre start_time y end_time (incluidos).
+        """
+        times, states = self.history(len(self))
+        first = int(np.searchsorted(times, start_time, side='left'))
+        last = int(np.searchsorted(times, end_time, side='right'))
+        return times[first:last], states[first:last]
@@ -0,0 +1,165 @@
+"""
+Protocolo de transporte de landmarks entre pose_worker.py y el proceso UI
+
+Cada mensaje va precedido de su tamaño (uint32 little-endian). El payload
+puede ser:
+
+- Binario (por defecto): cabecera fija + array float32 (33, 4) empaquetado.
+- JSON (fallback de depuración y mensajes de control como 'init').
+
+Formato binario v1 (little-endian, 32 bytes de cabecera):
+
+    offset  tipo     campo
+    0       4s       magic b'KHLM'
+    4       uint8    versión del protocolo
+    5       uint8    confianza (ver CONFIDENCE_LEVELS)
+    6       uint8    flags (bit 0: hay landmarks)
+    7       -        padding
+    8       uint64   frame_id
+    16      float64  timestamp de captura (time.time())
+    24      uint16   frames_since_detection
+    26      uint16   alto del frame
+    28      uint16   ancho del frame
+    30      -        padding
+    32      float32  landmarks (33, 4) -> x, y, z, visibility
+"""
+import json
+import struct
+import numpy as np
+
+
+PROTOCOL_MAGIC = b'KHLM'
+PROTOCOL_VERSION = 1
+
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = ('x', 'y', 'z', 'visibility')
+
+# Enum de confianza: el orden define el valor en el cable
+CONFIDENCE_LEVELS = ('none', 'high', 'interpolated', 'fading')
+CONFIDENCE_CODES = {name: code for code, name in enumerate(CONFIDENCE_LEVELS)}
+
+FLAG_HAS_LANDMARKS = 0x01
+
+HEADER_STRUCT = struct.Struct('<4sBBBxQdHHH2x')
+LANDMARKS_BYTES = NUM_LANDMARKS * len(LANDMARK_FIELDS) * np.dtype(np.float32).itemsize
+FRAME_MESSAGE_SIZE = HEADER_STRUCT.size + LANDMARKS_BYTES
+
+WIRE_FORMATS = ('binary', 'json')
+
+
+class ProtocolError(ValueError):
+    """Mensaje con formato o versión no soportados"""
+
+
+def landmarks_to_array(landmarks, out=None) -> np.ndarray:
+    """Convierte landmarks de MediaPipe o dicts a un array float32 (33, 4)"""
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, len(LANDMARK_FIELDS)), dtype=np.float32)
+
+    for i, lm in enumerate(landmarks):
+        if isinstance(lm, dict):
+            out[i] = (lm['x'], lm['y'], lm['z'], lm['visibility'])
+        else:
+            out[i] = (lm.x, lm.y, lm.z, lm.visibility)
+
+    return out
+
+
+def array_to_landmarks(array):
+    """Convierte un array (33, 4) a la lista de dicts usada en JSON"""
+    return [
+        {'x': float(x), 'y': float(y), 'z': float(z), 'visibility': float(v)}
+        for x, y, z, v in array
+    ]
+
+
+def make_result(frame_id, landmarks, confidence, frame_shape,
+                frames_since_detection=0, timestamp=0.0):
+    """Construye el dict de resultado que consume la UI"""
+    return {
+        'landmarks': landmarks,
+        'pose_detected': landmarks is not None and confidence != 'none',
+        'pose_confidence': confidence,
+        'frame_shape': tuple(frame_shape),
+        'frame_id': frame_id,
+        'frames_since_detection': frames_since_detection,
+        'timestamp': timestamp,
+    }
+
+
+def encode_frame_result(frame_id, timestamp, confidence, frames_since_detection,
+                        frame_shape, landmarks=None) -> bytes:
+    """Empaqueta un resultado por frame en formato binario v1"""
+    flags = FLAG_HAS_LANDMARKS if landmarks is not None else 0
+    header = HEADER_STRUCT.pack(
+        PROTOCOL_MAGIC,
+        PROTOCOL_VERSION,
+        CONFIDENCE_CODES.get(confidence, 0),
+        flags,
+        frame_id,
+        timestamp,
+        min(frames_since_detection, 0xFFFF),
+        frame_shape[0],
+        frame_shape[1],
+    )
+
+    if landmarks is None:
+        return header + bytes(LANDMARKS_BYTES)
+
+    payload = np.ascontiguousarray(landmarks, dtype='<f4')
+    return header + payload.tobytes()
+
+
+def decode_frame_result(data) -> dict:
+    """Decodifica un mensaje binario directamente a un resultado con array NumPy"""
+    if len(data) < FRAME_MESSAGE_SIZE:
+        raise ProtocolError(f"Mensaje binario truncado: {len(data)} bytes")
+
+    (magic, version, confidence_code, flags, frame_id, timestamp,
+     frames_since_detection, height, width) = HEADER_STRUCT.unpack_from(data)
+
+    if magic != PROTOCOL_MAGIC:
+        raise ProtocolError(f"Magic inválido: {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Versión de protocolo no soportada: {version}")
+
+    landmarks = None
+    if flags & FLAG_HAS_LANDMARKS:
+        # Copia única desde el buffer del mensaje a un array propio
+        landmarks = np.frombuffer(
+            data, dtype='<f4', count=NUM_LANDMARKS * len(LANDMARK_FIELDS),
+            offset=HEADER_STRUCT.size
+        ).reshape(NUM_LANDMARKS, len(LANDMARK_FIELDS)).astype(np.float32)
+
+    confidence = CONFIDENCE_LEVELS[confidence_code] if confidence_code < len(CONFIDENCE_LEVELS) else 'none'
+    return make_result(frame_id, landmarks, confidence, (height, width, 3),
+                       frames_since_detection, timestamp)
+
+
+def encode_json_message(message) -> bytes:
+    """Serializa un mensaje JSON (control o fallback de depuración)"""
+    landmarks = message.get('landmarks')
+    if isinstance(landmarks, np.ndarray):
+        message = dict(message, landmarks=array_to_landmarks(landmarks))
+    return json.dumps(message).encode('utf-8')
+
+
+def decode_message(data) -> dict:
+    """Decodifica un payload detectando si es binario o JSON"""
+    if data[:4] == PROTOCOL_MAGIC:
+        return decode_frame_result(data)
+
+    message = json.loads(bytes(data).decode('utf-8'))
+
+    # Normalizar landmarks JSON al mismo formato que el binario
+    if message.get('landmarks'):
+        message['landmarks'] = landmarks_to_array(message['landmarks'])
+
+    return message
+
+
+def write_message(stream, payload):
+    """Escribe un payload con prefijo de tamaño y hace flush"""
+    stream.write(len(payload).to_bytes(4, byteorder='little'))
+    stream.write(payload)
+    stream.flush()
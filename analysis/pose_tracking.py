@@ -0,0 +1,230 @@
+"""
+Seguimiento de pose entre frames: persistencia de la última detección válida
+y región de interés para inferir solo sobre el recorte donde está el karateka
+"""
+import threading
+import cv2
+import numpy as np
+from .landmark_protocol import NUM_LANDMARKS, LANDMARK_FIELDS, landmarks_to_array
+
+
+def create_pose_estimator(model_complexity=0, static_image_mode=False, smooth_landmarks=True):
+    """
+    Crea el detector MediaPipe Pose con la configuración de Kohai.
+    MediaPipe se importa aquí para no cargarlo en procesos que no lo usan.
+    Con un filtro de landmarks propio (landmark_filter) conviene desactivar
+    smooth_landmarks para no suavizar dos veces.
+    """
+    import mediapipe as mp
+
+    # Configurar MediaPipe para pose detection ULTRA-OPTIMIZADO
+    return mp.solutions.pose.Pose(
+        static_image_mode=static_image_mode,
+        model_complexity=model_complexity,  # 0 = modelo más simple = máxima velocidad
+        enable_segmentation=False,
+        min_detection_confidence=0.2,  # Más bajo para detectar más poses
+        min_tracking_confidence=0.2,   # Más bajo para mejor tracking continuo
+        smooth_landmarks=smooth_landmarks,  # Suavizado interno de MediaPipe
+        smooth_segmentation=False
+    )
+
+
+class PoseTracker:
+    """
+    Mantiene la última pose detectada por MediaPipe y decide la confianza
+    de cada frame (detectado, interpolado, desvaneciéndose o sin pose).
+
+    La persistencia se cuenta en inferencias sin detección, de modo que un
+    frame capturado pero no inferido hereda la confianza de la última
+    inferencia en lugar de degradarse por sí solo.
+
+    Con landmark_filter (ver landmark_filter.py) cada detección pasa por el
+    filtro temporal, que da la pose suavizada y la velocidad de cada
+    landmark. Durante los huecos se mantiene la pose filtrada con
+    velocidad cero, y el filtro se reinicia al recuperar una pose perdida.
+    """
+
+    def __init__(self, persistence_frames=10, landmark_filter=None):
+        self.persistence_frames = persistence_frames  # ~0.33 segundos a 30 fps
+        self.landmark_filter = landmark_filter
+        self.landmarks = np.zeros((NUM_LANDMARKS, len(LANDMARK_FIELDS)), dtype=np.float32)
+        self.velocity = np.zeros((NUM_LANDMARKS, 3), dtype=np.float32)
+        self.has_landmarks = False
+        self.last_detection_frame = 0
+        self.last_detection_timestamp = 0.0
+        self.missed_inferences = 0
+        self.lock = threading.Lock()
+
+    def update(self, frame_id, pose_landmarks, region=None, timestamp=None):
+        """
+        Registra el resultado de MediaPipe para frame_id (None si no detectó).
+        Si la inferencia se hizo sobre un recorte, region es (roi, frame_shape)
+        y los landmarks se llevan a coordenadas del frame completo.
+        timestamp es el instante de captura del frame, para el filtro.
+        Devuelve (landmarks, confianza, frames_since_detection, detection_frame,
+        velocidad (33, 3) o None sin filtro, timestamp de la detección).
+        """
+        with self.lock:
+            if pose_landmarks is not None:
+                # NUEVA DETECCIÓN REAL: empaquetar directamente en float32
+                landmarks_to_array(pose_landmarks.landmark, out=self.landmarks)
+                if region is not None:
+                    map_landmarks_to_frame(self.landmarks, *region)
+                if self.landmark_filter is not None:
+                    if not self.has_landmarks or self.missed_inferences > self.persistence_frames:
+                        # Pose recuperada: no suavizar contra la anterior
+                        self.landmark_filter.reset()
+                    self.landmark_filter(self.landmarks, timestamp,
+                                         out=self.landmarks, velocity_out=self.velocity)
+                self.has_landmarks = True
+                self.last_detection_frame = frame_id
+                self.last_detection_timestamp = timestamp or 0.0
+                self.missed_inferences = 0
+            else:
+                self.missed_inferences += 1
+                # Pose mantenida: quieta hasta la próxima detección
+                self.velocity[:] = 0.0
+
+            return self._result_for(frame_id)
+
+    def result_for(self, frame_id):
+        """Resultado vigente para un frame capturado que aún no se ha inferido"""
+        with self.lock:
+            return self._result_for(frame_id)
+
+    def _result_for(self, frame_id):
+        if not self.has_landmarks or self.missed_inferences > self.persistence_frames:
+            # NO HAY POSE o muy antigua
+            return None, 'none', 0, self.last_detection_frame, None, self.last_detection_timestamp
+
+        # MANTENER POSE ANTERIOR si está dentro del rango de persistencia
+        if self.missed_inferences == 0:
+            confidence = 'high'
+        elif self.missed_inferences <= 3:
+            confidence = 'interpolated'
+        else:
+            confidence = 'fading'
+
+        frames_since_detection = max(0, frame_id - self.last_detection_frame)
+        velocity = self.velocity.copy() if self.landmark_filter is not None else None
+        return (self.landmarks.copy(), confidence, frames_since_detection,
+                self.last_detection_frame, velocity, self.last_detection_timestamp)
+
+
+def map_landmarks_to_frame(landmarks, roi, frame_shape):
+    """
+    Convierte in-place landmarks normalizados al recorte roi = (x0, y0, x1, y1)
+    en landmarks normalizados al frame completo.
+    """
+    x0, y0, x1, y1 = roi
+    height, width = frame_shape[:2]
+    scale_x = (x1 - x0) / width
+    landmarks[:, 0] = landmarks[:, 0] * scale_x + x0 / width
+    landmarks[:, 1] = landmarks[:, 1] * ((y1 - y0) / height) + y0 / height
+    # MediaPipe escala z igual que x
+    landmarks[:, 2] *= scale_x
+    return landmarks
+
+
+class PoseRegion:
+    """
+    Región de inferencia derivada de la última pose buena.
+
+    Mientras la pose se detecta, la inferencia corre sobre un recorte con
+    margen alrededor de los landmarks visibles; si se pierde, vuelve al frame
+    completo. El recorte solo se mueve cuando el karateka se acerca a un
+    borde o cambia mucho de tamaño, para no confundir el tracking interno
+    de MediaPipe con saltos de encuadre en cada frame.
+    """
+
+    def __init__(self, padding=0.3, min_size=0.25, max_inference_side=640,
+                 visibility_threshold=0.5):
+        self.padding = padding                            # margen relativo al tamaño de la pose
+        self.min_size = min_size                          # lado mínimo relativo al lado corto del frame
+        self.max_inference_side = max_inference_side      # lado máximo de la imagen que ve MediaPipe
+        self.visibility_threshold = visibility_threshold
+        self.roi = None                                   # None = frame completo
+        self.crops = 0
+        self.full_frames = 0
+
+    def _landmark_bounds(self, landmarks, frame_shape):
+        """Caja (x0, y0, x1, y1) en píxeles de los landmarks visibles, o None"""
+        visible = landmarks[landmarks[:, 3] >= self.visibility_threshold]
+        if len(visible) < 4:
+            return None
+
+        height, width = frame_shape[:2]
+        xs = np.clip(visible[:, 0], 0.0, 1.0) * width
+        ys = np.clip(visible[:, 1], 0.0, 1.0) * height
+        return xs.min(), ys.min(), xs.max(), ys.max()
+
+    def _padded_roi(self, bounds, frame_shape):
+        """Caja con margen y tamaño mínimo, recortada a los límites del frame"""
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = bounds
+        min_side = self.min_size * min(width, height)
+        half_w = max((x1 - x0) * (1 + 2 * self.padding), min_side) / 2
+        half_h = max((y1 - y0) * (1 + 2 * self.padding), min_side) / 2
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        return (max(0, int(cx - half_w)), max(0, int(cy - half_h)),
+                min(width, int(np.ceil(cx + half_w))), min(height, int(np.ceil(cy + half_h))))
+
+    def _contains(self, bounds):
+        """True si la pose sigue dentro del recorte actual con la mitad del margen"""
+        rx0, ry0, rx1, ry1 = self.roi
+        x0, y0, x1, y1 = bounds
+        margin_x = (x1 - x0) * self.padding / 2
+        margin_y = (y1 - y0) * self.padding / 2
+        return (x0 - margin_x >= rx0 and y0 - margin_y >= ry0 and
+                x1 + margin_x <= rx1 and y1 + margin_y <= ry1)
+
+    def update(self, tracker, frame_shape):
+        """
+        Elige la región para la próxima inferencia a partir del tracker.
+        Devuelve True si la región cambió (el tracking de MediaPipe debe
+        reiniciarse porque sus coordenadas normalizadas ya no son válidas).
+        """
+        with tracker.lock:
+            lost = not tracker.has_landmarks or tracker.missed_inferences > 0
+            bounds = None if lost else self._landmark_bounds(tracker.landmarks, frame_shape)
+
+        previous = self.roi
+        if bounds is None:
+            # Tracking perdido: buscar en el frame completo
+            self.roi = None
+        else:
+            target = self._padded_roi(bounds, frame_shape)
+            target_area = (target[2] - target[0]) * (target[3] - target[1])
+            if self.roi is None or not self._contains(bounds):
+                self.roi = target
+            else:
+                area = (self.roi[2] - self.roi[0]) * (self.roi[3] - self.roi[1])
+                if area > 2 * target_area:
+                    # El karateka se alejó: ajustar el recorte
+                    self.roi = target
+
+        return self.roi != previous
+
+    def prepare(self, frame):
+        """
+        Recorta y reduce el frame BGR para la inferencia.
+        Devuelve (imagen RGB, region) donde region se pasa a PoseTracker.update.
+        """
+        height, width = frame.shape[:2]
+        if self.roi is None:
+            image, region = frame, None
+            self.full_frames += 1
+        else:
+            x0, y0, x1, y1 = self.roi
+            image, region = frame[y0:y1, x0:x1], (self.roi, frame.shape)
+            self.crops += 1
+
+        # Los landmarks son normalizados: reducir no altera el mapeo de vuelta
+        longest = max(image.shape[:2])
+        if longest > self.max_inference_side:
+            factor = self.max_inference_side / longest
+            image = cv2.resize(image, (max(1, int(image.shape[1] * factor)),
+                                       max(1, int(image.shape[0] * factor))),
+                               interpolation=cv2.INTER_AREA)
+
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), region
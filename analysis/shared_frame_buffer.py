@@ -1,10 +1,163 @@
 """
 Buffer de frames compartido entre procesos usando memoria compartida
+
+Cada slot del buffer circular guarda los píxeles del frame y, junto a ellos,
+los landmarks calculados para ese mismo frame. Así la UI lee el frame y su
+pose como un par consistente sin pasar por el pipe de stdout.
+
+Layout de la memoria compartida (little-endian):
+
+    offset                      contenido
+    0                           cabecera HEADER_DTYPE (write_idx, latidos)
+    HEADER_DTYPE.itemsize       SLOT_DTYPE x buffer_size (metadatos por slot)
+    frames_offset (alineado 64) frames uint8 x buffer_size
+
+Protocolo seqlock por slot (un escritor, N lectores, sin locks entre procesos):
+
+- El escritor incrementa 'seq' a impar antes de tocar el slot (píxeles o
+  landmarks) y lo vuelve a incrementar a par al terminar.
+- El lector lee 'seq', copia lo que necesita y vuelve a leer 'seq'. La copia
+  es válida solo si ambos valores son iguales y pares; si no, el slot se
+  estaba escribiendo (frame roto) y el lector pasa al siguiente slot.
+
+Dentro del proceso escritor varios hilos pueden escribir (captura e
+inferencia), por eso las escrituras se serializan con un threading.Lock;
+los lectores de otros procesos nunca toman ese lock. El orden de los
+stores lo garantiza el modelo de memoria TSO de x86; en otras
+arquitecturas el protocolo depende de que el intérprete no reordene las
+escrituras de NumPy, que son llamadas separadas.
+
+En el proceso consumidor el supervisor libera con cleanup() los buffers de
+workers caídos mientras el hilo de la UI puede estar leyéndolos: las
+lecturas y cleanup() se serializan con views_lock, y un buffer cerrado se
+lee como vacío.
+
+Los hilos de captura e inferencia del productor escriben su latido
+(time.time()) en la cabecera; el supervisor del proceso consumidor usa el
+más antiguo de los dos para detectar un worker colgado.
+
+Ejecutar `python -m analysis.shared_frame_buffer --stress 10` lanza un
+escritor a máxima velocidad contra un lector y verifica que ningún frame
+leído está roto.
 """
+import argparse
+import multiprocessing
 import multiprocessing.shared_memory as shm
+import sys
 import numpy as np
 import threading
 import time
+from .landmark_protocol import (
+    CONFIDENCE_CODES, CONFIDENCE_LEVELS, NUM_LANDMARKS, LANDMARK_FIELDS, make_result
+)
+
+
+# Cabecera global del buffer
+HEADER_DTYPE = np.dtype([
+    ('write_idx', '<i8'),          # Próximo slot a escribir
+    ('capture_heartbeat', '<f8'),  # Último frame capturado (time.time(), 0 = aún ninguno)
+    ('inference_heartbeat', '<f8'),  # Última inferencia terminada
+])
+
+# Campos de latido válidos para SharedFrameBuffer.beat()
+HEARTBEAT_FIELDS = ('capture_heartbeat', 'inference_heartbeat')
+
+# Metadatos por slot: frame + resultado de pose del mismo frame
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u8'),                # Contador seqlock: impar = escritura en curso
+    ('frame_counter', '<i8'),      # 0 = slot vacío
+    ('timestamp', '<f8'),          # Timestamp de captura (time.time())
+    ('detection_frame', '<i8'),    # Frame donde se detectaron los landmarks
+    ('detection_timestamp', '<f8'),  # Timestamp de captura de ese frame
+    ('frames_since_detection', '<u2'),
+    ('confidence', 'u1'),          # Código de CONFIDENCE_LEVELS
+    ('has_result', 'u1'),          # 1 cuando los landmarks del frame están listos
+    ('_pad', 'V4'),
+    ('landmarks', '<f4', (NUM_LANDMARKS, len(LANDMARK_FIELDS))),
+    ('velocity', '<f4', (NUM_LANDMARKS, 3)),  # Unidades normalizadas / s (0 sin filtro)
+])
+
+# Alineación del inicio de los frames (línea de caché)
+FRAME_ALIGNMENT = 64
+
+
+class _SlotWrite:
+    """Sección de escritura seqlock sobre un slot (seq impar mientras dura)"""
+
+    def __init__(self, seq, slot_idx):
+        self.seq = seq
+        self.slot_idx = slot_idx
+
+    def __enter__(self):
+        self.seq[self.slot_idx] += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seq[self.slot_idx] += 1
+        return False
+
+
+class FrameView:
+    """
+    Vista sin copia de un slot del buffer, protegida por el seqlock.
+
+    'frame' apunta directamente a la memoria compartida (solo lectura). Es
+    válida mientras is_valid() sea True; el consumidor debe comprobarlo
+    después de usar los píxeles y descartar el resultado si el escritor
+    reutilizó el slot entretanto.
+    """
+
+    def __init__(self, buffer, slot_idx, seq, meta):
+        self.buffer = buffer
+        self.slot_idx = slot_idx
+        self.seq = seq
+        self.meta = meta
+        self.frame_counter = int(meta['frame_counter'])
+        self.frame = buffer._get_frame_view(slot_idx)
+        self.frame.flags.writeable = False
+        self.bytes_copied = 0
+
+    def is_valid(self):
+        """True si el slot no se ha reescrito desde que se adquirió la vista"""
+        with self.buffer.views_lock:
+            return not self.buffer.closed and int(self.buffer.seq[self.slot_idx]) == self.seq
+
+    def copy_into(self, out, convert=None):
+        """
+        Copia (o convierte con convert(src, dst)) el frame a un buffer
+        preasignado. Devuelve False si el frame se rompió durante la copia.
+        """
+        if convert is None:
+            np.copyto(out, self.frame)
+        else:
+            convert(self.frame, out)
+        self.bytes_copied += out.nbytes
+        self.buffer.bytes_copied += out.nbytes
+
+        if not self.is_valid():
+            self.buffer.torn_reads += 1
+            return False
+        return True
+
+    def to_bytes(self):
+        """
+        Copia el frame a un bytes nuevo (la única copia del lado Python al
+        entregarlo a GTK). Devuelve None si el frame se rompió durante la copia.
+        """
+        data = self.frame.tobytes()
+        self.bytes_copied += len(data)
+        self.buffer.bytes_copied += len(data)
+
+        if not self.is_valid():
+            self.buffer.torn_reads += 1
+            return None
+        return data
+
+    def result(self):
+        """Resultado de pose del slot (copiado al adquirir la vista)"""
+        if not self.meta['has_result']:
+            return None
+        return self.buffer._slot_to_result(self.meta)
 
 
 class SharedFrameBuffer:
@@ -12,16 +165,18 @@ class SharedFrameBuffer:
     Buffer circular de frames en memoria compartida
     Permite que un proceso escriba frames y otro los lea sin copia
     """
-    
+
     def __init__(self, frame_shape=(480, 640, 3), buffer_size=5, name=None):
         self.frame_shape = frame_shape
         self.buffer_size = buffer_size
-        self.frame_bytes = np.prod(frame_shape) * np.dtype(np.uint8).itemsize
-        
-        # Tamaño total: frames + metadatos (write_idx, read_idx, frame_counters)
-        metadata_size = 4 * (buffer_size + 2)  # 2 índices + contador por frame
-        total_size = (self.frame_bytes * buffer_size) + metadata_size
-        
+        self.frame_bytes = int(np.prod(frame_shape)) * np.dtype(np.uint8).itemsize
+
+        # Tamaño total: cabecera + metadatos por slot + frames
+        self.slots_offset = HEADER_DTYPE.itemsize
+        metadata_size = self.slots_offset + SLOT_DTYPE.itemsize * buffer_size
+        self.frames_offset = -(-metadata_size // FRAME_ALIGNMENT) * FRAME_ALIGNMENT
+        total_size = self.frames_offset + (self.frame_bytes * buffer_size)
+
         if name:
             # Consumidor: conectar a memoria existente
             self.shm = shm.SharedMemory(name=name)
@@ -30,115 +185,414 @@ class SharedFrameBuffer:
             # Productor: crear nueva memoria compartida
             self.shm = shm.SharedMemory(create=True, size=total_size)
             self.is_creator = True
-            
+
+        # Vistas estructuradas sobre la memoria compartida (sin copia)
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf, offset=0)
+        self.slots = np.ndarray((buffer_size,), dtype=SLOT_DTYPE, buffer=self.shm.buf,
+                                offset=self.slots_offset)
+        self.seq = self.slots['seq']
+
+        if self.is_creator:
             # Inicializar metadatos
-            self._get_metadata_view()[:] = 0
-        
+            self.shm.buf[:self.frames_offset] = bytes(self.frames_offset)
+
         self.name = self.shm.name
+        # Serializa los hilos escritores del proceso productor (no afecta a lectores)
         self.lock = threading.Lock()
+        # Serializa las lecturas con cleanup() entre hilos del mismo proceso
+        self.views_lock = threading.Lock()
+        self.closed = False
         
-    def _get_metadata_view(self):
-        """Obtiene vista de los metadatos (índices y contadores)"""
-        offset = self.frame_bytes * self.buffer_size
-        return np.frombuffer(
-            self.shm.buf[offset:offset + 4 * (self.buffer_size + 2)], 
-            dtype=np.int32
-        )
-    
+        # Estadísticas del lector
+        self.torn_reads = 0
+        self.bytes_copied = 0
+
     def _get_frame_view(self, slot):
         """Obtiene vista del frame en el slot especificado"""
-        offset = slot * self.frame_bytes
+        offset = self.frames_offset + slot * self.frame_bytes
         return np.frombuffer(
-            self.shm.buf[offset:offset + self.frame_bytes], 
+            self.shm.buf[offset:offset + self.frame_bytes],
             dtype=np.uint8
         ).reshape(self.frame_shape)
-    
-    def write_frame(self, frame, frame_counter):
+
+    def _find_slot(self, frame_counter):
+        """Busca el slot que contiene frame_counter, empezando por el más reciente"""
+        write_idx = int(self.header['write_idx'])
+        for i in range(1, self.buffer_size + 1):
+            slot = (write_idx - i) % self.buffer_size
+            if self.slots[slot]['frame_counter'] == frame_counter:
+                return slot
+        return None
+
+    def write_frame(self, frame, frame_counter, timestamp=None):
         """Escribe un frame al buffer (solo desde el proceso productor)"""
         if not self.is_creator:
             return False
-            
+
         with self.lock:
-            metadata = self._get_metadata_view()
-            write_idx = metadata[0]
-            
-            # Escribir frame
-            frame_view = self._get_frame_view(write_idx)
-            frame_view[:] = frame
-            
-            # Actualizar contador del frame
-            metadata[2 + write_idx] = frame_counter
-            
+            write_idx = int(self.header['write_idx'])
+            slot = self.slots[write_idx]
+
+            with _SlotWrite(self.seq, write_idx):
+                # Invalidar el resultado anterior del slot antes de sobrescribir
+                slot['has_result'] = 0
+
+                # Escribir frame
+                frame_view = self._get_frame_view(write_idx)
+                frame_view[:] = frame
+
+                # Actualizar metadatos del frame
+                slot['timestamp'] = time.time() if timestamp is None else timestamp
+                slot['frame_counter'] = frame_counter
+
             # Avanzar índice de escritura
-            metadata[0] = (write_idx + 1) % self.buffer_size
-            
+            self.header['write_idx'] = (write_idx + 1) % self.buffer_size
+
+        return True
+
+    def write_result(self, frame_counter, landmarks, confidence,
+                     frames_since_detection=0, detection_frame=None, velocity=None,
+                     detection_timestamp=None):
+        """
+        Escribe los landmarks (y su velocidad, si hay filtro temporal) del
+        frame indicado en su mismo slot.
+        Devuelve False si el frame ya fue sobrescrito por uno más nuevo.
+        """
+        if not self.is_creator:
+            return False
+
+        with self.lock:
+            slot_idx = self._find_slot(frame_counter)
+            if slot_idx is None:
+                return False
+
+            slot = self.slots[slot_idx]
+            with _SlotWrite(self.seq, slot_idx):
+                if landmarks is not None:
+                    slot['landmarks'] = landmarks
+                    slot['velocity'] = 0.0 if velocity is None else velocity
+                else:
+                    confidence = 'none'
+
+                slot['confidence'] = CONFIDENCE_CODES.get(confidence, 0)
+                slot['frames_since_detection'] = min(frames_since_detection, 0xFFFF)
+                slot['detection_frame'] = frame_counter if detection_frame is None else detection_frame
+                slot['detection_timestamp'] = (slot['timestamp'] if detection_timestamp is None
+                                               else detection_timestamp)
+                slot['has_result'] = 1
+
         return True
-    
+
+    def _read_slot(self, slot_idx, require_result=False):
+        """
+        Copia metadatos y frame de un slot validando el seqlock.
+        Devuelve (frame, metadatos) o None si el slot está vacío o se rompió.
+        """
+        seq_before = int(self.seq[slot_idx])
+        if seq_before & 1:
+            self.torn_reads += 1
+            return None
+
+        meta = self.slots[slot_idx:slot_idx + 1].copy()[0]
+        if meta['frame_counter'] == 0 or (require_result and not meta['has_result']):
+            return None
+
+        frame = self._get_frame_view(slot_idx).copy()
+        self.bytes_copied += frame.nbytes
+
+        if int(self.seq[slot_idx]) != seq_before:
+            # El escritor tocó el slot durante la copia: descartar
+            self.torn_reads += 1
+            return None
+
+        return frame, meta
+
+    def acquire_latest_view(self, require_result=False, newer_than=0):
+        """
+        Devuelve un FrameView del slot más reciente (con resultado si
+        require_result) cuyo frame_counter sea mayor que newer_than, sin
+        copiar píxeles. None si no hay ninguno estable o el buffer está cerrado.
+        """
+        with self.views_lock:
+            if self.closed:
+                return None
+            write_idx = int(self.header['write_idx'])
+
+            for i in range(1, self.buffer_size + 1):
+                slot_idx = (write_idx - i) % self.buffer_size
+                seq = int(self.seq[slot_idx])
+                if seq & 1:
+                    self.torn_reads += 1
+                    continue
+
+                meta = self.slots[slot_idx:slot_idx + 1].copy()[0]
+                if meta['frame_counter'] == 0 or (require_result and not meta['has_result']):
+                    continue
+                if meta['frame_counter'] <= newer_than:
+                    # Los slots anteriores son aún más viejos
+                    return None
+                if int(self.seq[slot_idx]) != seq:
+                    self.torn_reads += 1
+                    continue
+
+                return FrameView(self, slot_idx, seq, meta)
+
+            return None
+
     def read_latest_frame(self):
         """Lee el frame más reciente (desde el proceso consumidor)"""
-        metadata = self._get_metadata_view()
-        write_idx = metadata[0]
-        
-        # El frame más reciente está en (write_idx - 1)
-        latest_slot = (write_idx - 1) % self.buffer_size
-        
-        # Verificar si hay datos
-        frame_counter = metadata[2 + latest_slot]
-        if frame_counter == 0:
+        with self.views_lock:
+            if self.closed:
+                return None, 0
+            write_idx = int(self.header['write_idx'])
+
+            # El frame más reciente está en (write_idx - 1); si está roto, probar más antiguos
+            for i in range(1, self.buffer_size + 1):
+                slot_idx = (write_idx - i) % self.buffer_size
+                read = self._read_slot(slot_idx)
+                if read is not None:
+                    frame, meta = read
+                    return frame, int(meta['frame_counter'])
+
             return None, 0
-        
-        # Leer frame
-        frame_view = self._get_frame_view(latest_slot)
-        return frame_view.copy(), frame_counter  # Copiar para evitar race conditions
-    
-    def cleanup(self):
-        """Limpia recursos"""
-        if self.is_creator:
-            self.shm.unlink()  # Solo el creador debe unlink
+
+    def read_latest_result(self):
+        """
+        Lee el frame más reciente que ya tiene resultado de pose.
+        Devuelve (frame, resultado) como par consistente, o (None, None).
+        """
+        with self.views_lock:
+            if self.closed:
+                return None, None
+            write_idx = int(self.header['write_idx'])
+
+            for i in range(1, self.buffer_size + 1):
+                slot_idx = (write_idx - i) % self.buffer_size
+                read = self._read_slot(slot_idx, require_result=True)
+                if read is not None:
+                    frame, meta = read
+                    return frame, self._slot_to_result(meta)
+
+            return None, None
+
+    def beat(self, field):
+        """Registra un latido del hilo productor indicado (campo de HEARTBEAT_FIELDS)"""
+        self.header[field] = time.time()
+
+    def heartbeat_age(self):
+        """
+        Segundos desde el latido más antiguo de los hilos productores,
+        o None si alguno aún no ha latido (o el buffer está cerrado).
+        """
+        with self.views_lock:
+            if self.closed:
+                return None
+            beats = [float(self.header[field]) for field in HEARTBEAT_FIELDS]
+        if min(beats) == 0.0:
+            return None
+        return time.time() - min(beats)
+
+    def _slot_to_result(self, slot):
+        """Convierte los metadatos de un slot al dict de resultado de la UI"""
+        confidence = CONFIDENCE_LEVELS[slot['confidence']]
+        landmarks = slot['landmarks'] if confidence != 'none' else None
+        result = make_result(
+            int(slot['frame_counter']), landmarks, confidence, self.frame_shape,
+            int(slot['frames_since_detection']), float(slot['timestamp'])
+        )
+        result['detection_frame'] = int(slot['detection_frame'])
+        result['detection_timestamp'] = float(slot['detection_timestamp'])
+        result['velocity'] = slot['velocity'] if confidence != 'none' else None
+        return result
+
+    def cleanup(self, unlink=False):
+        """
+        Limpia recursos. Solo el creador hace unlink, salvo que el consumidor
+        lo pida con unlink=True porque el productor murió sin limpiar.
+
+        Lanza BufferError si queda un FrameView vivo; el buffer ya está
+        cerrado para las lecturas y basta con volver a llamar más tarde.
+        """
+        with self.views_lock:
+            # Las vistas propias también impiden cerrar: marcar el buffer
+            # cerrado (los lectores lo comprueban bajo el lock) y soltarlas
+            self.closed = True
+            self.header = None
+            self.slots = None
+            self.seq = None
         self.shm.close()
+        if self.is_creator or unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass  # Ya liberada
 
 
 class SharedFrameManager:
     """
     Gestor que simplifica el uso del buffer compartido
     """
-    
+
     def __init__(self, frame_shape=(480, 640, 3)):
         self.frame_shape = frame_shape
         self.buffer = None
         self.last_frame_counter = 0
-    
+        self.last_result_counter = 0
+
     def create_buffer(self):
         """Crea buffer (desde el proceso worker)"""
         self.buffer = SharedFrameBuffer(self.frame_shape)
         return self.buffer.name
-    
+
     def connect_buffer(self, buffer_name):
         """Conecta a buffer existente (desde el proceso UI)"""
         self.buffer = SharedFrameBuffer(self.frame_shape, name=buffer_name)
         return True
-    
-    def put_frame(self, frame, frame_counter):
+
+    def put_frame(self, frame, frame_counter, timestamp=None):
         """Pone frame en buffer"""
         if self.buffer:
-            return self.buffer.write_frame(frame, frame_counter)
+            return self.buffer.write_frame(frame, frame_counter, timestamp)
+        return False
+
+    def put_result(self, frame_counter, landmarks, confidence,
+                   frames_since_detection=0, detection_frame=None, velocity=None,
+                   detection_timestamp=None):
+        """Pone el resultado de pose junto al frame correspondiente"""
+        if self.buffer:
+            return self.buffer.write_result(frame_counter, landmarks, confidence,
+                                            frames_since_detection, detection_frame, velocity,
+                                            detection_timestamp)
         return False
-    
+
+    def beat(self, field):
+        """Registra un latido del hilo productor indicado"""
+        if self.buffer:
+            self.buffer.beat(field)
+
+    def heartbeat_age(self):
+        """Segundos desde el latido más antiguo del productor, o None"""
+        if not self.buffer:
+            return None
+        return self.buffer.heartbeat_age()
+
     def get_latest_frame(self):
         """Obtiene último frame disponible"""
         if not self.buffer:
             return None, 0
-        
+
         frame, frame_counter = self.buffer.read_latest_frame()
-        
+
         # Solo devolver si es un frame nuevo
         if frame_counter > self.last_frame_counter:
             self.last_frame_counter = frame_counter
             return frame, frame_counter
-        
+
         return None, frame_counter
-    
-    def cleanup(self):
+
+    def get_latest_view(self, require_result=True):
+        """Obtiene un FrameView sin copia del último frame nuevo, o None"""
+        if not self.buffer:
+            return None
+
+        newer_than = self.last_result_counter if require_result else self.last_frame_counter
+        view = self.buffer.acquire_latest_view(require_result, newer_than)
+        if view is not None:
+            if require_result:
+                self.last_result_counter = view.frame_counter
+            else:
+                self.last_frame_counter = view.frame_counter
+        return view
+
+    def get_latest_result(self):
+        """Obtiene el último par (frame, resultado) nuevo, o (None, None)"""
+        if not self.buffer:
+            return None, None
+
+        frame, result = self.buffer.read_latest_result()
+
+        # Solo devolver si es un resultado nuevo
+        if result is not None and result['frame_id'] > self.last_result_counter:
+            self.last_result_counter = result['frame_id']
+            return frame, result
+
+        return None, None
+
+    def cleanup(self, unlink=False):
         """Limpia recursos"""
         if self.buffer:
-            self.buffer.cleanup()
+            self.buffer.cleanup(unlink)
+
+
+def _stress_writer(frame_shape, name_queue, stop_event):
+    """Escritor a máxima velocidad: cada frame y sus landmarks codifican su contador"""
+    buffer = SharedFrameBuffer(frame_shape)
+    name_queue.put(buffer.name)
+
+    frame = np.empty(frame_shape, dtype=np.uint8)
+    landmarks = np.empty((NUM_LANDMARKS, len(LANDMARK_FIELDS)), dtype=np.float32)
+    frame_counter = 0
+    try:
+        while not stop_event.is_set():
+            frame_counter += 1
+            frame.fill(frame_counter % 256)
+            buffer.write_frame(frame, frame_counter, float(frame_counter))
+            landmarks.fill(frame_counter)
+            buffer.write_result(frame_counter, landmarks, 'high')
+    finally:
+        name_queue.put(frame_counter)
+        buffer.cleanup()
+
+
+def stress_test(duration=5.0, frame_shape=(120, 160, 3)):
+    """
+    Lanza un proceso escritor a máxima velocidad contra un lector en este
+    proceso y verifica que ningún par (frame, landmarks) leído esté roto.
+    Devuelve un dict con estadísticas; 'torn_frames' debe ser 0.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    name_queue = ctx.Queue()
+    stop_event = ctx.Event()
+    writer = ctx.Process(target=_stress_writer, args=(frame_shape, name_queue, stop_event))
+    writer.start()
+
+    buffer = SharedFrameBuffer(frame_shape, name=name_queue.get(timeout=30))
+    reads = 0
+    torn_frames = 0
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            frame, result = buffer.read_latest_result()
+            if result is None:
+                continue
+            reads += 1
+
+            frame_counter = result['frame_id']
+            expected = frame_counter % 256
+            if (frame.min() != expected or frame.max() != expected or
+                    not np.all(result['landmarks'] == frame_counter) or
+                    result['timestamp'] != float(frame_counter)):
+                torn_frames += 1
+    finally:
+        stop_event.set()
+        frames_written = name_queue.get(timeout=30)
+        writer.join()
+        buffer.cleanup()
+
+    return {
+        'frames_written': frames_written,
+        'reads': reads,
+        'torn_frames': torn_frames,
+        'skipped_torn_slots': buffer.torn_reads,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prueba de estrés del seqlock de SharedFrameBuffer")
+    parser.add_argument('--stress', type=float, default=5.0, metavar='SEGUNDOS')
+    args = parser.parse_args()
+
+    stats = stress_test(args.stress)
+    print(f"Frames escritos: {stats['frames_written']}, lecturas: {stats['reads']}, "
+          f"slots rotos descartados: {stats['skipped_torn_slots']}, frames rotos: {stats['torn_frames']}")
+    sys.exit(1 if stats['torn_frames'] else 0)
@@ -1,443 +1,294 @@
 """
 Analizador de stances de karate Goju-Ryu
+
+El núcleo es vectorizado: compute_stance_features() recibe los puntos
+clave (..., 10, 3) y calcula de una vez todas las distancias, ángulos y
+alineaciones que usan los análisis de cada stance, con cualquier número
+de ejes iniciales (un frame, una sesión (T,) o un lote de sesiones).
+Las reglas de cada stance son datos (stance_rules.STANCE_DEFINITIONS)
+compiladas a un evaluador vectorizado.
+
+Ejecutar `python -m analysis.stance_analyzer` lanza un micro-benchmark.
 """
 import numpy as np
 import math
+import time
 from typing import Dict, List, Optional, Tuple
+from .stance_rules import STANCE_DEFINITIONS, compile_stances
+
+
+# Puntos clave en el orden del array compacto (..., 10, 3)
+KEY_POINT_NAMES = (
+    'left_shoulder', 'right_shoulder', 'left_hip', 'right_hip',
+    'left_knee', 'right_knee', 'left_ankle', 'right_ankle',
+    'left_foot_index', 'right_foot_index',
+)
+_LS, _RS, _LH, _RH, _LK, _RK, _LA, _RA, _LF, _RF = range(len(KEY_POINT_NAMES))
+
+# Vectores cabeza - cola sobre los puntos clave, calculados con una sola
+# resta. Muslos y tibias van contiguos para operar ambos lados con slices;
+# la línea de cadera va también invertida para sacar la dirección sagital
+# (-z, x) sin negar (b - a == -(a - b) exacto en coma flotante).
+_VECTOR_HEADS = [_LS, _LA, _LH, _RH, _LA, _RA, _RH, _LF, _RF, _LH]
+_VECTOR_TAILS = [_RS, _RA, _LK, _RK, _LK, _RK, _LH, _LA, _RA, _RH]
+(_SHOULDERS, _ANKLES, _L_THIGH, _R_THIGH, _L_SHIN, _R_SHIN,
+ _HIP_LINE, _L_FOOT, _R_FOOT, _HIP_LINE_REVERSED) = range(len(_VECTOR_HEADS))
+_VECTOR_COUNT = len(_VECTOR_HEADS)
+
+# Extremos (cabeza, cola) de dos filas de vectores cuyo producto escalar
+# fila a fila da de una vez las normas² (cada vector consigo mismo) y el
+# producto muslo · tibia de cada rodilla
+_DOT_ENDS = np.array([
+    [_VECTOR_HEADS + [_LH, _RH], _VECTOR_TAILS + [_LK, _RK]],  # ..., muslos
+    [_VECTOR_HEADS + [_LA, _RA], _VECTOR_TAILS + [_LK, _RK]],  # ..., tibias
+], dtype=np.intp)
+
+# Vectores 2D en el plano del suelo (XZ) como índices en los vectores
+# aplanados de cada frame: dirección sagital, pie izquierdo, pie derecho
+_PLANAR_COMPONENTS = np.array([
+    [3 * _HIP_LINE_REVERSED + 2, 3 * _HIP_LINE],
+    [3 * _L_FOOT, 3 * _L_FOOT + 2],
+    [3 * _R_FOOT, 3 * _R_FOOT + 2],
+], dtype=np.intp)
+
+# Desviación horizontal hombros-caderas con la que la postura puntúa 0
+MAX_POSTURE_DEVIATION = 0.1  # 10% del ancho del frame
+
+# Calificaciones por score mínimo, de mayor a menor
+GRADES = ((90, "Excelente"), (80, "Muy Bueno"), (70, "Bueno"), (60, "Regular"))
+LOWEST_GRADE = "Necesita Trabajo"
+
+NO_KEY_POINTS_FEEDBACK = 'No se detectaron puntos clave suficientes'
+
+
+def _row_dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Producto escalar sobre el último eje. Se hace con matmul porque
+    redondea igual que np.dot / np.linalg.norm (a diferencia de sum()).
+    """
+    return (a[..., None, :] @ b[..., :, None])[..., 0, 0]
+
+
+def _stance_geometry(points: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Parte vectorizada del análisis sobre puntos clave (N, 10, 3): vectores
+    (N, 10, 3), normas (N, 10), ratio tobillos/hombros (N,) y ángulos en
+    grados (N, 4) de rodilla izquierda, derecha y pie izquierdo, derecho
+    (los pies sin plegar a < 90).
+
+    Con un solo frame el coste lo domina la sobrecarga por llamada de
+    NumPy, así que ambos lados, y rodillas y pies, comparten operaciones.
+    """
+    ends = points.take(_DOT_ENDS, axis=1)
+    rows = ends[:, :, 0] - ends[:, :, 1]
+    dots = _row_dot(rows[:, 0], rows[:, 1])
+    vectors = rows[:, 0, :_VECTOR_COUNT]
+    norms = np.sqrt(dots[:, :_VECTOR_COUNT])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Rodillas: ángulo cadera-rodilla-tobillo
+        knee_cosine = (dots[:, _VECTOR_COUNT:] /
+                       (norms[:, _L_THIGH:_R_THIGH + 1] * norms[:, _L_SHIN:_R_SHIN + 1]))
+
+        # Pies: ángulo en el plano del suelo respecto a la dirección sagital
+        # (perpendicular a la línea de la cadera)
+        planar = vectors.reshape(len(vectors), 3 * _VECTOR_COUNT).take(_PLANAR_COMPONENTS, axis=1)
+        planar /= np.sqrt(_row_dot(planar, planar))[:, :, None]
+        foot_cosine = _row_dot(planar[:, 1:], planar[:, :1])
+
+        cosine = np.concatenate([knee_cosine, foot_cosine], axis=1)
+        angles = np.degrees(np.arccos(np.minimum(np.maximum(cosine, -1.0), 1.0)))
+
+        width_ratio = norms[:, _ANKLES] / norms[:, _SHOULDERS]
+
+    return vectors, norms, width_ratio, angles
+
+
+def _select(condition, if_true, if_false):
+    """np.where para escalares de un solo frame"""
+    return if_true if condition else if_false
+
+
+def _stance_measures(points, vectors, norms, width_ratio, angles, where) -> Dict:
+    """
+    Rasgos de stance a partir de la geometría. points, vectors, norms y
+    angles se indexan por punto / vector primero: sin el eje de frames
+    (escalares, where=_select) o con él al final (arrays, where=np.where).
+    """
+    left_knee_angle, right_knee_angle, left_foot_angle, right_foot_angle = angles
+    front_is_left = points[_LA][2] < points[_RA][2]
+
+    # Centros de hombros y caderas
+    shoulder_center_x = (points[_LS][0] + points[_RS][0]) / 2
+    hip_center_x = (points[_LH][0] + points[_RH][0]) / 2
+    posture = 1 - abs(shoulder_center_x - hip_center_x) / MAX_POSTURE_DEVIATION
+
+    return {
+        'shoulder_width': norms[_SHOULDERS],
+        'stance_width': norms[_ANKLES],
+        'stance_width_ratio': width_ratio,
+        'left_knee_angle': left_knee_angle,
+        'right_knee_angle': right_knee_angle,
+        # Pierna delantera: tobillo más cercano a la cámara (z menor)
+        'front_is_left': front_is_left,
+        'front_knee_angle': where(front_is_left, left_knee_angle, right_knee_angle),
+        'back_knee_angle': where(front_is_left, right_knee_angle, left_knee_angle),
+        # Desviación horizontal rodilla-tobillo (colapso hacia adentro)
+        'left_knee_alignment': abs(vectors[_L_SHIN][0]),
+        'right_knee_alignment': abs(vectors[_R_SHIN][0]),
+        # Queremos el ángulo de apertura del pie, que debería ser < 90
+        'left_foot_angle': where(left_foot_angle < 90, left_foot_angle, 180 - left_foot_angle),
+        'right_foot_angle': where(right_foot_angle < 90, right_foot_angle, 180 - right_foot_angle),
+        # Alineación vertical del centro de hombros sobre el de caderas (0-1)
+        'posture_score': where(posture > 0, posture, 0.0),
+        # Aproximación de la distribución de peso: cadera trasera vs centro
+        'weight_shift': abs(hip_center_x - where(front_is_left, points[_RH][0], points[_LH][0])),
+    }
+
+
+def compute_stance_features(points: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Rasgos geométricos de stance para puntos clave (..., 10, 3) float64.
+    Cada valor del dict tiene la forma de los ejes iniciales de points.
+    """
+    lead_shape = points.shape[:-2]
+    points = points.reshape(-1, len(KEY_POINT_NAMES), 3)
+    vectors, norms, width_ratio, angles = _stance_geometry(points)
+    features = _stance_measures(points.transpose(1, 2, 0), vectors.transpose(1, 2, 0),
+                                norms.T, width_ratio, angles.T, np.where)
+    return {name: value.reshape(lead_shape) for name, value in features.items()}
+
+
+def frame_stance_features(points: np.ndarray) -> Dict[str, float]:
+    """Rasgos de stance de un solo frame de puntos clave (10, 3) como floats"""
+    # El resto del análisis es aritmética escalar: con floats de Python
+    # da los mismos resultados y evita la sobrecarga de NumPy por operación
+    vectors, norms, width_ratio, angles = _stance_geometry(points[None])
+    return _stance_measures(points.tolist(), vectors[0].tolist(), norms[0].tolist(),
+                            width_ratio.item(), angles[0].tolist(), _select)
 
 
 class StanceAnalyzer:
     """Analizador especializado en stances de karate"""
     
-    def __init__(self):
-        # Parámetros ideales para cada stance
-        self.stance_parameters = {
-            'sanchin-dachi': {
-                'stance_width_ratio': (1.2, 1.5),  # relación con ancho de hombros
-                'knee_angle_range': (160, 170),    # grados
-                'max_knee_asymmetry': 10,          # grados de diferencia
-                'max_knee_deviation': 0.05,        # desviación de alineación vertical
-                'weight_distribution': (0.45, 0.55),  # rango de distribución de peso
-                'description': 'Posición de tres conflictos'
-            },
-            'zenkutsu-dachi': {
-                'stance_width_ratio': (1.8, 2.2),
-                'front_knee_angle': (130, 150),
-                'back_knee_angle': (165, 175),
-                'weight_distribution': (0.6, 0.8),  # más peso en pierna delantera
-                'description': 'Posición adelantada'
-            },
-            'shiko-dachi': {
-                'stance_width_ratio': (2.0, 2.5),
-                'knee_angle_range': (100, 120),
-                'max_knee_asymmetry': 5,
-                'foot_angle': (30, 45),  # ángulo de apertura de pies
-                'description': 'Posición del sumo'
-            },
-            'neko-ashi-dachi': {
-                'stance_width_ratio': (0.8, 1.2),
-                'front_knee_angle': (140, 160),
-                'back_knee_angle': (100, 130),
-                'weight_distribution': (0.1, 0.3),  # mayoría del peso atrás
-                'description': 'Posición del gato'
-            }
-        }
+    # Índices MediaPipe de los puntos clave usados en el análisis
+    KEY_POINT_INDICES = {
+        'left_shoulder': 11, 'right_shoulder': 12,
+        'left_hip': 23, 'right_hip': 24,
+        'left_knee': 25, 'right_knee': 26,
+        'left_ankle': 27, 'right_ankle': 28,
+        'left_foot_index': 31, 'right_foot_index': 32,
+    }
+    # Filas de KEY_POINT_NAMES en el array de landmarks
+    _key_point_rows = np.array(list(map(KEY_POINT_INDICES.get, KEY_POINT_NAMES)), dtype=np.intp)
     
-    def analyze_stance(self, stance_name: str, landmarks) -> Optional[Dict]:
-        """Analiza un stance específico"""
-        if stance_name not in self.stance_parameters:
-            return None
-        
-        if not landmarks:
-            return None
-        
-        # Métodos específicos por stance
-        if stance_name == 'sanchin-dachi':
-            return self.analyze_sanchin_dachi(landmarks)
-        elif stance_name == 'zenkutsu-dachi':
-            return self.analyze_zenkutsu_dachi(landmarks)
-        elif stance_name == 'shiko-dachi':
-            return self.analyze_shiko_dachi(landmarks)
-        elif stance_name == 'neko-ashi-dachi':
-            return self.analyze_neko_ashi_dachi(landmarks)
-        
-        return None
+    def __init__(self, definitions: Optional[Dict] = None):
+        # Definiciones de cada stance (datos) y sus reglas compiladas
+        self.stance_definitions = STANCE_DEFINITIONS if definitions is None else definitions
+        self.stances = compile_stances(self.stance_definitions)
     
-    def analyze_sanchin_dachi(self, landmarks) -> Dict:
-        """Análisis específico de Sanchin-dachi"""
-        metrics = {}
-        feedback = []
-        score = 100
-        
-        # Extraer puntos clave
-        key_points = self.extract_key_points(landmarks)
-        if not key_points:
-            return {'score': 0, 'feedback': ['No se detectaron puntos clave suficientes']}
-        
-        # 1. Ancho de stance
-        stance_width = self.calculate_stance_width(key_points)
-        shoulder_width = self._calculate_distance(key_points['left_shoulder'], key_points['right_shoulder'])
-        
-        if shoulder_width > 0:
-            width_ratio = stance_width / shoulder_width
-            metrics['stance_width_ratio'] = width_ratio
-            
-            ideal_range = self.stance_parameters['sanchin-dachi']['stance_width_ratio']
-            if not (ideal_range[0] <= width_ratio <= ideal_range[1]):
-                feedback.append("Stance muy estrecho - separa más los pies")
-                score -= 15
-        
-        # 2. Ángulos de rodillas
-        left_knee_angle = self.calculate_knee_angle(key_points, 'left')
-        right_knee_angle = self.calculate_knee_angle(key_points, 'right')
-        
-        if left_knee_angle and right_knee_angle:
-            metrics['left_knee_angle'] = left_knee_angle
-            metrics['right_knee_angle'] = right_knee_angle
-            
-            ideal_range = self.stance_parameters['sanchin-dachi']['knee_angle_range']
-            
-            # Evaluar rodilla izquierda
-            if left_knee_angle < ideal_range[0]:
-                feedback.append("Rodilla izquierda muy flexionada")
-                score -= 10
-            elif left_knee_angle > ideal_range[1]:
-                feedback.append("Rodilla izquierda muy rígida")
-                score -= 5
-            
-            # Evaluar rodilla derecha
-            if right_knee_angle < ideal_range[0]:
-                feedback.append("Rodilla derecha muy flexionada")
-                score -= 10
-            elif right_knee_angle > ideal_range[1]:
-                feedback.append("Rodilla derecha muy rígida")
-                score -= 5
-            
-            # 3. Simetría de rodillas
-            knee_asymmetry = abs(left_knee_angle - right_knee_angle)
-            metrics['knee_symmetry'] = knee_asymmetry
-            
-            max_asymmetry = self.stance_parameters['sanchin-dachi']['max_knee_asymmetry']
-            if knee_asymmetry > max_asymmetry:
-                feedback.append("Asimetría en rodillas - equilibra ambas piernas")
-                score -= 15
-        
-        # 4. Alineación de rodillas (no colapso hacia adentro)
-        left_alignment = self.calculate_knee_alignment(key_points, 'left')
-        right_alignment = self.calculate_knee_alignment(key_points, 'right')
-        
-        if left_alignment is not None:
-            metrics['left_knee_alignment'] = left_alignment
-            max_deviation = self.stance_parameters['sanchin-dachi']['max_knee_deviation']
-            if left_alignment > max_deviation:
-                feedback.append("Rodilla izquierda colapsa hacia adentro")
-                score -= 20
-        
-        if right_alignment is not None:
-            metrics['right_knee_alignment'] = right_alignment
-            max_deviation = self.stance_parameters['sanchin-dachi']['max_knee_deviation']
-            if right_alignment > max_deviation:
-                feedback.append("Rodilla derecha colapsa hacia adentro")
-                score -= 20
-        
-        # 5. Postura general
-        posture_score = self.evaluate_general_posture(key_points)
-        if posture_score < 0.8:
-            feedback.append("Mejorar postura general - mantén espalda recta")
-            score -= 10
-        
-        # Calcular score final
-        metrics['score'] = max(0, score)
-        metrics['feedback'] = feedback
-        metrics['grade'] = self.get_grade(metrics['score'])
+    def analyze_stance(self, stance_name: str, landmarks,
+                       features: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Analiza un stance específico. features permite pasar los rasgos
+        del frame ya calculados (p. ej. de FeatureCache).
+        """
+        stance = self.stances.get(stance_name)
+        if stance is None:
+            return None
         
-        return metrics
-    
-    def analyze_zenkutsu_dachi(self, landmarks) -> Dict:
-        """Análisis específico de Zenkutsu-dachi"""
-        metrics = {}
-        feedback = []
-        score = 100
+        if features is None:
+            if landmarks is None or len(landmarks) == 0:
+                return None
+            # Rasgos geométricos del frame (una sola pasada vectorizada)
+            features = self.frame_features(landmarks)
+        if not features:
+            return {'score': 0, 'feedback': [NO_KEY_POINTS_FEEDBACK]}
         
-        key_points = self.extract_key_points(landmarks)
-        if not key_points:
-            return {'score': 0, 'feedback': ['No se detectaron puntos clave suficientes']}
-
-        # Determinar pierna delantera y trasera
-        front_leg_side = self.get_front_leg(key_points)
-        back_leg_side = 'right' if front_leg_side == 'left' else 'left'
-
-        # 1. Largo del stance
-        stance_length = self._calculate_distance(key_points['left_ankle'], key_points['right_ankle'])
-        shoulder_width = self._calculate_distance(key_points['left_shoulder'], key_points['right_shoulder'])
+        values, conditions, failed = stance.evaluate_frame(features)
         
-        if shoulder_width > 0:
-            length_ratio = stance_length / shoulder_width
-            metrics['stance_length_ratio'] = length_ratio
-            
-            ideal_range = self.stance_parameters['zenkutsu-dachi']['stance_width_ratio']
-            if length_ratio < ideal_range[0]:
-                feedback.append("Stance muy corto - da un paso más largo")
-                score -= 20
-            elif length_ratio > ideal_range[1]:
-                feedback.append("Stance muy largo - acorta el paso")
-                score -= 15
-
-        # 2. Ángulos de rodillas
-        front_knee_angle = self.calculate_knee_angle(key_points, front_leg_side)
-        back_knee_angle = self.calculate_knee_angle(key_points, back_leg_side)
-
-        if front_knee_angle:
-            metrics['front_knee_angle'] = front_knee_angle
-            ideal_range = self.stance_parameters['zenkutsu-dachi']['front_knee_angle']
-            if front_knee_angle < ideal_range[0]:
-                feedback.append("Rodilla frontal muy flexionada")
-                score -= 15
-            elif front_knee_angle > ideal_range[1]:
-                feedback.append("Rodilla frontal poco flexionada")
-                score -= 15
-
-        if back_knee_angle:
-            metrics['back_knee_angle'] = back_knee_angle
-            ideal_range = self.stance_parameters['zenkutsu-dachi']['back_knee_angle']
-            if back_knee_angle < ideal_range[0]:
-                feedback.append("Pierna trasera flexionada - estírala")
-                score -= 20
-
-        # 3. Postura
-        posture_score = self.evaluate_general_posture(key_points)
-        if posture_score < 0.8:
-            feedback.append("Mejora la postura - espalda recta, hombros relajados")
-            score -= 10
-
-        metrics['score'] = max(0, score)
-        metrics['feedback'] = feedback
+        metrics = {name: values[feature] for name, feature, condition in stance.metrics
+                   if conditions[condition]}
+        metrics['score'] = max(0, 100 - sum(stance.penalties[rule] for rule in failed))
+        metrics['feedback'] = [stance.messages[rule] for rule in failed]
         metrics['grade'] = self.get_grade(metrics['score'])
         
         return metrics
     
-    def analyze_shiko_dachi(self, landmarks) -> Dict:
-        """Análisis específico de Shiko-dachi"""
-        metrics = {}
-        feedback = []
-        score = 100
-        
-        key_points = self.extract_key_points(landmarks)
-        if not key_points:
-            return {'score': 0, 'feedback': ['No se detectaron puntos clave suficientes']}
+    def analyze_stance_batch(self, stance_name: str, landmarks: np.ndarray) -> Optional[Dict]:
+        """
+        Analiza una secuencia de frames (T, 33, 4) con operaciones de array.
 
-        # 1. Ancho de stance
-        stance_width = self.calculate_stance_width(key_points)
-        shoulder_width = self._calculate_distance(key_points['left_shoulder'], key_points['right_shoulder'])
-        
-        if shoulder_width > 0:
-            width_ratio = stance_width / shoulder_width
-            metrics['stance_width_ratio'] = width_ratio
-            
-            ideal_range = self.stance_parameters['shiko-dachi']['stance_width_ratio']
-            if width_ratio < ideal_range[0]:
-                feedback.append("Stance muy estrecho - separa más los pies")
-                score -= 20
-            elif width_ratio > ideal_range[1]:
-                feedback.append("Stance muy ancho - acerca un poco los pies")
-                score -= 15
-
-        # 2. Ángulos de rodillas
-        left_knee_angle = self.calculate_knee_angle(key_points, 'left')
-        right_knee_angle = self.calculate_knee_angle(key_points, 'right')
-        
-        if left_knee_angle and right_knee_angle:
-            metrics['left_knee_angle'] = left_knee_angle
-            metrics['right_knee_angle'] = right_knee_angle
-            
-            ideal_range = self.stance_parameters['shiko-dachi']['knee_angle_range']
-            
-            avg_knee_angle = (left_knee_angle + right_knee_angle) / 2
-            if avg_knee_angle < ideal_range[0]:
-                feedback.append("Estás bajando demasiado")
-                score -= 10
-            elif avg_knee_angle > ideal_range[1]:
-                feedback.append("Baja más la cadera, flexiona más las rodillas")
-                score -= 20
-
-            knee_asymmetry = abs(left_knee_angle - right_knee_angle)
-            if knee_asymmetry > self.stance_parameters['shiko-dachi']['max_knee_asymmetry']:
-                feedback.append("Asimetría en rodillas, equilibra el peso")
-                score -= 15
-
-        # 3. Ángulo de los pies
-        left_foot_angle = self.calculate_foot_turnout_angle(key_points, 'left')
-        right_foot_angle = self.calculate_foot_turnout_angle(key_points, 'right')
-
-        if left_foot_angle is not None:
-            metrics['left_foot_angle'] = left_foot_angle
-            ideal_angle_range = self.stance_parameters['shiko-dachi']['foot_angle']
-            if not (ideal_angle_range[0] <= left_foot_angle <= ideal_angle_range[1]):
-                feedback.append("Ajusta el ángulo del pie izquierdo (apunta a 45°)")
-                score -= 10
-
-        if right_foot_angle is not None:
-            metrics['right_foot_angle'] = right_foot_angle
-            ideal_angle_range = self.stance_parameters['shiko-dachi']['foot_angle']
-            if not (ideal_angle_range[0] <= right_foot_angle <= ideal_angle_range[1]):
-                feedback.append("Ajusta el ángulo del pie derecho (apunta a 45°)")
-                score -= 10
-
-        metrics['score'] = max(0, score)
-        metrics['feedback'] = feedback
-        metrics['grade'] = self.get_grade(metrics['score'])
-        
-        return metrics
-    
-    def analyze_neko_ashi_dachi(self, landmarks) -> Dict:
-        """Análisis específico de Neko-ashi-dachi"""
-        metrics = {}
-        feedback = []
-        score = 100
-        
-        key_points = self.extract_key_points(landmarks)
-        if not key_points:
-            return {'score': 0, 'feedback': ['No se detectaron puntos clave suficientes']}
+        Aplica las mismas reglas que analyze_stance frame a frame. Devuelve
+        arrays (T,) por métrica (NaN donde el análisis de un frame no la
+        incluiría), 'score', 'grade', 'feedback' (mensaje -> máscara (T,) de
+        los frames en que aparece) y 'feedback_count' por frame. Los frames
+        sin pose (landmarks NaN) puntúan 0 con NO_KEY_POINTS_FEEDBACK.
+        """
+        stance = self.stances.get(stance_name)
+        if stance is None:
+            return None
 
-        front_leg_side = self.get_front_leg(key_points)
-        back_leg_side = 'right' if front_leg_side == 'left' else 'left'
+        points = self.key_point_array(landmarks)
+        if points is None:
+            return None
+        has_pose = np.isfinite(points).all(axis=(-2, -1))
+        values, conditions, failures = stance.evaluate(compute_stance_features(points))
+        failures &= has_pose
 
-        # 1. Largo del stance
-        stance_length = self._calculate_distance(key_points['left_ankle'], key_points['right_ankle'])
-        shoulder_width = self._calculate_distance(key_points['left_shoulder'], key_points['right_shoulder'])
-        
-        if shoulder_width > 0:
-            length_ratio = stance_length / shoulder_width
-            metrics['stance_length_ratio'] = length_ratio
-            
-            ideal_range = self.stance_parameters['neko-ashi-dachi']['stance_width_ratio']
-            if length_ratio > ideal_range[1]:
-                feedback.append("Stance muy largo, acerca el pie frontal")
-                score -= 15
-
-        # 2. Ángulos de rodillas
-        front_knee_angle = self.calculate_knee_angle(key_points, front_leg_side)
-        back_knee_angle = self.calculate_knee_angle(key_points, back_leg_side)
-
-        if front_knee_angle:
-            metrics['front_knee_angle'] = front_knee_angle
-            ideal_range = self.stance_parameters['neko-ashi-dachi']['front_knee_angle']
-            if not (ideal_range[0] <= front_knee_angle <= ideal_range[1]):
-                feedback.append("Revisa la flexión de la rodilla frontal")
-                score -= 10
-
-        if back_knee_angle:
-            metrics['back_knee_angle'] = back_knee_angle
-            ideal_range = self.stance_parameters['neko-ashi-dachi']['back_knee_angle']
-            if back_knee_angle < ideal_range[0]:
-                feedback.append("Rodilla trasera muy flexionada")
-                score -= 15
-            elif back_knee_angle > ideal_range[1]:
-                feedback.append("Flexiona más la rodilla trasera (baja la cadera)")
-                score -= 20
-
-        # 3. Distribución de peso (aproximación)
-        hip_center = (np.array(key_points['left_hip']) + np.array(key_points['right_hip'])) / 2
-        back_hip = np.array(key_points[f'{back_leg_side}_hip'])
-        
-        weight_dist_proxy = abs(hip_center[0] - back_hip[0])
-        if weight_dist_proxy > 0.1:
-            feedback.append("Lleva el peso a la pierna trasera")
-            score -= 25
+        score = 100 - np.tensordot(stance.penalties, failures, axes=1)
+        score = np.where(has_pose, np.maximum(score, 0), 0)
 
-        metrics['score'] = max(0, score)
-        metrics['feedback'] = feedback
-        metrics['grade'] = self.get_grade(metrics['score'])
-        
-        return metrics
+        result = {
+            name: np.where(conditions[condition] & has_pose, values[feature], np.nan)
+            for name, feature, condition in stance.metrics
+        }
+        result['score'] = score
+        result['grade'] = np.select([score >= threshold for threshold, _ in GRADES],
+                                    [grade for _, grade in GRADES], LOWEST_GRADE)
+        result['feedback'] = {NO_KEY_POINTS_FEEDBACK: ~has_pose}
+        result['feedback'].update(zip(stance.messages, failures))
+        result['feedback_count'] = failures.sum(axis=0) + ~has_pose
+        return result
     
-    def extract_key_points(self, landmarks) -> Optional[Dict]:
-        """Extrae puntos clave de los landmarks"""
+    def key_point_array(self, landmarks) -> Optional[np.ndarray]:
+        """
+        Puntos clave (..., 10, 3) float64 desde landmarks (..., 33, 4) u
+        objetos MediaPipe con x, y, z. None si faltan puntos.
+        """
+        if isinstance(landmarks, np.ndarray):
+            if landmarks.ndim < 2 or landmarks.shape[-2] <= 32:
+                return None
+            return landmarks[..., self._key_point_rows, :3].astype(np.float64)
+        
         try:
-            key_points = {
-                'left_shoulder': [landmarks[11].x, landmarks[11].y, landmarks[11].z],
-                'right_shoulder': [landmarks[12].x, landmarks[12].y, landmarks[12].z],
-                'left_hip': [landmarks[23].x, landmarks[23].y, landmarks[23].z],
-                'right_hip': [landmarks[24].x, landmarks[24].y, landmarks[24].z],
-                'left_knee': [landmarks[25].x, landmarks[25].y, landmarks[25].z],
-                'right_knee': [landmarks[26].x, landmarks[26].y, landmarks[26].z],
-                'left_ankle': [landmarks[27].x, landmarks[27].y, landmarks[27].z],
-                'right_ankle': [landmarks[28].x, landmarks[28].y, landmarks[28].z],
-                'left_foot_index': [landmarks[31].x, landmarks[31].y, landmarks[31].z],
-                'right_foot_index': [landmarks[32].x, landmarks[32].y, landmarks[32].z],
-            }
-            return key_points
-        except (IndexError, AttributeError):
+            return np.array([
+                [landmarks[index].x, landmarks[index].y, landmarks[index].z]
+                for index in self._key_point_rows
+            ], dtype=np.float64)
+        except (IndexError, AttributeError, TypeError):
             return None
     
-    def calculate_stance_width(self, key_points: Dict) -> float:
-        """Calcula el ancho del stance"""
-        return self._calculate_distance(key_points['left_ankle'], key_points['right_ankle'])
-    
-    def _calculate_distance(self, p1: List[float], p2: List[float]) -> float:
-        """Calcula la distancia euclidiana 3D entre dos puntos."""
-        return np.linalg.norm(np.array(p1) - np.array(p2))
-
-    def calculate_knee_angle(self, key_points: Dict, side: str) -> Optional[float]:
-        """Calcula el ángulo de la rodilla"""
-        try:
-            if side == 'left':
-                hip = key_points['left_hip']
-                knee = key_points['left_knee']
-                ankle = key_points['left_ankle']
-            else:
-                hip = key_points['right_hip']
-                knee = key_points['right_knee']
-                ankle = key_points['right_ankle']
-            
-            return self.calculate_angle(hip, knee, ankle)
-        except KeyError:
+    def compute_features(self, landmarks) -> Optional[Dict[str, np.ndarray]]:
+        """Rasgos de stance vectorizados para landmarks (..., 33, 4)"""
+        points = self.key_point_array(landmarks)
+        if points is None:
             return None
+        return compute_stance_features(points)
     
-    def calculate_knee_alignment(self, key_points: Dict, side: str) -> Optional[float]:
-        """Calcula la desviación de alineación de la rodilla"""
-        try:
-            if side == 'left':
-                knee = key_points['left_knee']
-                ankle = key_points['left_ankle']
-            else:
-                knee = key_points['right_knee']
-                ankle = key_points['right_ankle']
-            
-            # Calcular desviación horizontal (colapso hacia adentro)
-            return abs(knee[0] - ankle[0])
-        except KeyError:
+    def frame_features(self, landmarks) -> Optional[Dict]:
+        """Rasgos de stance de un solo frame como floats"""
+        points = self.key_point_array(landmarks)
+        if points is None or points.ndim != 2:
             return None
-
-    def get_front_leg(self, key_points: Dict) -> str:
-        """Determina qué pierna está al frente basado en la coordenada Z del tobillo."""
-        try:
-            if key_points['left_ankle'][2] < key_points['right_ankle'][2]:
-                return 'left'
-            else:
-                return 'right'
-        except (KeyError, IndexError):
-            return 'left' # Fallback
-
-    def calculate_foot_turnout_angle(self, key_points: Dict, side: str) -> Optional[float]:
-        """Calcula el ángulo de apertura del pie en el plano del suelo (XZ)."""
-        try:
-            hip_line = np.array(key_points['right_hip']) - np.array(key_points['left_hip'])
-            hip_line_xz = np.array([hip_line[0], hip_line[2]])
-            
-            # Vector perpendicular a la línea de la cadera, apunta hacia adelante
-            sagittal_dir_xz = np.array([-hip_line_xz[1], hip_line_xz[0]])
-
-            foot_line = np.array(key_points[f'{side}_foot_index']) - np.array(key_points[f'{side}_ankle'])
-            foot_line_xz = np.array([foot_line[0], foot_line[2]])
-
-            angle = self.calculate_angle_2d(foot_line_xz, sagittal_dir_xz)
-            
-            # Queremos el ángulo de apertura, que debería ser < 90
-            return angle if angle < 90 else 180 - angle
-
-        except (KeyError, ZeroDivisionError, IndexError):
+        return frame_stance_features(points)
+    
+    def extract_key_points(self, landmarks) -> Optional[Dict]:
+        """Extrae puntos clave de los landmarks (objetos MediaPipe o array (33, 4))"""
+        points = self.key_point_array(landmarks)
+        if points is None or points.ndim != 2:
             return None
+        return {name: point.tolist() for name, point in zip(KEY_POINT_NAMES, points)}
     
     def calculate_angle(self, point1: List[float], point2: List[float], point3: List[float]) -> float:
         """Calcula el ángulo entre tres puntos"""
@@ -462,49 +313,61 @@ class StanceAnalyzer:
         angle = np.arccos(np.clip(dot_product, -1.0, 1.0))
         return np.degrees(angle)
     
-    def evaluate_general_posture(self, key_points: Dict) -> float:
-        """Evalúa la postura general (0-1)"""
-        try:
-            # Evaluar alineación vertical del torso
-            left_shoulder = key_points['left_shoulder']
-            right_shoulder = key_points['right_shoulder']
-            left_hip = key_points['left_hip']
-            right_hip = key_points['right_hip']
-            
-            # Centro de hombros y caderas
-            shoulder_center = [(left_shoulder[0] + right_shoulder[0]) / 2,
-                             (left_shoulder[1] + right_shoulder[1]) / 2]
-            hip_center = [(left_hip[0] + right_hip[0]) / 2,
-                         (left_hip[1] + right_hip[1]) / 2]
-            
-            # Calcular desviación de la vertical
-            horizontal_deviation = abs(shoulder_center[0] - hip_center[0])
-            
-            # Score basado en desviación (menos desviación = mejor score)
-            max_acceptable_deviation = 0.1  # 10% del ancho del frame
-            score = max(0, 1 - (horizontal_deviation / max_acceptable_deviation))
-            
-            return score
-        except (KeyError, ZeroDivisionError):
-            return 0.5  # Score neutral si no se puede calcular
-    
     def get_grade(self, score: float) -> str:
         """Convierte score numérico a calificación"""
-        if score >= 90:
-            return "Excelente"
-        elif score >= 80:
-            return "Muy Bueno"
-        elif score >= 70:
-            return "Bueno"
-        elif score >= 60:
-            return "Regular"
-        else:
-            return "Necesita Trabajo"
+        for threshold, grade in GRADES:
+            if score >= threshold:
+                return grade
+        return LOWEST_GRADE
     
     def get_stance_info(self, stance_name: str) -> Optional[Dict]:
         """Obtiene información de un stance"""
-        return self.stance_parameters.get(stance_name)
+        return self.stance_definitions.get(stance_name)
     
     def get_available_stances(self) -> List[str]:
         """Obtiene lista de stances disponibles"""
-        return list(self.stance_parameters.keys())
+        return list(self.stance_definitions.keys())
+
+
+def benchmark(iterations: int = 2000, batch_frames: int = 10000) -> Dict[str, float]:
+    """
+    Micro-benchmark del análisis por frame, en microsegundos: array (33, 4)
+    float32 como llega del worker, lista de objetos tipo MediaPipe, y
+    compute_features / analyze_stance_batch sobre un lote (T, 33, 4)
+    dividido entre T.
+    """
+    class Landmark:
+        def __init__(self, x, y, z, visibility):
+            self.x, self.y, self.z, self.visibility = x, y, z, visibility
+
+    rng = np.random.default_rng(0)
+    landmarks = rng.uniform(0, 1, (33, 4)).astype(np.float32)
+    landmark_objects = [Landmark(*map(float, row)) for row in landmarks]
+    batch = rng.uniform(0, 1, (batch_frames, 33, 4)).astype(np.float32)
+    analyzer = StanceAnalyzer()
+
+    def per_call(function, *args, repeat=iterations):
+        best = math.inf
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                function(*args)
+            best = min(best, (time.perf_counter() - start) / repeat)
+        return best * 1e6
+
+    results = {}
+    for stance in analyzer.get_available_stances():
+        results[f'{stance} (array)'] = per_call(analyzer.analyze_stance, stance, landmarks)
+        results[f'{stance} (objetos)'] = per_call(analyzer.analyze_stance, stance, landmark_objects)
+    results['compute_features (lote, por frame)'] = (
+        per_call(analyzer.compute_features, batch, repeat=10) / batch_frames
+    )
+    results['analyze_stance_batch (lote, por frame)'] = (
+        per_call(analyzer.analyze_stance_batch, 'sanchin-dachi', batch, repeat=10) / batch_frames
+    )
+    return results
+
+
+if __name__ == '__main__':
+    for name, microseconds in benchmark().items():
+        print(f"{name:<40} {microseconds:8.2f} µs/frame")
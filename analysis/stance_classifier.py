@@ -0,0 +1,249 @@
+"""
+Reconocimiento automático del stance a partir de la pose en vivo
+
+StanceClassifier puntúa cada frame contra todos los stances definidos
+(las reglas compiladas de StanceAnalyzer) y contra las referencias
+capturadas en una sola pasada: los rasgos geométricos se calculan una vez
+y las referencias se comparan todas con una resta vectorizada. Una
+histéresis (umbral de entrada y de salida, margen y frames consecutivos)
+evita que el stance reconocido parpadee entre frames.
+
+Ejecutar `python -m analysis.stance_classifier` mide el coste por frame.
+"""
+import glob
+import json
+import math
+import os
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from .landmark_protocol import NUM_LANDMARKS, landmarks_to_array
+from .stance_analyzer import KEY_POINT_NAMES, StanceAnalyzer, frame_stance_features, _row_dot
+
+
+_LS, _RS, _LH, _RH = map(KEY_POINT_NAMES.index, ('left_shoulder', 'right_shoulder',
+                                                  'left_hip', 'right_hip'))
+
+# Intercambio izquierda / derecha de los puntos clave (pose en espejo)
+_MIRRORED_KEY_POINTS = np.array([1, 0, 3, 2, 5, 4, 7, 6, 9, 8], dtype=np.intp)
+
+# Distancia RMS (en longitudes de torso) a la que la similitud con una
+# referencia llega a 0
+REFERENCE_TOLERANCE = 0.5
+
+
+def normalized_shape(points: np.ndarray) -> np.ndarray:
+    """
+    Silueta (..., 10, 2) de los puntos clave (..., 10, 3) en el plano de
+    la imagen, centrada en la cadera y escalada por la longitud del torso,
+    para comparar poses sin depender de la posición ni de la distancia a
+    la cámara.
+    """
+    planar = points[..., :2]
+    hip_center = (planar[..., _LH, :] + planar[..., _RH, :]) / 2
+    shoulder_center = (planar[..., _LS, :] + planar[..., _RS, :]) / 2
+    torso = np.sqrt(((shoulder_center - hip_center) ** 2).sum(axis=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (planar - hip_center[..., None, :]) / torso[..., None, None]
+
+
+def _frame_shape(points: np.ndarray) -> np.ndarray:
+    """normalized_shape() de un solo frame, aplanada a (20,)"""
+    torso_points = points[[_LS, _RS, _LH, _RH], :2].tolist()
+    (ls_x, ls_y), (rs_x, rs_y), (lh_x, lh_y), (rh_x, rh_y) = torso_points
+    hip_x, hip_y = (lh_x + rh_x) / 2, (lh_y + rh_y) / 2
+    # Torso nulo -> NaN sin pasar por np.errstate, que cuesta más que el cálculo
+    torso = math.hypot((ls_x + rs_x) / 2 - hip_x, (ls_y + rs_y) / 2 - hip_y) or math.nan
+    return ((points[:, :2] - (hip_x, hip_y)) / torso).reshape(20)
+
+
+class StanceClassifier:
+    """Reconoce el stance de la pose en vivo con histéresis"""
+
+    def __init__(self, analyzer: Optional[StanceAnalyzer] = None, enter_score: float = 70,
+                 exit_score: float = 55, margin: float = 10, hold_frames: int = 5):
+        self.analyzer = analyzer or StanceAnalyzer()
+        # Un stance se reconoce al superar enter_score durante hold_frames
+        # frames seguidos, y se abandona al bajar de exit_score o cuando
+        # otro lo supera por margin durante hold_frames frames
+        self.enter_score = enter_score
+        self.exit_score = exit_score
+        self.margin = margin
+        self.hold_frames = hold_frames
+
+        self.candidates: List[str] = list(self.analyzer.stances)
+        self.references: Dict[str, List[np.ndarray]] = {}
+        self._build_reference_table()
+        self.reset()
+
+    def reset(self):
+        """Olvida el stance reconocido"""
+        self.stance = None
+        self.pending = None
+        self.pending_frames = 0
+
+    # === REFERENCIAS ===
+
+    def add_reference(self, technique: str, landmarks) -> bool:
+        """Añade una referencia capturada (landmarks (33, 4) o lista de dicts JSON)"""
+        if not isinstance(landmarks, np.ndarray):
+            if not isinstance(landmarks, list) or len(landmarks) != NUM_LANDMARKS:
+                return False
+            try:
+                landmarks = landmarks_to_array(landmarks)
+            except (KeyError, IndexError, TypeError, ValueError):
+                return False
+        points = self.analyzer.key_point_array(landmarks)
+        if points is None or points.ndim != 2 or not np.isfinite(points).all():
+            return False
+
+        shape = normalized_shape(points)
+        if not np.isfinite(shape).all():
+            return False
+        # La referencia vale también en espejo (pierna delantera cambiada)
+        mirrored = shape[_MIRRORED_KEY_POINTS] * (-1.0, 1.0)
+        self.references.setdefault(technique, []).extend([shape, mirrored])
+        if technique not in self.candidates:
+            self.candidates.append(technique)
+        self._build_reference_table()
+        return True
+
+    def load_references(self, directory: str = 'data/references') -> int:
+        """Carga las referencias de stances guardadas como JSON en directory"""
+        loaded = 0
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error leyendo referencia {path}: {e}")
+                continue
+            if data.get('category', 'stances') != 'stances' or 'technique' not in data:
+                continue
+            loaded += self.add_reference(data['technique'], data.get('landmarks'))
+        if loaded:
+            print(f"Referencias de stances cargadas: {loaded}")
+        return loaded
+
+    def _build_reference_table(self):
+        """Apila las referencias en un array (R, 20) agrupado por candidato"""
+        shapes, self._reference_groups = [], []
+        for index, technique in enumerate(self.candidates):
+            if self.references.get(technique):
+                start = len(shapes)
+                shapes.extend(self.references[technique])
+                self._reference_groups.append((index, start, len(shapes)))
+        self._reference_shapes = np.array(shapes, dtype=np.float64).reshape(len(shapes), 20)
+
+    # === PUNTUACIÓN ===
+
+    def score_frame(self, landmarks) -> Optional[List[float]]:
+        """
+        Puntuación 0-100 de la pose contra cada candidato (orden de
+        self.candidates). Los stances con reglas usan el score de
+        analyze_stance, promediado con la mejor similitud a sus referencias
+        si las hay; las técnicas solo capturadas usan la similitud.
+        """
+        points = self.analyzer.key_point_array(landmarks)
+        if points is None or points.ndim != 2:
+            return None
+        # Un frame: floats de Python salvo donde NumPy opera sobre varias
+        # filas a la vez (geometría y distancias a todas las referencias)
+        return self.score_features(points, frame_stance_features(points))
+
+    def score_features(self, points: np.ndarray, features: Dict) -> List[float]:
+        """
+        score_frame() a partir de los puntos clave (10, 3) y sus rasgos de
+        stance ya calculados (p. ej. de FeatureCache)
+        """
+        scores = [0.0] * len(self.candidates)
+        for index, stance in enumerate(self.analyzer.stances.values()):
+            _, _, failed = stance.evaluate_frame(features)
+            scores[index] = max(0, 100 - sum(stance.penalties[rule] for rule in failed))
+
+        if self._reference_groups:
+            difference = self._reference_shapes - _frame_shape(points)
+            distances = np.sqrt(_row_dot(difference, difference) / 10).tolist()
+            for index, start, stop in self._reference_groups:
+                # NaN (torso degenerado) cuenta como similitud 0
+                similarity = 100 * max(0.0, 1 - min(distances[start:stop]) / REFERENCE_TOLERANCE)
+                if similarity != similarity:
+                    similarity = 0.0
+                if index < len(self.analyzer.stances):
+                    scores[index] = (scores[index] + similarity) / 2
+                else:
+                    scores[index] = similarity
+        return scores
+
+    def update(self, scores: Optional[List[float]]) -> Dict:
+        """
+        Avanza la histéresis con las puntuaciones de un frame (None si no
+        hay pose). Devuelve {'stance', 'score', 'scores'}: stance reconocido
+        (None si ninguno) con su puntuación en este frame.
+        """
+        if scores is None:
+            scores = [0.0] * len(self.candidates)
+        best_score = max(scores, default=0.0)
+        best = self.candidates[scores.index(best_score)] if scores else None
+
+        if self.stance is None:
+            candidate = best if best_score >= self.enter_score else None
+        else:
+            current_score = scores[self.candidates.index(self.stance)]
+            if current_score < self.exit_score:
+                candidate = best if best_score >= self.enter_score else None
+            elif best != self.stance and best_score >= max(current_score + self.margin,
+                                                          self.enter_score):
+                candidate = best
+            else:
+                candidate = self.stance
+
+        if candidate == self.stance:
+            self.pending, self.pending_frames = None, 0
+        elif candidate == self.pending:
+            self.pending_frames += 1
+        else:
+            self.pending, self.pending_frames = candidate, 1
+        if self.pending_frames >= self.hold_frames:
+            self.stance = self.pending
+            self.pending, self.pending_frames = None, 0
+
+        score = scores[self.candidates.index(self.stance)] if self.stance is not None else 0.0
+        return {
+            'stance': self.stance,
+            'score': float(score),
+            'scores': dict(zip(self.candidates, scores)),
+        }
+
+    def recognize(self, landmarks) -> Dict:
+        """Puntúa un frame (landmarks (33, 4) o None) y actualiza el stance reconocido"""
+        return self.update(None if landmarks is None else self.score_frame(landmarks))
+
+
+def benchmark(iterations: int = 2000, references: int = 8) -> Dict[str, float]:
+    """Coste por frame de recognize() en microsegundos, sin y con referencias"""
+    rng = np.random.default_rng(0)
+    landmarks = rng.uniform(0, 1, (33, 4)).astype(np.float32)
+    classifier = StanceClassifier()
+
+    def per_call():
+        best = math.inf
+        for _ in range(3):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                classifier.recognize(landmarks)
+            best = min(best, (time.perf_counter() - start) / iterations)
+        return best * 1e6
+
+    results = {'recognize (solo reglas)': per_call()}
+    stances = list(classifier.analyzer.stances)
+    for index in range(references):
+        classifier.add_reference(stances[index % len(stances)],
+                                 rng.uniform(0, 1, (33, 4)).astype(np.float32))
+    results[f'recognize ({references} referencias)'] = per_call()
+    return results
+
+
+if __name__ == '__main__':
+    for name, microseconds in benchmark().items():
+        print(f"{name:<40} {microseconds:8.2f} µs/frame")
@@ -0,0 +1,246 @@
+"""
+Definiciones de stances como datos y su evaluador compilado
+
+Cada stance es un dict con:
+    'description': texto para la UI
+    'metrics':     (nombre, rasgo, condición) que se reportan; la métrica
+                   solo aparece en el resultado si se cumple la condición
+    'rules':       dicts con 'feature', el rango ('min', 'max' o 'range'),
+                   'penalty', 'message' y opcionalmente 'when' (condición)
+
+    'min': v      falla si rasgo < v
+    'max': v      falla si rasgo > v
+    'range': (a, b)  falla si no a <= rasgo <= b (también con NaN)
+
+Los rasgos son los de compute_stance_features() más DERIVED_FEATURES, y
+las condiciones las de CONDITIONS. Añadir un stance o una postura de kata
+es añadir una entrada a STANCE_DEFINITIONS (o pasar otras definiciones a
+StanceAnalyzer), sin código nuevo.
+"""
+import numpy as np
+from typing import Dict, Tuple
+
+
+# Rasgos calculados a partir de los de compute_stance_features(); sirven
+# igual para escalares de un frame que para arrays de una sesión
+DERIVED_FEATURES = {
+    'knee_asymmetry': lambda f: abs(f['left_knee_angle'] - f['right_knee_angle']),
+    'average_knee_angle': lambda f: (f['left_knee_angle'] + f['right_knee_angle']) / 2,
+}
+
+# Condiciones para reportar una métrica o aplicar una regla
+CONDITIONS = {
+    'has_width': lambda f: f['shoulder_width'] > 0,
+    'has_knees': lambda f: (f['left_knee_angle'] != 0) & (f['right_knee_angle'] != 0),
+    'has_front_knee': lambda f: f['front_knee_angle'] != 0,
+    'has_back_knee': lambda f: f['back_knee_angle'] != 0,
+}
+
+
+STANCE_DEFINITIONS = {
+    'sanchin-dachi': {
+        'description': 'Posición de tres conflictos',
+        'metrics': (
+            ('stance_width_ratio', 'stance_width_ratio', 'has_width'),
+            ('left_knee_angle', 'left_knee_angle', 'has_knees'),
+            ('right_knee_angle', 'right_knee_angle', 'has_knees'),
+            ('knee_symmetry', 'knee_asymmetry', 'has_knees'),
+            ('left_knee_alignment', 'left_knee_alignment', None),
+            ('right_knee_alignment', 'right_knee_alignment', None),
+        ),
+        'rules': (
+            # Ancho relativo al de hombros
+            {'feature': 'stance_width_ratio', 'range': (1.2, 1.5), 'when': 'has_width',
+             'penalty': 15, 'message': "Stance muy estrecho - separa más los pies"},
+            # Rodillas entre 160 y 170 grados
+            {'feature': 'left_knee_angle', 'min': 160, 'when': 'has_knees',
+             'penalty': 10, 'message': "Rodilla izquierda muy flexionada"},
+            {'feature': 'left_knee_angle', 'max': 170, 'when': 'has_knees',
+             'penalty': 5, 'message': "Rodilla izquierda muy rígida"},
+            {'feature': 'right_knee_angle', 'min': 160, 'when': 'has_knees',
+             'penalty': 10, 'message': "Rodilla derecha muy flexionada"},
+            {'feature': 'right_knee_angle', 'max': 170, 'when': 'has_knees',
+             'penalty': 5, 'message': "Rodilla derecha muy rígida"},
+            {'feature': 'knee_asymmetry', 'max': 10, 'when': 'has_knees',
+             'penalty': 15, 'message': "Asimetría en rodillas - equilibra ambas piernas"},
+            # Alineación de rodillas (no colapso hacia adentro)
+            {'feature': 'left_knee_alignment', 'max': 0.05,
+             'penalty': 20, 'message': "Rodilla izquierda colapsa hacia adentro"},
+            {'feature': 'right_knee_alignment', 'max': 0.05,
+             'penalty': 20, 'message': "Rodilla derecha colapsa hacia adentro"},
+            {'feature': 'posture_score', 'min': 0.8,
+             'penalty': 10, 'message': "Mejorar postura general - mantén espalda recta"},
+        ),
+    },
+    'zenkutsu-dachi': {
+        'description': 'Posición adelantada',
+        'metrics': (
+            ('stance_length_ratio', 'stance_width_ratio', 'has_width'),
+            ('front_knee_angle', 'front_knee_angle', 'has_front_knee'),
+            ('back_knee_angle', 'back_knee_angle', 'has_back_knee'),
+        ),
+        'rules': (
+            {'feature': 'stance_width_ratio', 'min': 1.8, 'when': 'has_width',
+             'penalty': 20, 'message': "Stance muy corto - da un paso más largo"},
+            {'feature': 'stance_width_ratio', 'max': 2.2, 'when': 'has_width',
+             'penalty': 15, 'message': "Stance muy largo - acorta el paso"},
+            {'feature': 'front_knee_angle', 'min': 130, 'when': 'has_front_knee',
+             'penalty': 15, 'message': "Rodilla frontal muy flexionada"},
+            {'feature': 'front_knee_angle', 'max': 150, 'when': 'has_front_knee',
+             'penalty': 15, 'message': "Rodilla frontal poco flexionada"},
+            {'feature': 'back_knee_angle', 'min': 165, 'when': 'has_back_knee',
+             'penalty': 20, 'message': "Pierna trasera flexionada - estírala"},
+            {'feature': 'posture_score', 'min': 0.8,
+             'penalty': 10, 'message': "Mejora la postura - espalda recta, hombros relajados"},
+        ),
+    },
+    'shiko-dachi': {
+        'description': 'Posición del sumo',
+        'metrics': (
+            ('stance_width_ratio', 'stance_width_ratio', 'has_width'),
+            ('left_knee_angle', 'left_knee_angle', 'has_knees'),
+            ('right_knee_angle', 'right_knee_angle', 'has_knees'),
+            ('left_foot_angle', 'left_foot_angle', None),
+            ('right_foot_angle', 'right_foot_angle', None),
+        ),
+        'rules': (
+            {'feature': 'stance_width_ratio', 'min': 2.0, 'when': 'has_width',
+             'penalty': 20, 'message': "Stance muy estrecho - separa más los pies"},
+            {'feature': 'stance_width_ratio', 'max': 2.5, 'when': 'has_width',
+             'penalty': 15, 'message': "Stance muy ancho - acerca un poco los pies"},
+            {'feature': 'average_knee_angle', 'min': 100, 'when': 'has_knees',
+             'penalty': 10, 'message': "Estás bajando demasiado"},
+            {'feature': 'average_knee_angle', 'max': 120, 'when': 'has_knees',
+             'penalty': 20, 'message': "Baja más la cadera, flexiona más las rodillas"},
+            {'feature': 'knee_asymmetry', 'max': 5, 'when': 'has_knees',
+             'penalty': 15, 'message': "Asimetría en rodillas, equilibra el peso"},
+            # Apertura de los pies
+            {'feature': 'left_foot_angle', 'range': (30, 45),
+             'penalty': 10, 'message': "Ajusta el ángulo del pie izquierdo (apunta a 45°)"},
+            {'feature': 'right_foot_angle', 'range': (30, 45),
+             'penalty': 10, 'message': "Ajusta el ángulo del pie derecho (apunta a 45°)"},
+        ),
+    },
+    'neko-ashi-dachi': {
+        'description': 'Posición del gato',
+        'metrics': (
+            ('stance_length_ratio', 'stance_width_ratio', 'has_width'),
+            ('front_knee_angle', 'front_knee_angle', 'has_front_knee'),
+            ('back_knee_angle', 'back_knee_angle', 'has_back_knee'),
+        ),
+        'rules': (
+            {'feature': 'stance_width_ratio', 'max': 1.2, 'when': 'has_width',
+             'penalty': 15, 'message': "Stance muy largo, acerca el pie frontal"},
+            {'feature': 'front_knee_angle', 'range': (140, 160), 'when': 'has_front_knee',
+             'penalty': 10, 'message': "Revisa la flexión de la rodilla frontal"},
+            {'feature': 'back_knee_angle', 'min': 100, 'when': 'has_back_knee',
+             'penalty': 15, 'message': "Rodilla trasera muy flexionada"},
+            {'feature': 'back_knee_angle', 'max': 130, 'when': 'has_back_knee',
+             'penalty': 20, 'message': "Flexiona más la rodilla trasera (baja la cadera)"},
+            # Distribución de peso (aproximación): la mayoría atrás
+            {'feature': 'weight_shift', 'max': 0.1,
+             'penalty': 25, 'message': "Lleva el peso a la pierna trasera"},
+        ),
+    },
+}
+
+
+def _unique(names):
+    """Nombres sin repetir, en orden de aparición"""
+    return tuple(dict.fromkeys(names))
+
+
+class CompiledStance:
+    """
+    Reglas de un stance compiladas a arrays. Cada rasgo y condición
+    distintos se calculan una vez, y todas las reglas se evalúan juntas
+    con unas pocas comparaciones sobre un array (reglas, ...).
+    """
+
+    def __init__(self, name: str, definition: Dict):
+        self.name = name
+        self.description = definition.get('description', '')
+        rules = definition['rules']
+        metrics = definition.get('metrics', ())
+
+        self.features = _unique([feature for _, feature, _ in metrics] +
+                                [rule['feature'] for rule in rules])
+        # La condición None (siempre cierta) es la fila 0
+        self.conditions = _unique([None] + [when for _, _, when in metrics] +
+                                  [rule.get('when') for rule in rules])
+
+        self.metrics = tuple(
+            (metric, self.features.index(feature), self.conditions.index(when))
+            for metric, feature, when in metrics
+        )
+
+        lower, upper, nan_fails = [], [], []
+        for rule in rules:
+            if 'range' in rule:
+                low, high = rule['range']
+            else:
+                low, high = rule.get('min', -np.inf), rule.get('max', np.inf)
+            lower.append(low)
+            upper.append(high)
+            # 'range' es not (a <= x <= b): NaN queda fuera; min/max son x < a, x > b
+            nan_fails.append('range' in rule)
+
+        self.rule_features = np.array([self.features.index(rule['feature']) for rule in rules],
+                                      dtype=np.intp)
+        self.rule_conditions = np.array([self.conditions.index(rule.get('when')) for rule in rules],
+                                        dtype=np.intp)
+        self.lower = np.array(lower, dtype=np.float64)
+        self.upper = np.array(upper, dtype=np.float64)
+        self.nan_fails = np.array(nan_fails, dtype=bool)
+        self.penalties = tuple(rule['penalty'] for rule in rules)
+        self.messages = tuple(rule['message'] for rule in rules)
+        # Las mismas tablas como tuplas para evaluar un frame en Python
+        self._frame_rules = tuple(zip(self.rule_features.tolist(), self.lower.tolist(),
+                                      self.upper.tolist(), nan_fails, self.rule_conditions.tolist()))
+
+    def evaluate(self, features: Dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Evalúa las reglas sobre rasgos escalares (un frame) o arrays de
+        forma S (una sesión). Devuelve (valores (rasgos, *S), condiciones
+        (condiciones, *S), fallos (reglas, *S)).
+        """
+        values = np.array([
+            features[name] if name in features else DERIVED_FEATURES[name](features)
+            for name in self.features
+        ], dtype=np.float64)
+
+        shape = values.shape[1:]
+        conditions = np.empty((len(self.conditions),) + shape, dtype=bool)
+        conditions[0] = True
+        for row, name in enumerate(self.conditions[1:], 1):
+            conditions[row] = CONDITIONS[name](features)
+
+        axes = (slice(None),) + (None,) * len(shape)
+        rule_values = values[self.rule_features]
+        failures = (rule_values < self.lower[axes]) | (rule_values > self.upper[axes])
+        failures |= self.nan_fails[axes] & np.isnan(rule_values)
+        failures &= conditions[self.rule_conditions]
+        return values, conditions, failures
+
+    def evaluate_frame(self, features: Dict) -> Tuple[list, list, list]:
+        """
+        Versión de evaluate() para los rasgos escalares de un frame: con
+        floats de Python evita la sobrecarga de NumPy por operación.
+        Devuelve (valores, condiciones, índices de las reglas que fallan).
+        """
+        values = [features[name] if name in features else DERIVED_FEATURES[name](features)
+                  for name in self.features]
+        conditions = [True] + [CONDITIONS[name](features) for name in self.conditions[1:]]
+        failed = [
+            rule for rule, (feature, low, high, nan_fails, condition) in enumerate(self._frame_rules)
+            if conditions[condition] and (
+                values[feature] < low or values[feature] > high or
+                (nan_fails and values[feature] != values[feature])
+            )
+        ]
+        return values, conditions, failed
+
+
+def compile_stances(definitions: Dict) -> Dict[str, CompiledStance]:
+    """Compila un dict nombre -> definición de stance"""
+    return {name: CompiledStance(name, definition) for name, definition in definitions.items()}
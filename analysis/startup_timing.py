@@ -0,0 +1,72 @@
+"""
+Medición del arranque en frío: marcas de tiempo de cada fase hasta el
+primer landmark mostrado en pantalla
+
+Las marcas son time.time(), así que las del worker (otro proceso) se
+pueden mezclar con las de la UI en una sola línea de tiempo.
+"""
+import json
+import os
+import threading
+import time
+
+
+# Fases que, una vez registradas, cierran el informe de arranque de la UI
+REPORT_PHASES = ('worker_first_landmark', 'first_landmark_shown')
+
+
+class StartupTimeline:
+    """Marcas de tiempo de las fases de arranque (solo cuenta la primera vez)"""
+
+    def __init__(self, origin=None, report_phases=()):
+        self.origin = time.time() if origin is None else origin
+        self.marks = {}
+        self.report_phases = report_phases
+        self.reported = False
+        self.lock = threading.Lock()
+
+    def mark(self, phase, timestamp=None):
+        """Registra la primera vez que ocurre una fase. Devuelve True si es nueva"""
+        with self.lock:
+            if phase in self.marks:
+                return False
+            self.marks[phase] = time.time() if timestamp is None else timestamp
+
+            complete = (bool(self.report_phases) and not self.reported and
+                        all(p in self.marks for p in self.report_phases))
+            if complete:
+                self.reported = True
+
+        if complete:
+            self.publish()
+        return True
+
+    def merge(self, marks, prefix=''):
+        """Añade las marcas de otro proceso con un prefijo"""
+        for phase, timestamp in marks.items():
+            self.mark(prefix + phase, timestamp)
+
+    def elapsed(self):
+        """Dict fase -> segundos desde el origen, en orden cronológico"""
+        with self.lock:
+            items = sorted(self.marks.items(), key=lambda item: item[1])
+        return {phase: timestamp - self.origin for phase, timestamp in items}
+
+    def report(self):
+        """Informe legible: ms desde el origen y desde la fase anterior"""
+        lines = ["Arranque (ms desde el inicio del proceso):"]
+        previous = 0.0
+        for phase, seconds in self.elapsed().items():
+            lines.append(f"  {phase:<30} {seconds * 1000:8.0f}  (+{(seconds - previous) * 1000:.0f})")
+            previous = seconds
+        return '\n'.join(lines)
+
+    def publish(self):
+        """Imprime el informe y lo añade a KOHAI_STARTUP_LOG (una línea JSON) si está definido"""
+        print(self.report())
+
+        path = os.environ.get('KOHAI_STARTUP_LOG')
+        if path:
+            entry = {'origin': self.origin, 'phases': self.elapsed()}
+            with open(path, 'a') as log:
+                log.write(json.dumps(entry) + '\n')
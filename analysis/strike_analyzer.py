@@ -0,0 +1,251 @@
+"""
+Analizador incremental de golpes de puño (seiken-zuki, gyaku-zuki,
+uraken-uchi, shuto-uchi)
+
+Cada frame se añade a un KinematicsBuffer con hombros, codos, muñecas y
+caderas; la velocidad y aceleración de las muñecas salen del filtro
+Savitzky-Golay en O(1). Una máquina de estados por mano detecta el golpe
+(la muñeca se aleja del hombro por encima de un umbral de velocidad) y
+su final (la muñeca deja de alejarse o se frena). Solo entonces se
+recorre el tramo del golpe en el buffer para calcular sus métricas.
+Con TechniqueSegmenter, push() solo llena el buffer y analyze_segment()
+mide los segmentos del brazo que este publica.
+
+Las distancias se miden en longitudes de torso y se pasan a metros con
+REFERENCE_TORSO_LENGTH (ver kinematics.py).
+
+Ejecutar `python -m analysis.strike_analyzer` analiza golpes sintéticos
+y mide el coste por frame.
+"""
+import math
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from .kinematics import REFERENCE_TORSO_LENGTH, KinematicsBuffer, torso_length
+
+
+# Puntos seguidos (índices MediaPipe) en el orden del buffer
+STRIKE_POINT_INDICES = {
+    'left_shoulder': 11, 'right_shoulder': 12,
+    'left_elbow': 13, 'right_elbow': 14,
+    'left_wrist': 15, 'right_wrist': 16,
+    'left_hip': 23, 'right_hip': 24,
+}
+_STRIKE_ROWS = np.array(list(STRIKE_POINT_INDICES.values()), dtype=np.intp)
+_SHOULDER, _ELBOW, _WRIST, _HIP = 0, 2, 4, 6   # + 0 izquierda, + 1 derecha
+HANDS = ('left', 'right')
+
+
+class StrikeAnalyzer:
+    """Detecta golpes de puño en el flujo de landmarks y mide cada uno al terminar"""
+
+    def __init__(self, aspect_ratio: float = 480 / 640, start_speed: float = 2.0,
+                 end_speed: float = 0.8, min_peak_speed: float = 3.0,
+                 min_reach_gain: float = 0.3, max_duration: float = 1.0, window: int = 5):
+        # Alto / ancho del frame: x e y normalizados pasan a la misma escala
+        self.aspect_ratio = aspect_ratio
+        # Umbrales en torsos/s: inicio, fin tras el pico y pico mínimo
+        self.start_speed = start_speed
+        self.end_speed = end_speed
+        self.min_peak_speed = min_peak_speed
+        # Alcance hombro-muñeca que debe ganar el golpe (torsos): descarta
+        # retracciones y movimientos que no extienden el brazo
+        self.min_reach_gain = min_reach_gain
+        self.max_duration = max_duration
+        self.buffer = KinematicsBuffer(len(_STRIKE_ROWS), window=window, polyorder=2)
+        self.reset()
+
+    def reset(self):
+        """Olvida el historial y los golpes en curso"""
+        self.buffer.reset()
+        # Golpe en curso por mano: None o [frame inicial, timestamp inicial, pico, frame del pico]
+        self._active = [None, None]
+
+    def push(self, timestamp: float, landmarks: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Añade un frame (landmarks (33, 4) de una detección nueva) al buffer
+        y devuelve sus estimaciones (3, P, 3), o None sin ventana completa.
+        """
+        points = landmarks[_STRIKE_ROWS, :3].astype(np.float64)
+        points[:, 1] *= self.aspect_ratio
+        state = self.buffer.push(timestamp, points)
+        if self.buffer.count == 1:
+            # Hueco: el historial se reinició
+            self._active = [None, None]
+        return state if self.buffer.ready else None
+
+    def analyze_segment(self, segment: Dict) -> List[Dict]:
+        """
+        Métricas del segmento de TechniqueSegmenter (lista vacía si no es
+        de un brazo o no es un golpe). El golpe va del inicio del segmento
+        a la máxima extensión; la recogida posterior no cuenta.
+        """
+        limb = segment['limb']
+        if not limb.endswith('_arm'):
+            return []
+        hand = HANDS.index(limb[:-len('_arm')])
+        times, states = self.buffer.span(segment['start_time'], segment['end_time'])
+        position = states[:, 0]
+        reach = np.linalg.norm(position[:, _WRIST + hand] - position[:, _SHOULDER + hand], axis=1)
+        if len(times) < 3 or np.isnan(reach).all():
+            return []
+        end = int(np.nanargmax(reach)) + 1
+        strike = self._strike_metrics(hand, times[:end], states[:end])
+        return [strike] if strike is not None else []
+
+    def update(self, timestamp: float, landmarks: np.ndarray) -> List[Dict]:
+        """
+        Añade un frame (landmarks (33, 4) de una detección nueva) y devuelve
+        las métricas de los golpes que terminan en él (normalmente ninguno),
+        detectados por la máquina de estados propia.
+        """
+        state = self.push(timestamp, landmarks)
+        if state is None:
+            return []
+
+        position, velocity = state[0], state[1]
+        torso = torso_length(position, _SHOULDER, _HIP)
+        if not torso > 0:
+            return []
+
+        strikes = []
+        frame = self.buffer.total
+        for hand in (0, 1):
+            wrist_velocity = velocity[_WRIST + hand]
+            speed = math.sqrt(wrist_velocity @ wrist_velocity) / torso
+            outward = wrist_velocity @ (position[_WRIST + hand] - position[_SHOULDER + hand]) > 0
+            active = self._active[hand]
+
+            if active is None:
+                if outward and speed >= self.start_speed:
+                    self._active[hand] = [frame, timestamp, speed, frame]
+                continue
+
+            if speed > active[2]:
+                active[2], active[3] = speed, frame
+            finished = not outward or (speed < self.end_speed and frame > active[3])
+            if timestamp - active[1] > self.max_duration:
+                # Movimiento demasiado largo para un golpe: descartar
+                self._active[hand] = None
+            elif finished:
+                self._active[hand] = None
+                if active[2] >= self.min_peak_speed:
+                    strike = self._strike_metrics(hand, *self.buffer.history(frame - active[0] + 2))
+                    if strike is not None:
+                        strikes.append(strike)
+        return strikes
+
+    def _strike_metrics(self, hand: int, times: np.ndarray, states: np.ndarray) -> Optional[Dict]:
+        """
+        Métricas del golpe de la mano indicada a partir de su tramo del
+        buffer, o None si el brazo no llegó a extenderse.
+        """
+        position, velocity, acceleration = states[:, 0], states[:, 1], states[:, 2]
+        valid = ~np.isnan(velocity[:, _WRIST + hand, 0])
+        times, position, velocity, acceleration = (
+            times[valid], position[valid], velocity[valid], acceleration[valid]
+        )
+        if len(times) < 2:
+            return None
+        torso = np.median(torso_length(position, _SHOULDER, _HIP))
+        wrist = position[:, _WRIST + hand]
+        reach = np.linalg.norm(wrist - position[:, _SHOULDER + hand], axis=1)
+        if reach.max() - reach[0] < self.min_reach_gain * torso:
+            return None
+        scale = REFERENCE_TORSO_LENGTH / torso
+
+        wrist_velocity = velocity[:, _WRIST + hand]
+        speed = np.linalg.norm(wrist_velocity, axis=1)
+        direction = wrist_velocity / np.maximum(speed, 1e-9)[:, None]
+        tangential = (acceleration[:, _WRIST + hand] * direction).sum(axis=1)
+        peak = int(np.argmax(speed))
+
+        # Rectitud: cuerda / recorrido de la muñeca (1 = línea recta)
+        path = np.linalg.norm(np.diff(wrist, axis=0), axis=1).sum()
+        chord = np.linalg.norm(wrist[-1] - wrist[0])
+
+        # Extensión: alcance hombro-muñeca respecto a la longitud del brazo
+        arm = (np.linalg.norm(position[:, _ELBOW + hand] - position[:, _SHOULDER + hand], axis=1) +
+               np.linalg.norm(wrist - position[:, _ELBOW + hand], axis=1))
+
+        # Hikite: la mano contraria vuelve hacia su cadera
+        other = 1 - hand
+        hikite = np.linalg.norm(position[:, _WRIST + other] - position[:, _HIP + other], axis=1)
+
+        # Rotación de cadera en el plano del suelo (x, z)
+        hip_line = position[:, _HIP + 1] - position[:, _HIP]
+        hip_angle = np.degrees(np.arctan2(hip_line[:, 2], hip_line[:, 0]))
+        hip_rotation = (hip_angle[-1] - hip_angle[0] + 180) % 360 - 180
+
+        return {
+            'strike_hand': HANDS[hand],
+            'timestamp': float(times[-1]),
+            'duration': float(times[-1] - times[0]),
+            'peak_speed': float(speed[peak] * scale),                       # m/s
+            'peak_acceleration': float(tangential[:peak + 1].max() * scale),  # m/s²
+            'impact_deceleration': float(max(0.0, -tangential[peak:].min()) * scale),
+            'straightness': float(chord / path) if path > 0 else 1.0,
+            'arm_extension': float((reach / arm).max()),
+            'hikite_retraction': float((hikite[0] - hikite[-1]) * scale),  # m
+            'hikite_distance': float(hikite[-1] * scale),
+            'hip_rotation': float(abs(hip_rotation)),
+        }
+
+
+def synthetic_punches(seconds: float = 10.0, fps: float = 30.0, noise: float = 0.003,
+                      seed: Optional[int] = 0):
+    """
+    Secuencia (timestamps, landmarks (T, 33, 4)) de un karateka de frente
+    que alterna cada segundo golpes rectos de 0.25 s con cada mano desde
+    la cadera (hikite) hasta la altura del pecho, con ruido gaussiano.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(int(seconds * fps)) / fps
+    landmarks = np.zeros((len(timestamps), 33, 4))
+    landmarks[:, :, 3] = 1.0
+    # (x, y, z) en reposo: manos recogidas junto a la cadera, codos atrás
+    rest = {11: (0.45, 0.35, 0.0), 12: (0.55, 0.35, 0.0),
+            13: (0.43, 0.50, 0.12), 14: (0.57, 0.50, 0.12),
+            15: (0.45, 0.60, 0.05), 16: (0.55, 0.60, 0.05),
+            23: (0.46, 0.62, 0.0), 24: (0.54, 0.62, 0.0)}
+    # Puño extendido al frente, a la altura del pecho y hacia el centro
+    extended = {13: (0.47, 0.40, -0.15), 15: (0.49, 0.40, -0.33)}
+    for index, point in rest.items():
+        landmarks[:, index, :3] = point
+
+    phase = (timestamps % 1.0) / 0.25
+    extension = np.where(phase < 1, np.sin(np.pi / 2 * np.minimum(phase, 1)) ** 2,
+                         np.clip(2 - phase, 0, 1))
+    hand = timestamps.astype(int) % 2
+    for side in (0, 1):
+        moving = (extension * (hand == side))[:, None]
+        for index, (x, y, z) in extended.items():
+            target = np.array((x if side == 0 else 1 - x, y, z))
+            start = landmarks[0, index + side, :3].copy()
+            landmarks[:, index + side, :3] = start + moving * (target - start)
+    landmarks[:, :, :3] += rng.normal(0, noise, landmarks[:, :, :3].shape)
+    return timestamps, landmarks.astype(np.float32)
+
+
+def benchmark() -> Dict[str, float]:
+    """Coste por frame de StrikeAnalyzer.update() sobre golpes sintéticos"""
+    timestamps, landmarks = synthetic_punches(seconds=60)
+    analyzer = StrikeAnalyzer()
+    best, strikes = math.inf, []
+    for _ in range(3):
+        analyzer.reset()
+        start = time.perf_counter()
+        strikes = [strike for timestamp, frame in zip(timestamps, landmarks)
+                   for strike in analyzer.update(timestamp, frame)]
+        best = min(best, (time.perf_counter() - start) / len(timestamps))
+    return {'µs/frame': best * 1e6, 'golpes': len(strikes), 'segundos': timestamps[-1]}
+
+
+if __name__ == '__main__':
+    timestamps, landmarks = synthetic_punches(seconds=4)
+    analyzer = StrikeAnalyzer()
+    for timestamp, frame in zip(timestamps, landmarks):
+        for strike in analyzer.update(timestamp, frame):
+            print({name: round(value, 3) if isinstance(value, float) else value
+                   for name, value in strike.items()})
+    print(benchmark())
@@ -1,91 +1,119 @@
 """
 Proceso de pose detection usando subprocess en lugar de multiprocessing
 Esto evita completamente los problemas de protobuf al usar un proceso externo
+
+Un hilo supervisor vigila el worker: si el proceso muere o su latido en la
+memoria compartida deja de avanzar, lo reinicia y vuelve a conectar el
+buffer. Opcionalmente mantiene un worker de reserva con MediaPipe ya
+cargado, esperando en stdin, para que la recuperación no pague de nuevo
+la importación del modelo.
+
+Los workers avisan de cada frame publicado escribiendo un byte en un pipe
+(notify_fd) que vive lo mismo que el detector, así que la UI lo vigila
+una sola vez aunque el worker se reinicie.
 """
+import os
 import subprocess
-import pickle
 import threading
 import queue
 import time
-import json
 from .shared_frame_buffer import SharedFrameManager
+from .landmark_protocol import ProtocolError, decode_message
+from .startup_timing import REPORT_PHASES, StartupTimeline
 
 
-class SubprocessPoseDetector:
+# Segundos sin latido antes de considerar colgado al worker
+HEARTBEAT_TIMEOUT = 2.0
+
+# Segundos desde el lanzamiento (o la activación) hasta el primer latido
+STARTUP_TIMEOUT = 30.0
+
+# Periodo de revisión del hilo supervisor
+SUPERVISOR_INTERVAL = 0.2
+
+# Espera máxima entre reintentos cuando el worker falla al arrancar
+MAX_RESTART_BACKOFF = 10.0
+
+
+class WorkerProcess:
     """
-    Detector de pose que usa subprocess para ejecutar MediaPipe
+    Un proceso pose_worker.py con sus hilos de lectura de stdout y stderr.
+    En modo reserva el worker carga MediaPipe y espera la orden de
+    activación antes de abrir la cámara.
     """
-    
-    def __init__(self):
+
+    def __init__(self, detector, standby=False):
+        self.detector = detector
+        self.standby = standby
         self.process = None
-        # Solo necesitamos queue de salida ya que no enviamos frames
-        self.output_queue = queue.Queue(maxsize=5)
-        self.running = False
-        
-        # Solo thread de output ya que no enviamos input
-        self.output_thread = None
-        
-        # Gestor de memoria compartida para frames
-        self.shared_buffer_name = None
         self.frame_manager = None
-    
-    def start(self):
-        """Inicia el proceso de pose detection de forma no bloqueante"""
-        if self.running:
+        self.started_at = 0.0                  # Lanzamiento o activación
+        self.ready = threading.Event()         # MediaPipe cargado (modo reserva)
+        self.initialized = threading.Event()   # Buffer compartido conectado
+
+    def launch(self):
+        """Lanza el proceso y sus hilos de lectura"""
+        # Usar el python del venv para tener acceso a MediaPipe
+        venv_python = './venv/bin/python'
+        command = [venv_python, 'pose_worker.py', '--wire-format', self.detector.wire_format,
+                   '--landmark-filter', self.detector.landmark_filter]
+        if self.standby:
+            command.append('--standby')
+        pass_fds = ()
+        if self.detector._notify_write_fd is not None:
+            command += ['--notify-fd', str(self.detector._notify_write_fd)]
+            pass_fds = (self.detector._notify_write_fd,)
+
+        self.process = subprocess.Popen(
+            command,
+            pass_fds=pass_fds,       # Pipe de aviso de frames nuevos
+            stdin=subprocess.PIPE,   # Orden de activación en modo reserva
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            cwd='.',  # Asegurar directorio correcto
+            env={'PYTHONPATH': '.'}  # Asegurar que encuentre módulos locales
+        )
+        self.started_at = time.time()
+        self.detector.timeline.mark('worker_launched', self.started_at)
+
+        threading.Thread(target=self._output_worker, daemon=True).start()
+        threading.Thread(target=self._error_worker, daemon=True).start()
+
+        role = " (reserva)" if self.standby else ""
+        print(f"Subprocess pose detector iniciado: PID {self.process.pid}{role}")
+
+    def activate(self):
+        """Despierta a un worker de reserva: abre la cámara y crea el buffer"""
+        self.process.stdin.write(b'start\n')
+        self.standby = False
+        self.started_at = time.time()
+        print(f"Worker de reserva activado: PID {self.process.pid}")
+
+    def is_alive(self):
+        """True si el proceso sigue en ejecución"""
+        return self.process is not None and self.process.poll() is None
+
+    def heartbeat_age(self):
+        """Segundos desde el último latido en memoria compartida, o None"""
+        if not self.frame_manager:
+            return None
+        return self.frame_manager.heartbeat_age()
+
+    def terminate(self):
+        """Termina el proceso (SIGTERM y, si no responde, SIGKILL)"""
+        if not self.is_alive():
             return
-        
-        print("Iniciando subprocess de pose detection...")
-        
-        # Usar threading para evitar bloquear el hilo principal
-        start_thread = threading.Thread(target=self._start_worker, daemon=True)
-        start_thread.start()
-    
-    def _start_worker(self):
-        """Worker que inicia el proceso en un hilo separado"""
         try:
-            print("Creando proceso worker...")
-            
-            # Iniciar proceso worker - solo stdout para recibir resultados
-            # Usar el python del venv para tener acceso a MediaPipe
-            venv_python = './venv/bin/python'
-            self.process = subprocess.Popen(
-                [venv_python, 'pose_worker.py'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                bufsize=0,
-                cwd='.',  # Asegurar directorio correcto
-                env={'PYTHONPATH': '.'}  # Asegurar que encuentre módulos locales
-            )
-            
-            print(f"Subprocess pose detector iniciado: PID {self.process.pid}")
-            
-            # Verificar que el proceso arrancó bien
-            time.sleep(0.1)  # Dar tiempo para que se inicie
-            if self.process.poll() is not None:
-                stdout, stderr = self.process.communicate()
-                print(f"Worker terminó inmediatamente con código: {self.process.returncode}")
-                print(f"Worker stdout: {stdout.decode() if stdout else 'vacío'}")
-                print(f"Worker stderr: {stderr.decode() if stderr else 'vacío'}")
-                return
-            
-            self.running = True
-            
-            # Solo necesitamos threads de output y error
-            self.output_thread = threading.Thread(target=self._output_worker, daemon=True)
-            self.error_thread = threading.Thread(target=self._error_worker, daemon=True)
-            
-            self.output_thread.start()
-            self.error_thread.start()
-            
-            print("Threads de comunicación iniciados")
-            
-        except Exception as e:
-            print(f"Error iniciando subprocess: {e}")
-            self.running = False
-    
+            self.process.terminate()
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
     def _error_worker(self):
         """Thread que maneja stderr del proceso worker"""
-        while self.running and self.process and self.process.poll() is None:
+        while self.process.poll() is None:
             try:
                 line = self.process.stderr.readline()
                 if line:
@@ -96,72 +124,296 @@ class SubprocessPoseDetector:
             except Exception as e:
                 print(f"Error leyendo stderr: {e}")
                 break
-    
-    def _input_worker(self):
-        """Ya no necesitamos input worker - el proceso captura video directamente"""
-        pass  # Método eliminado
-    
+
     def _output_worker(self):
-        """Thread que recibe resultados del proceso worker"""
-        while self.running and self.process and self.process.poll() is None:
+        """Thread que recibe mensajes del proceso worker"""
+        while self.process.poll() is None:
             try:
                 # Leer tamaño del resultado
                 size_data = self.process.stdout.read(4)
                 if len(size_data) != 4:
-                    print(f"Error leyendo tamaño: recibido {len(size_data)} bytes")
+                    if self.detector.running:
+                        print(f"Error leyendo tamaño: recibido {len(size_data)} bytes")
                     break
-                
+
                 result_size = int.from_bytes(size_data, byteorder='little')
-                
+
                 # Leer datos del resultado
                 result_data = self.process.stdout.read(result_size)
                 if len(result_data) != result_size:
                     print(f"Error leyendo datos: esperado {result_size}, recibido {len(result_data)}")
                     break
-                
-                # Deserializar resultado JSON
-                result = json.loads(result_data.decode('utf-8'))
-                
+
+                # Deserializar resultado (binario -> array NumPy, o JSON de control/depuración)
+                try:
+                    result = decode_message(result_data)
+                except (ProtocolError, ValueError) as e:
+                    print(f"Mensaje inválido del worker: {e}")
+                    continue
+
+                # Worker de reserva con MediaPipe cargado
+                if result.get('type') == 'standby':
+                    self.ready.set()
+                    continue
+
                 # Si es mensaje de inicialización, configurar memoria compartida
                 if result.get('type') == 'init':
-                    self.shared_buffer_name = result.get('shared_buffer_name')
-                    if self.shared_buffer_name:
-                        self.frame_manager = SharedFrameManager()
-                        self.frame_manager.connect_buffer(self.shared_buffer_name)
-                        print(f"Conectado a buffer compartido: {self.shared_buffer_name}")
+                    buffer_name = result.get('shared_buffer_name')
+                    if buffer_name:
+                        frame_shape = tuple(result.get('frame_shape', (480, 640, 3)))
+                        self.frame_manager = SharedFrameManager(frame_shape=frame_shape)
+                        self.frame_manager.connect_buffer(buffer_name)
+                        self.initialized.set()
+                        self.detector._on_worker_initialized(self, buffer_name)
                     continue
-                
-                # Añadir a queue de salida
-                try:
-                    self.output_queue.put_nowait(result)
-                except queue.Full:
-                    # Si está lleno, quitar el más viejo
-                    try:
-                        self.output_queue.get_nowait()
-                        self.output_queue.put_nowait(result)
-                    except queue.Empty:
-                        pass
-                
+
+                self.detector._on_worker_message(self, result)
+
             except Exception as e:
                 print(f"Error en output worker: {e}")
                 import traceback
                 traceback.print_exc()
                 break
-    
+
+
+class SubprocessPoseDetector:
+    """
+    Detector de pose que usa subprocess para ejecutar MediaPipe
+    """
+
+    def __init__(self, wire_format=None, standby=None, timeline=None, landmark_filter=None):
+        # Los resultados viajan en memoria compartida junto a cada frame.
+        # 'binary' o 'json' envían además una copia por stdout (depuración)
+        self.wire_format = wire_format or os.environ.get('KOHAI_WIRE_FORMAT', 'none')
+        # Filtro temporal del worker: kalman, one-euro o none (KOHAI_LANDMARK_FILTER)
+        self.landmark_filter = landmark_filter or os.environ.get('KOHAI_LANDMARK_FILTER', 'kalman')
+        # Worker de reserva precargado (KOHAI_STANDBY_WORKER=1)
+        if standby is None:
+            standby = os.environ.get('KOHAI_STANDBY_WORKER', '0') == '1'
+        self.use_standby = standby
+
+        # Fases de arranque de la UI y del worker hasta el primer landmark
+        self.timeline = timeline or StartupTimeline(report_phases=REPORT_PHASES)
+
+        # Solo queue de salida ya que no enviamos frames
+        self.output_queue = queue.Queue(maxsize=5)
+        self.running = False
+
+        # Worker activo, worker de reserva y supervisor
+        self.worker = None
+        self.standby_worker = None
+        self.supervisor_thread = None
+
+        # Gestor de memoria compartida del worker activo
+        self.shared_buffer_name = None
+        self.frame_manager = None
+        # Buffers de workers caídos, liberados en la siguiente vuelta del supervisor
+        self._retired_managers = []
+
+        # Pipe de aviso de frames nuevos: extremo de lectura para la UI
+        self.notify_fd = None
+        self._notify_write_fd = None
+
+        # Último reporte de contadores del worker (capturados/inferidos/descartados)
+        self.worker_stats = None
+
+        # Contadores de recuperación
+        self.restarts = 0
+        self.failed_starts = 0
+        self.last_recovery_time = None
+        self._recovery_started = None
+
+    @property
+    def process(self):
+        """Proceso del worker activo"""
+        return self.worker.process if self.worker else None
+
+    def start(self):
+        """Inicia el proceso de pose detection de forma no bloqueante"""
+        if self.running:
+            return
+
+        print("Iniciando subprocess de pose detection...")
+        self.running = True
+        if self.notify_fd is None:
+            self.notify_fd, self._notify_write_fd = os.pipe()
+            # La UI vacía el pipe sin bloquearse en cada aviso
+            os.set_blocking(self.notify_fd, False)
+
+        # El supervisor lanza el worker en su hilo para no bloquear el hilo principal
+        self.supervisor_thread = threading.Thread(target=self._supervise, daemon=True)
+        self.supervisor_thread.start()
+
+    def _launch_worker(self, standby=False):
+        """Lanza un worker nuevo (activo o de reserva); None si falla"""
+        try:
+            worker = WorkerProcess(self, standby=standby)
+            worker.launch()
+            return worker
+        except Exception as e:
+            print(f"Error iniciando subprocess: {e}")
+            return None
+
+    def _supervise(self):
+        """Hilo supervisor: lanza, vigila y reinicia el worker"""
+        print("Creando proceso worker...")
+        self.worker = self._launch_worker()
+
+        while self.running:
+            time.sleep(SUPERVISOR_INTERVAL)
+            if not self.running:
+                break
+
+            self._release_retired()
+
+            problem = self._check_worker(self.worker)
+            if problem:
+                print(f"Worker {problem}: reiniciando")
+                self._restart_worker()
+                continue
+
+            # Preparar la reserva solo con el activo ya funcionando
+            if self.use_standby and self.worker.initialized.is_set():
+                if self.standby_worker is not None and not self.standby_worker.is_alive():
+                    print("Worker de reserva terminó: relanzando")
+                    self.standby_worker = None
+                if self.standby_worker is None:
+                    self.standby_worker = self._launch_worker(standby=True)
+
+    def _check_worker(self, worker):
+        """Devuelve la descripción del fallo del worker, o None si está sano"""
+        if worker is None:
+            return "ausente"
+        if not worker.is_alive():
+            return f"terminó con código {worker.process.returncode}"
+
+        age = worker.heartbeat_age()
+        if age is None:
+            if time.time() - worker.started_at > STARTUP_TIMEOUT:
+                return f"sin latido tras {STARTUP_TIMEOUT:.0f}s de arranque"
+        elif age > HEARTBEAT_TIMEOUT:
+            return f"sin latido desde hace {age:.1f}s"
+        return None
+
+    def _restart_worker(self):
+        """Sustituye el worker caído por la reserva o por uno nuevo"""
+        if self._recovery_started is None:
+            self._recovery_started = time.time()
+
+        failed = self.worker
+        self.worker = None
+        if failed is not None:
+            # Liberar la cámara antes de que la abra el sustituto
+            failed.terminate()
+            if not failed.initialized.is_set():
+                self.failed_starts += 1
+            if failed.frame_manager is not None:
+                if self.frame_manager is failed.frame_manager:
+                    self.frame_manager = None
+                # El worker murió sin limpiar: el consumidor hace unlink
+                self._retired_managers.append(failed.frame_manager)
+        else:
+            self.failed_starts += 1
+
+        if self.failed_starts:
+            # Fallos seguidos al arrancar (p. ej. sin cámara): no reintentar en bucle
+            delay = min(0.5 * 2 ** (self.failed_starts - 1), MAX_RESTART_BACKOFF)
+            deadline = time.time() + delay
+            while self.running and time.time() < deadline:
+                time.sleep(SUPERVISOR_INTERVAL)
+            if not self.running:
+                return
+
+        self.restarts += 1
+        standby = self.standby_worker
+        if standby is not None and standby.is_alive() and standby.ready.is_set():
+            self.standby_worker = None
+            standby.activate()
+            self.worker = standby
+        else:
+            self.worker = self._launch_worker()
+
+    def _release_retired(self):
+        """Libera los buffers de workers caídos que ya nadie está leyendo"""
+        pending = []
+        for manager in self._retired_managers:
+            try:
+                manager.cleanup(unlink=True)
+            except BufferError:
+                # La UI aún tiene una vista del buffer: reintentar luego
+                pending.append(manager)
+        self._retired_managers = pending
+
+    def _on_worker_initialized(self, worker, buffer_name):
+        """El worker conectó su buffer compartido (hilo de lectura del worker)"""
+        if worker is not self.worker:
+            return
+
+        self.shared_buffer_name = buffer_name
+        self.frame_manager = worker.frame_manager
+        self.failed_starts = 0
+        self.timeline.mark('buffer_connected')
+        print(f"Conectado a buffer compartido: {buffer_name}")
+
+        if self._recovery_started is not None:
+            self.last_recovery_time = time.time() - self._recovery_started
+            self._recovery_started = None
+            print(f"Worker recuperado en {self.last_recovery_time * 1000:.0f} ms "
+                  f"(reinicios: {self.restarts})")
+
+    def _on_worker_message(self, worker, result):
+        """Mensaje de resultados o contadores de un worker"""
+        if worker is not self.worker:
+            return
+
+        # Contadores periódicos del worker
+        if result.get('type') == 'stats':
+            self.worker_stats = result
+            return
+
+        # Fases de arranque medidas dentro del worker
+        if result.get('type') == 'startup':
+            self.timeline.merge(result.get('marks', {}), prefix='worker_')
+            return
+
+        # Añadir a queue de salida
+        try:
+            self.output_queue.put_nowait(result)
+        except queue.Full:
+            # Si está lleno, quitar el más viejo
+            try:
+                self.output_queue.get_nowait()
+                self.output_queue.put_nowait(result)
+            except queue.Empty:
+                pass
+
     def process_frame(self, frame):
         """
         Ya no procesamos frames - el worker captura directamente
         Este método se mantiene para compatibilidad pero no hace nada
         """
         return True  # Siempre exitoso porque no hacemos nada
-    
+
+    def drain_notifications(self):
+        """Vacía el pipe de avisos; devuelve cuántos frames se anunciaron"""
+        count = 0
+        while self.notify_fd is not None:
+            try:
+                data = os.read(self.notify_fd, 4096)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            count += len(data)
+        return count
+
     def get_result(self):
         """
         Obtiene resultado del procesamiento (non-blocking)
         """
         if not self.running:
             return None
-        
+
         try:
             result = self.output_queue.get_nowait()
             # Debug: mostrar cada ciertos resultados
@@ -171,41 +423,61 @@ class SubprocessPoseDetector:
             return result
         except queue.Empty:
             return None
-    
+
     def get_latest_frame(self):
         """
         Obtiene el frame más reciente desde memoria compartida
         """
-        if not self.frame_manager:
+        frame_manager = self.frame_manager
+        if not frame_manager:
             return None, 0
-        
-        return self.frame_manager.get_latest_frame()
-    
+
+        return frame_manager.get_latest_frame()
+
+    def get_latest_frame_view(self, require_result=True):
+        """
+        Obtiene una vista sin copia (FrameView) del último frame nuevo.
+        El consumidor debe validar la vista tras usar los píxeles.
+        """
+        frame_manager = self.frame_manager
+        if not frame_manager:
+            return None
+
+        return frame_manager.get_latest_view(require_result)
+
+    @property
+    def results_in_shared_memory(self):
+        """True si los resultados se leen de memoria compartida y no del pipe"""
+        return self.wire_format == 'none'
+
     def is_alive(self):
         """Verifica si el proceso está activo"""
-        return (self.running and 
-                self.process and 
-                self.process.poll() is None)
-    
+        return (self.running and
+                self.worker is not None and
+                self.worker.is_alive())
+
     def stop(self):
         """Detiene el proceso de pose detection"""
         if not self.running:
             return
-        
+
         self.running = False
-        
-        # Limpiar memoria compartida
-        if self.frame_manager:
-            self.frame_manager.cleanup()
-            self.frame_manager = None
-        
-        # Terminar proceso
-        if self.process:
-            try:
-                self.process.terminate()
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-                self.process.wait()
-        
+        if self.supervisor_thread:
+            self.supervisor_thread.join(timeout=2)
+
+        # Terminar procesos antes de liberar su memoria compartida
+        for worker in (self.worker, self.standby_worker):
+            if worker is not None:
+                worker.terminate()
+                if worker.frame_manager is not None:
+                    self._retired_managers.append(worker.frame_manager)
+        self.frame_manager = None
+        self._release_retired()
+
+        # La UI ya no vigila el pipe: cerrar ambos extremos
+        for fd in (self.notify_fd, self._notify_write_fd):
+            if fd is not None:
+                os.close(fd)
+        self.notify_fd = self._notify_write_fd = None
+
         print("Subprocess pose detector detenido")
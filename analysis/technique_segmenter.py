@@ -0,0 +1,203 @@
+"""
+Segmentación en línea de técnicas dinámicas sobre el flujo de landmarks
+
+TechniqueSegmenter mide en cada frame la energía cinética de las
+extremidades (velocidad al cuadrado de codos, muñecas, rodillas y
+tobillos, en torsos/s) y la segmenta con histéresis: la técnica empieza
+cuando la energía supera un umbral alto durante varios frames y termina
+cuando baja de un umbral bajo durante varios frames. Cada frame cuesta
+O(1) (no se recorre el historial) y cada segmento se publica como mucho
+exit_frames frames después de su final, o al llegar a max_duration.
+
+Los segmentos llevan frame y timestamp de inicio, pico y final, y la
+extremidad dominante; los analizadores de cada técnica solo se ejecutan
+sobre ellos (StrikeAnalyzer.analyze_segment, KickAnalyzer.analyze_segment).
+
+Ejecutar `python -m analysis.technique_segmenter` segmenta golpes y
+patadas sintéticos y mide el coste por frame y la latencia.
+"""
+import math
+import time
+import numpy as np
+from typing import Dict, List, Optional
+from .landmark_filter import KalmanFilter
+
+
+# Extremidades y sus articulaciones distales (índices MediaPipe)
+SEGMENT_LIMBS = {
+    'left_arm': (13, 15), 'right_arm': (14, 16),
+    'left_leg': (25, 27), 'right_leg': (26, 28),
+}
+_LIMB_ROWS = np.array([row for rows in SEGMENT_LIMBS.values() for row in rows], dtype=np.intp)
+_TORSO_ROWS = np.array([11, 12, 23, 24], dtype=np.intp)
+_LIMB_NAMES = list(SEGMENT_LIMBS)
+
+
+class TechniqueSegmenter:
+    """Detecta inicio, pico y final de técnicas dinámicas con histéresis"""
+
+    def __init__(self, aspect_ratio: float = 480 / 640, start_speed: float = 2.0,
+                 end_speed: float = 1.2, enter_frames: int = 2, exit_frames: int = 3,
+                 min_duration: float = 0.1, max_duration: float = 2.0,
+                 smoothing: float = 0.5, max_gap: float = 0.25):
+        # Alto / ancho del frame: x e y normalizados pasan a la misma escala
+        self.aspect_ratio = aspect_ratio
+        # Umbrales de velocidad (torsos/s) de la extremidad más rápida: la
+        # técnica empieza por encima de start_speed y termina por debajo de end_speed
+        self.start_energy = start_speed ** 2
+        self.end_energy = end_speed ** 2
+        self.enter_frames = enter_frames
+        self.exit_frames = exit_frames
+        self.min_duration = min_duration
+        # Un segmento más largo se cierra a la fuerza: latencia acotada
+        self.max_duration = max_duration
+        # Media exponencial de la energía (0 = sin suavizado)
+        self.smoothing = smoothing
+        self.max_gap = max_gap
+        # Velocidad propia si el worker no la envía (sin filtro temporal)
+        self.velocity_filter = KalmanFilter()
+        self.reset()
+
+    def reset(self):
+        """Olvida el estado: el próximo frame empieza en reposo"""
+        self.frames = 0
+        self.energy = 0.0
+        self._last_timestamp = None
+        self.velocity_filter.reset()
+        self._quiet = True       # Tras un cierre forzado hay que volver al reposo
+        self._rise = None        # (frame, timestamp) en que la energía pasó el umbral bajo
+        self._above = 0
+        self._segment = None
+
+    def _limb_energies(self, timestamp: float, landmarks: np.ndarray,
+                       velocity: Optional[np.ndarray]) -> Optional[List[float]]:
+        """Velocidad al cuadrado media (torsos²/s²) de cada extremidad"""
+        torso_points = landmarks[_TORSO_ROWS, :2].tolist()
+        (ls_x, ls_y), (rs_x, rs_y), (lh_x, lh_y), (rh_x, rh_y) = torso_points
+        torso = math.hypot((ls_x + rs_x - lh_x - rh_x) / 2,
+                           (ls_y + rs_y - lh_y - rh_y) / 2 * self.aspect_ratio)
+
+        if velocity is None:
+            # La diferencia hacia atrás es puro temblor a 60 fps: filtrar
+            velocity = self.velocity_filter(landmarks, timestamp)[1]
+        if not torso > 0:
+            return None
+        limb_velocity = velocity[_LIMB_ROWS].astype(np.float64)
+        limb_velocity[:, 1] *= self.aspect_ratio
+
+        squared = (limb_velocity * limb_velocity).sum(axis=1).tolist()
+        scale = 0.5 / (torso * torso)
+        return [(squared[i] + squared[i + 1]) * scale for i in range(0, 8, 2)]
+
+    def update(self, timestamp: float, landmarks: np.ndarray,
+               velocity: Optional[np.ndarray] = None, frame: Optional[int] = None) -> List[Dict]:
+        """
+        Añade un frame (landmarks (33, 4) de una detección nueva, con la
+        velocidad (33, 3) del filtro si la hay) y devuelve los segmentos que
+        se cierran en él: {'start_frame', 'peak_frame', 'end_frame',
+        'start_time', 'peak_time', 'end_time', 'limb', 'peak_speed',
+        'truncated'}. frame identifica el frame (por defecto, un contador).
+        """
+        timestamp = float(timestamp)
+        if frame is None:
+            frame = self.frames
+        self.frames += 1
+        if self._last_timestamp is not None and timestamp - self._last_timestamp > self.max_gap:
+            # Hueco: la técnica en curso queda incompleta
+            self.reset()
+            self.frames = 1
+        self._last_timestamp = timestamp
+
+        energies = self._limb_energies(timestamp, landmarks, velocity)
+        if energies is None:
+            return []
+        energy = max(energies)
+        self.energy += (1 - self.smoothing) * (energy - self.energy)
+        energy = self.energy
+
+        segment = self._segment
+        if segment is None:
+            if energy < self.end_energy:
+                self._quiet, self._rise, self._above = True, None, 0
+                return []
+            if not self._quiet:
+                return []
+            if self._rise is None:
+                self._rise = (frame, timestamp)
+            self._above = self._above + 1 if energy >= self.start_energy else 0
+            if self._above >= self.enter_frames:
+                start_frame, start_time = self._rise
+                # below: frames seguidos bajo el umbral bajo; limb_energy: energía acumulada
+                self._segment = segment = {
+                    'start_frame': start_frame, 'start_time': start_time,
+                    'peak_frame': frame, 'peak_time': timestamp, 'peak_energy': energy,
+                    'end_frame': frame, 'end_time': timestamp,
+                    'below': 0, 'limb_energy': [0.0] * len(_LIMB_NAMES),
+                }
+            return []
+
+        for index, limb_energy in enumerate(energies):
+            segment['limb_energy'][index] += limb_energy
+        if energy > segment['peak_energy']:
+            segment['peak_frame'], segment['peak_time'] = frame, timestamp
+            segment['peak_energy'] = energy
+        if energy >= self.end_energy:
+            segment['end_frame'], segment['end_time'] = frame, timestamp
+            segment['below'] = 0
+        else:
+            segment['below'] += 1
+
+        truncated = timestamp - segment['start_time'] > self.max_duration
+        if segment['below'] < self.exit_frames and not truncated:
+            return []
+
+        self._segment, self._rise, self._above = None, None, 0
+        self._quiet = not truncated
+        if segment['end_time'] - segment['start_time'] < self.min_duration:
+            return []
+        limb_energy = segment.pop('limb_energy')
+        del segment['below']
+        segment['limb'] = _LIMB_NAMES[limb_energy.index(max(limb_energy))]
+        segment['peak_speed'] = math.sqrt(segment.pop('peak_energy'))
+        segment['truncated'] = truncated
+        return [segment]
+
+
+def benchmark() -> Dict[str, float]:
+    """
+    Coste por frame de update() y latencia (s desde el final del segmento
+    hasta su publicación) sobre golpes sintéticos a 30 fps y patadas a 60 fps.
+    """
+    from .strike_analyzer import synthetic_punches
+    from .kick_analyzer import synthetic_kicks
+
+    results = {}
+    for name, (timestamps, landmarks) in (('golpes', synthetic_punches(seconds=60)),
+                                          ('patadas', synthetic_kicks(seconds=60))):
+        segmenter = TechniqueSegmenter()
+        best, segments, latencies = math.inf, [], []
+        for _ in range(3):
+            segmenter.reset()
+            segments, latencies = [], []
+            start = time.perf_counter()
+            for timestamp, frame in zip(timestamps, landmarks):
+                for segment in segmenter.update(timestamp, frame):
+                    segments.append(segment)
+                    latencies.append(timestamp - segment['end_time'])
+            best = min(best, (time.perf_counter() - start) / len(timestamps))
+        results[f'{name} µs/frame'] = best * 1e6
+        results[f'{name} segmentos'] = len(segments)
+        results[f'{name} latencia máx (s)'] = max(latencies, default=0.0)
+    return results
+
+
+if __name__ == '__main__':
+    from .kick_analyzer import synthetic_kicks
+    timestamps, landmarks = synthetic_kicks(seconds=4)
+    segmenter = TechniqueSegmenter()
+    for timestamp, frame in zip(timestamps, landmarks):
+        for segment in segmenter.update(timestamp, frame):
+            print({name: round(value, 3) if isinstance(value, float) else value
+                   for name, value in segment.items()})
+    for name, value in benchmark().items():
+        print(f"{name:<28} {value:8.3f}")
@@ -0,0 +1,384 @@
+"""
+Análisis offline de videos grabados, sin GTK ni cámara
+
+Procesa un archivo de video tan rápido como lo permite la CPU y produce una
+pista de landmarks (índice de frame, timestamp, array (33, 4)) y, si se
+pide, las métricas de StanceAnalyzer por frame.
+
+Con varios workers el video se divide en tramos de tiempo; cada proceso
+tiene su propio MediaPipe Pose y arranca cada tramo unos frames antes
+(solapamiento) para re-sembrar el tracking antes de que empiece la parte
+que realmente aporta a la pista final.
+"""
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from .landmark_protocol import CONFIDENCE_CODES, NUM_LANDMARKS, LANDMARK_FIELDS
+from .pose_tracking import PoseRegion, PoseTracker, create_pose_estimator
+from .stance_analyzer import NO_KEY_POINTS_FEEDBACK, StanceAnalyzer
+
+
+# Frames decodificados en espera de inferencia
+DECODE_QUEUE_SIZE = 16
+
+# Detector MediaPipe de cada proceso del pool (uno por proceso)
+_worker_pose = None
+
+
+class LandmarkTrack:
+    """Pista de landmarks de un video: arrays alineados por frame"""
+
+    def __init__(self, frame_index, timestamp, landmarks, confidence, fps=0.0, source='',
+                 frame_size=(0, 0)):
+        self.frame_index = frame_index    # (T,) int64
+        self.timestamp = timestamp        # (T,) float64, segundos desde el inicio del video
+        self.landmarks = landmarks        # (T, 33, 4) float32, NaN sin pose
+        self.confidence = confidence      # (T,) uint8, códigos de CONFIDENCE_LEVELS
+        self.fps = fps
+        self.source = source
+        # (ancho, alto) del video: los landmarks están normalizados a él
+        self.frame_size = tuple(int(value) for value in frame_size)
+
+    @property
+    def aspect_ratio(self):
+        """Alto / ancho del video, o None si la pista no guarda su tamaño"""
+        width, height = self.frame_size
+        return height / width if width > 0 and height > 0 else None
+
+    def __len__(self):
+        return len(self.frame_index)
+
+    def save(self, path):
+        """Guarda la pista en un .npz comprimido"""
+        np.savez_compressed(
+            path,
+            frame_index=self.frame_index,
+            timestamp=self.timestamp,
+            landmarks=self.landmarks,
+            confidence=self.confidence,
+            fps=np.float64(self.fps),
+            source=np.str_(self.source),
+            frame_width=np.int64(self.frame_size[0]),
+            frame_height=np.int64(self.frame_size[1]),
+        )
+
+    @classmethod
+    def concatenate(cls, tracks, fps=0.0, source='', frame_size=(0, 0)):
+        """Une pistas consecutivas en orden de frame"""
+        tracks = [track for track in tracks if len(track)]
+        if not tracks:
+            return cls(np.empty(0, np.int64), np.empty(0, np.float64),
+                       np.empty((0, NUM_LANDMARKS, len(LANDMARK_FIELDS)), np.float32),
+                       np.empty(0, np.uint8), fps, source, frame_size)
+
+        track = cls(
+            np.concatenate([t.frame_index for t in tracks]),
+            np.concatenate([t.timestamp for t in tracks]),
+            np.concatenate([t.landmarks for t in tracks]),
+            np.concatenate([t.confidence for t in tracks]),
+            fps, source, frame_size,
+        )
+        order = np.argsort(track.frame_index, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            track = cls(track.frame_index[order], track.timestamp[order],
+                        track.landmarks[order], track.confidence[order], fps, source,
+                        frame_size)
+        return track
+
+    @classmethod
+    def load(cls, path):
+        """Carga una pista guardada con save()"""
+        with np.load(path) as data:
+            # Las pistas antiguas no guardan el tamaño del video
+            frame_size = (int(data['frame_width']), int(data['frame_height'])) \
+                if 'frame_width' in data else (0, 0)
+            return cls(data['frame_index'], data['timestamp'], data['landmarks'],
+                       data['confidence'], float(data['fps']), str(data['source']),
+                       frame_size)
+
+
+def _decode_frames(cap, frames_queue, stop_event, stats):
+    """Hilo decodificador: lee frames del video mientras se infiere el anterior"""
+    frame_index = 0
+    try:
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            stats['decode_time'] += time.perf_counter() - start
+            if not ret:
+                break
+
+            # Timestamp real del contenedor (ms) en segundos
+            timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            frames_queue.put((frame_index, timestamp, frame))
+            frame_index += 1
+    finally:
+        frames_queue.put(None)
+
+
+def analyze_video(video_path, model_complexity=0, start_frame=0, end_frame=None,
+                  progress_interval=500, warmup_frames=0, pose=None, use_roi=True):
+    """
+    Procesa un video completo (o el rango [start_frame, end_frame)) y
+    devuelve (LandmarkTrack, estadísticas).
+
+    warmup_frames frames previos a start_frame se procesan solo para
+    sembrar el tracking y no se incluyen en la pista. Con use_roi la
+    inferencia corre sobre un recorte alrededor de la pose anterior.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el video: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    decode_start = max(0, start_frame - warmup_frames)
+    if decode_start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, decode_start)
+
+    owns_pose = pose is None
+    if owns_pose:
+        pose = create_pose_estimator(model_complexity=model_complexity)
+    else:
+        # Olvidar el tracking del tramo anterior procesado por este detector
+        pose.reset()
+    tracker = PoseTracker()
+    region = PoseRegion() if use_roi else None
+
+    frame_indices = []
+    timestamps = []
+    landmarks_list = []
+    confidences = []
+
+    stats = {'decode_time': 0.0, 'inference_time': 0.0}
+    frames_queue = queue.Queue(maxsize=DECODE_QUEUE_SIZE)
+    stop_event = threading.Event()
+    decoder = threading.Thread(target=_decode_frames, daemon=True,
+                               args=(cap, frames_queue, stop_event, stats))
+
+    missing = np.full((NUM_LANDMARKS, len(LANDMARK_FIELDS)), np.nan, dtype=np.float32)
+    wall_start = time.perf_counter()
+    decoder.start()
+
+    try:
+        while True:
+            item = frames_queue.get()
+            if item is None:
+                break
+
+            offset, timestamp, frame = item
+            frame_index = decode_start + offset
+            if end_frame is not None and frame_index >= end_frame:
+                break
+
+            start = time.perf_counter()
+            crop_region = None
+            if region is not None:
+                if region.update(tracker, frame.shape):
+                    pose.reset()
+                rgb_frame, crop_region = region.prepare(frame)
+            else:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            results = pose.process(rgb_frame)
+            stats['inference_time'] += time.perf_counter() - start
+
+            landmarks, confidence = tracker.update(frame_index, results.pose_landmarks,
+                                                   crop_region)[:2]
+            if frame_index < start_frame:
+                # Solapamiento: solo re-siembra el tracking
+                continue
+
+            frame_indices.append(frame_index)
+            timestamps.append(timestamp)
+            landmarks_list.append(landmarks if landmarks is not None else missing)
+            confidences.append(CONFIDENCE_CODES[confidence])
+
+            if progress_interval and len(frame_indices) % progress_interval == 0:
+                elapsed = time.perf_counter() - wall_start
+                print(f"{len(frame_indices)} frames procesados ({len(frame_indices) / elapsed:.1f} fps)")
+    finally:
+        stop_event.set()
+        # Vaciar la cola para desbloquear al decodificador
+        while decoder.is_alive():
+            try:
+                frames_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        cap.release()
+        if owns_pose:
+            pose.close()
+
+    wall_time = time.perf_counter() - wall_start
+
+    track = LandmarkTrack(
+        np.asarray(frame_indices, dtype=np.int64),
+        np.asarray(timestamps, dtype=np.float64),
+        np.stack(landmarks_list) if landmarks_list else np.empty((0, NUM_LANDMARKS, len(LANDMARK_FIELDS)), np.float32),
+        np.asarray(confidences, dtype=np.uint8),
+        fps,
+        str(video_path),
+        frame_size,
+    )
+
+    stats.update({
+        'frames': len(track),
+        'wall_time': wall_time,
+        'fps': len(track) / wall_time if wall_time > 0 else 0.0,
+        'video_duration': len(track) / fps,
+    })
+    stats['realtime_factor'] = stats['video_duration'] / wall_time if wall_time > 0 else 0.0
+    return track, stats
+
+
+def _init_pool_worker(model_complexity):
+    """Inicializa un proceso del pool con su propio detector MediaPipe"""
+    global _worker_pose
+    # Un hilo de OpenCV por proceso: el paralelismo lo dan los procesos
+    cv2.setNumThreads(1)
+    _worker_pose = create_pose_estimator(model_complexity=model_complexity)
+
+
+def _analyze_chunk(args):
+    """Procesa un tramo del video dentro de un proceso del pool"""
+    video_path, start_frame, end_frame, warmup_frames, use_roi = args
+    track, stats = analyze_video(video_path, start_frame=start_frame, end_frame=end_frame,
+                                 progress_interval=0, warmup_frames=warmup_frames,
+                                 pose=_worker_pose, use_roi=use_roi)
+    return track, stats
+
+
+def plan_chunks(total_frames, fps, chunk_seconds=60.0, overlap_seconds=2.0):
+    """
+    Divide [0, total_frames) en tramos de tiempo: lista de (inicio, fin, warmup).
+    total_frames es la estimación del contenedor: el último tramo lleva
+    fin None y se decodifica hasta el final real del video.
+    """
+    chunk_frames = max(1, int(round(chunk_seconds * fps)))
+    warmup_frames = int(round(overlap_seconds * fps))
+    starts = list(range(0, total_frames, chunk_frames))
+    return [
+        (start, start + chunk_frames if i < len(starts) - 1 else None,
+         warmup_frames if start else 0)
+        for i, start in enumerate(starts)
+    ]
+
+
+def analyze_video_parallel(video_path, workers, model_complexity=0,
+                           chunk_seconds=60.0, overlap_seconds=2.0, use_roi=True):
+    """
+    Procesa un video largo repartiendo tramos entre procesos y une las
+    pistas en orden de frame. Devuelve (LandmarkTrack, estadísticas).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"No se pudo abrir el video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    if total_frames <= 0:
+        # Sin número de frames (algunos contenedores y streams) no se puede
+        # repartir: procesar en secuencia hasta el final del video
+        print("Número de frames desconocido: procesando en secuencia")
+        track, stats = analyze_video(video_path, model_complexity=model_complexity,
+                                     use_roi=use_roi)
+        # Un solo proceso: todo el tiempo de procesamiento es tiempo real
+        stats.update({'workers': 1, 'chunks': 1, 'parallel_efficiency': 1.0})
+        return track, stats
+
+    chunks = plan_chunks(total_frames, fps, chunk_seconds, overlap_seconds)
+    print(f"{total_frames} frames en {len(chunks)} tramos con {workers} workers")
+
+    wall_start = time.perf_counter()
+    # 'spawn': cada proceso carga MediaPipe desde cero, sin estado heredado
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_pool_worker,
+                             initargs=(model_complexity,)) as executor:
+        results = []
+        for i, result in enumerate(executor.map(
+                _analyze_chunk,
+                [(video_path, start, end, warmup, use_roi) for start, end, warmup in chunks])):
+            results.append(result)
+            print(f"Tramo {i + 1}/{len(chunks)} terminado ({len(result[0])} frames)")
+    wall_time = time.perf_counter() - wall_start
+
+    track = LandmarkTrack.concatenate([track for track, _ in results], fps, str(video_path),
+                                      frame_size)
+    chunk_time = sum(chunk_stats['wall_time'] for _, chunk_stats in results)
+
+    stats = {
+        'frames': len(track),
+        'wall_time': wall_time,
+        'fps': len(track) / wall_time if wall_time > 0 else 0.0,
+        'video_duration': len(track) / fps,
+        'decode_time': sum(chunk_stats['decode_time'] for _, chunk_stats in results),
+        'inference_time': sum(chunk_stats['inference_time'] for _, chunk_stats in results),
+        'workers': workers,
+        'chunks': len(chunks),
+        # Tiempo de procesamiento acumulado / (tiempo real x workers)
+        'parallel_efficiency': chunk_time / (wall_time * workers) if wall_time > 0 else 0.0,
+    }
+    stats['realtime_factor'] = stats['video_duration'] / wall_time if wall_time > 0 else 0.0
+    return track, stats
+
+
+def compute_stance_metrics(track, stance_name):
+    """Métricas de StanceAnalyzer por frame de la pista (None sin pose)"""
+    analyzer = StanceAnalyzer()
+    metrics = []
+    for frame_index, landmarks, confidence in zip(track.frame_index, track.landmarks, track.confidence):
+        frame_metrics = None
+        if confidence != CONFIDENCE_CODES['none']:
+            frame_metrics = analyzer.analyze_stance(stance_name, landmarks)
+        metrics.append({'frame_index': int(frame_index), 'metrics': frame_metrics})
+    return metrics
+
+
+def format_stance_report(report, stance_name):
+    """Resumen de sesión a partir de StanceAnalyzer.analyze_stance_batch"""
+    has_pose = ~report['feedback'][NO_KEY_POINTS_FEEDBACK]
+    frames = int(has_pose.sum())
+    if not frames:
+        return f"{stance_name}: sin frames con pose"
+
+    lines = [f"{stance_name}: score medio {report['score'][has_pose].mean():.1f} en {frames} frames con pose"]
+    counts = {message: int(mask.sum()) for message, mask in report['feedback'].items()
+              if message != NO_KEY_POINTS_FEEDBACK}
+    for message, count in sorted(counts.items(), key=lambda item: -item[1]):
+        if count:
+            lines.append(f"  {count * 100 / frames:5.1f}%  {message}")
+    return '\n'.join(lines)
+
+
+def save_metrics(metrics, path):
+    """Guarda las métricas por frame en JSON"""
+    def to_builtin(value):
+        # Los valores de NumPy no son serializables directamente
+        if isinstance(value, np.generic):
+            return value.item()
+        raise TypeError(f"Tipo no serializable: {type(value)}")
+
+    with open(path, 'w') as f:
+        json.dump(metrics, f, default=to_builtin)
+
+
+def format_summary(stats):
+    """Resumen de throughput legible"""
+    lines = [
+        f"Frames procesados: {stats['frames']}",
+        f"Tiempo total: {stats['wall_time']:.1f}s ({stats['fps']:.1f} fps)",
+        f"Duración del video: {stats['video_duration']:.1f}s "
+        f"(x{stats['realtime_factor']:.2f} tiempo real)",
+        f"Decodificación: {stats['decode_time']:.1f}s, inferencia: {stats['inference_time']:.1f}s",
+    ]
+    if 'workers' in stats:
+        lines.append(f"Workers: {stats['workers']}, tramos: {stats['chunks']}, "
+                     f"eficiencia paralela: {stats['parallel_efficiency'] * 100:.0f}%")
+    return '\n'.join(lines)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Análisis offline de videos grabados (sin GTK ni cámara)
+
+Ejemplo:
+    python analyze_video.py seminario.mp4 -o seminario_track.npz \
+        --stance sanchin-dachi --metrics seminario_metrics.json
+"""
+import sys
+import argparse
+from analysis.stance_analyzer import StanceAnalyzer
+from analysis.video_analysis import (
+    analyze_video, analyze_video_parallel, compute_stance_metrics, format_stance_report,
+    format_summary, save_metrics
+)
+
+
+def parse_args(argv=None):
+    """Argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Análisis offline de videos de karate")
+    parser.add_argument('video', help="Archivo de video a procesar")
+    parser.add_argument('-o', '--output', required=True,
+                        help="Archivo .npz de salida con la pista de landmarks")
+    parser.add_argument('--model-complexity', type=int, choices=(0, 1, 2), default=0,
+                        help="Complejidad del modelo MediaPipe (0 = más rápido)")
+    parser.add_argument('--no-roi', action='store_true',
+                        help="Inferir siempre sobre el frame completo (sin recorte por pose)")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="Procesos en paralelo (cada uno con su MediaPipe)")
+    parser.add_argument('--chunk-seconds', type=float, default=60.0,
+                        help="Duración de cada tramo en modo paralelo")
+    parser.add_argument('--overlap-seconds', type=float, default=2.0,
+                        help="Solapamiento para re-sembrar el tracking al inicio de cada tramo")
+    parser.add_argument('--stance', choices=StanceAnalyzer().get_available_stances(),
+                        help="Stance a evaluar con StanceAnalyzer en cada frame")
+    parser.add_argument('--metrics', help="Archivo JSON de salida para las métricas por frame")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Función principal"""
+    args = parse_args(argv)
+    if args.metrics and not args.stance:
+        print("Error: --metrics requiere --stance", file=sys.stderr)
+        return 2
+
+    print(f"Procesando {args.video}...")
+    if args.workers > 1:
+        track, stats = analyze_video_parallel(
+            args.video, args.workers, model_complexity=args.model_complexity,
+            chunk_seconds=args.chunk_seconds, overlap_seconds=args.overlap_seconds,
+            use_roi=not args.no_roi
+        )
+    else:
+        track, stats = analyze_video(args.video, model_complexity=args.model_complexity,
+                                     use_roi=not args.no_roi)
+    track.save(args.output)
+    print(f"Pista de landmarks guardada en {args.output}")
+
+    if args.stance:
+        report = StanceAnalyzer().analyze_stance_batch(args.stance, track.landmarks)
+        print(format_stance_report(report, args.stance))
+        if args.metrics:
+            metrics = compute_stance_metrics(track, args.stance)
+            save_metrics(metrics, args.metrics)
+            print(f"Métricas guardadas en {args.metrics}")
+
+    print(format_summary(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,11 +2,18 @@
 """
 KOHAI - Karate Motion Analysis System
 Entry point para la aplicación GTK4
+
+Importar este módulo no tiene efectos: multiprocessing, el worker de pose
+y GTK se preparan solo al ejecutarlo como programa.
 """
 
+import time
+
+# Origen del informe de arranque (antes de cualquier import pesado)
+STARTUP_ORIGIN = time.time()
+
 import sys
 import multiprocessing as mp
-import time
 
 def init_multiprocessing():
     """Configurar multiprocessing antes de cualquier import de GTK o MediaPipe"""
@@ -15,53 +22,33 @@ def init_multiprocessing():
     mp.set_start_method('spawn', force=True)
     print("Multiprocessing configurado con método 'spawn'")
 
-# Configurar multiprocessing INMEDIATAMENTE antes de cualquier otro import
-init_multiprocessing()
+def start_pose_detector():
+    """
+    Lanza el worker de pose antes de importar GTK: la importación de
+    MediaPipe y la apertura de la cámara se solapan con el arranque de la UI
+    """
+    from analysis.startup_timing import REPORT_PHASES, StartupTimeline
+    from analysis.subprocess_pose_detector import SubprocessPoseDetector
 
-# AHORA sí importar GTK (después de configurar multiprocessing)
-import gi
-gi.require_version('Gtk', '4.0')
-gi.require_version('Adw', '1')
+    timeline = StartupTimeline(origin=STARTUP_ORIGIN, report_phases=REPORT_PHASES)
+    timeline.mark('process_start', STARTUP_ORIGIN)
+    detector = SubprocessPoseDetector(timeline=timeline)
+    detector.start()
+    return detector
 
-from gi.repository import Gtk, Adw, GLib
-from ui.main_window import KohaiMainWindow
 
-class KohaiApplication(Adw.Application):
-    """Aplicación principal de Kohai"""
-    
-    def __init__(self):
-        super().__init__(application_id="com.kohai.karate-analyzer")
-        self.connect('activate', self.on_activate)
-    
-    def on_activate(self, app):
-        """Callback cuando la aplicación se activa"""
-        print("Activando aplicación...")
-        
-        try:
-            # Crear ventana principal de forma simple
-            self.win = KohaiMainWindow(application=app)
-            print("Ventana creada")
-            
-            # Configurar y mostrar inmediatamente
-            self.win.set_default_size(1200, 800)
-            self.win.present()
-            
-            print(f"Ventana mostrada - Visible: {self.win.get_visible()}")
-            
-        except Exception as e:
-            print(f"Error creando ventana: {e}")
-            import traceback
-            traceback.print_exc()
-
-
-def main():
+def main(pose_detector=None):
     """Función main"""
     print("Iniciando aplicación Kohai...")
     
-    app = KohaiApplication()
+    # AHORA sí importar GTK (después de lanzar el worker)
+    from ui.application import KohaiApplication
+    
+    app = KohaiApplication(pose_detector)
     return app.run(sys.argv)
 
 
 if __name__ == '__main__':
-    # El multiprocessing ya está configurado al inicio del archivo
-    sys.exit(main())
+    # Configurar multiprocessing y lanzar el worker antes de importar GTK
+    init_multiprocessing()
+    sys.exit(main(start_pose_detector()))
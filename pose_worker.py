@@ -1,196 +1,394 @@
 #!/usr/bin/env python3
 """
 Worker proceso independiente para MediaPipe pose detection
-Este script captura video directamente y envía solo los resultados
-Usa memoria compartida para frames
+Este script captura video directamente y publica frames y landmarks
+en memoria compartida; stdout queda para mensajes de control
+
+La captura y la inferencia corren en hilos separados: la cámara publica
+cada frame a su velocidad nativa y la inferencia siempre toma el frame
+más reciente, descartando los que quedaron viejos.
+
+La inferencia corre sobre un recorte alrededor de la última pose buena
+(PoseRegion), así que capturar en alta resolución no encarece MediaPipe.
+
+Ambos hilos escriben un latido en la cabecera de la memoria compartida
+para que el supervisor del proceso principal detecte bloqueos. Con
+--standby el worker carga MediaPipe y espera una línea en stdin antes de
+abrir la cámara (worker de reserva).
+
+En el arranque normal la cámara se abre y empieza a publicar frames
+mientras otro hilo importa MediaPipe; las marcas de cada fase se envían
+a la UI en un mensaje 'startup' al obtener el primer landmark.
+
+Cada detección pasa por un filtro temporal (--landmark-filter, Kalman
+por defecto) que publica la pose suavizada y la velocidad de cada
+landmark; con filtro propio se desactiva el suavizado de MediaPipe.
+
+Con --notify-fd cada frame o resultado publicado escribe un byte en ese
+descriptor (un pipe de la UI), que presenta el frame al recibirlo en vez
+de sondear la memoria compartida con un temporizador.
 """
+import os
+import time
+
+# Antes de los imports pesados: origen de las marcas de arranque del worker
+WORKER_START = time.time()
+
 import sys
+import argparse
+import threading
 import cv2
 import numpy as np
-import time
-import json
 from analysis.shared_frame_buffer import SharedFrameManager
+from analysis.startup_timing import StartupTimeline
+from analysis.pose_tracking import PoseRegion, PoseTracker, create_pose_estimator
+from analysis.landmark_filter import LANDMARK_FILTERS, create_landmark_filter
+from analysis.landmark_protocol import (
+    WIRE_FORMATS, encode_frame_result, encode_json_message, make_result, write_message
+)
 
 
-def main():
-    """Función principal del worker"""
-    print("Worker MediaPipe iniciado", file=sys.stderr)
-    
+# Intervalo entre reportes de contadores (segundos)
+STATS_INTERVAL = 5.0
+
+
+def parse_args(argv=None):
+    """Argumentos de línea de comandos del worker"""
+    parser = argparse.ArgumentParser(description="Worker de pose detection de Kohai")
+    parser.add_argument('--wire-format', choices=('none',) + WIRE_FORMATS, default='none',
+                        help="Enviar también resultados por stdout (por defecto solo memoria compartida)")
+    parser.add_argument('--width', type=int, default=640, help="Ancho de captura")
+    parser.add_argument('--height', type=int, default=480, help="Alto de captura")
+    parser.add_argument('--no-roi', action='store_true',
+                        help="Inferir siempre sobre el frame completo")
+    parser.add_argument('--standby', action='store_true',
+                        help="Cargar MediaPipe y esperar la orden de activación por stdin")
+    parser.add_argument('--landmark-filter', choices=LANDMARK_FILTERS, default='kalman',
+                        help="Filtro temporal de landmarks ('none' usa el suavizado de MediaPipe)")
+    parser.add_argument('--notify-fd', type=int, default=None,
+                        help="Descriptor heredado en el que avisar de cada frame publicado")
+    return parser.parse_args(argv)
+
+
+class LatestFrameSlot:
+    """
+    Buzón de un solo frame entre captura e inferencia.
+    Publicar reemplaza el frame pendiente (que cuenta como descartado).
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_id = 0
+        self.timestamp = 0.0
+        self.dropped = 0
+
+    def publish(self, frame, frame_id, timestamp):
+        """Publica el frame más reciente (hilo de captura)"""
+        with self.condition:
+            if self.frame is not None:
+                self.dropped += 1
+            self.frame = frame
+            self.frame_id = frame_id
+            self.timestamp = timestamp
+            self.condition.notify()
+
+    def take(self, timeout=0.5):
+        """Toma el frame más reciente o (None, 0, 0.0) si no llega ninguno (hilo de inferencia)"""
+        with self.condition:
+            if self.frame is None:
+                self.condition.wait(timeout)
+            frame, frame_id, timestamp = self.frame, self.frame_id, self.timestamp
+            self.frame = None
+            return frame, frame_id, timestamp
+
+
+class WorkerStats:
+    """Contadores de frames capturados, inferidos y descartados"""
+
+    def __init__(self, latest_slot, region=None):
+        self.latest_slot = latest_slot
+        self.region = region
+        self.captured = 0
+        self.inferred = 0
+        self.start_time = time.time()
+
+    def snapshot(self):
+        """Contadores actuales y tasas medias desde el arranque"""
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return {
+            'type': 'stats',
+            'captured': self.captured,
+            'inferred': self.inferred,
+            'dropped': self.latest_slot.dropped,
+            'capture_fps': self.captured / elapsed,
+            'inference_fps': self.inferred / elapsed,
+            'roi_crops': self.region.crops if self.region else 0,
+        }
+
+
+class StdoutWriter:
+    """Escritura de mensajes por stdout serializada entre hilos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def write(self, payload):
+        with self.lock:
+            write_message(sys.stdout.buffer, payload)
+
+
+class FrameNotifier:
+    """Aviso de frame nuevo: un byte por publicación en el pipe de la UI"""
+
+    def __init__(self, fd=None):
+        self.fd = fd
+        if fd is not None:
+            os.set_blocking(fd, False)
+
+    def notify(self):
+        if self.fd is None:
+            return
+        try:
+            os.write(self.fd, b'\x01')
+        except BlockingIOError:
+            pass  # Pipe lleno: la UI tiene avisos pendientes de leer
+        except OSError:
+            self.fd = None  # La UI cerró el pipe: dejar de avisar
+
+
+def load_pose_model(timeline, model, smooth_landmarks=True):
+    """Importa MediaPipe y crea el detector, guardándolo en model['pose']"""
     try:
         # Importar MediaPipe solo aquí para evitar conflictos
-        import mediapipe as mp
+        import mediapipe  # noqa: F401 (se mide la importación por separado)
+        timeline.mark('mediapipe_imported')
         print("MediaPipe importado exitosamente en worker", file=sys.stderr)
-        
-        # Configurar MediaPipe para pose detection ULTRA-OPTIMIZADO
-        mp_pose = mp.solutions.pose
-        pose = mp_pose.Pose(
-            static_image_mode=False,
-            model_complexity=0,  # Modelo más simple = máxima velocidad
-            enable_segmentation=False,
-            min_detection_confidence=0.2,  # Más bajo para detectar más poses
-            min_tracking_confidence=0.2,   # Más bajo para mejor tracking continuo
-            smooth_landmarks=True,         # CLAVE: Suavizado interno de MediaPipe
-            smooth_segmentation=False
-        )
-        
+
+        model['pose'] = create_pose_estimator(model_complexity=0, smooth_landmarks=smooth_landmarks)
+        timeline.mark('model_loaded')
         print("Pose detector inicializado en worker", file=sys.stderr)
-        
-        # Configurar captura de video 
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+    except Exception as e:
+        model['error'] = e
+
+
+def open_camera(width, height):
+    """Abre la cámara 0 con la configuración de baja latencia, o None"""
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        return None
+
+    # Configuración de cámara optimizada para alta velocidad
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, 60)      # Intentar 60 FPS si la cámara lo soporta
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Buffer mínimo para reducir latencia
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))  # MJPEG para mayor velocidad
+    return cap
+
+
+def capture_loop(cap, frame_manager, tracker, latest_slot, stats, stop_event, timeline,
+                 notifier):
+    """Hilo de captura: publica cada frame a la velocidad nativa de la cámara"""
+    frame_counter = 0
+
+    while not stop_event.is_set():
+        try:
+            # Capturar frame
+            ret, frame = cap.read()
+            if not ret:
+                continue
+
+            frame_counter += 1
+            capture_timestamp = time.time()
+            if frame_counter == 1:
+                timeline.mark('first_frame', capture_timestamp)
+
+            # Flipear horizontalmente para efecto espejo
+            frame = cv2.flip(frame, 1)
+
+            # Escribir frame al buffer compartido (todos los frames)
+            frame_manager.put_frame(frame, frame_counter, capture_timestamp)
+            frame_manager.beat('capture_heartbeat')
+
+            # Mientras llega su inferencia, el frame lleva la pose vigente
+            frame_manager.put_result(frame_counter, *tracker.result_for(frame_counter))
+            notifier.notify()
+
+            stats.captured += 1
+            latest_slot.publish(frame, frame_counter, capture_timestamp)
+
+        except Exception as e:
+            print(f"Error capturando frame {frame_counter}: {e}", file=sys.stderr)
+
+
+def inference_loop(pose, frame_manager, tracker, latest_slot, stats, stop_event,
+                   wire_format, stdout_writer, timeline, notifier, region=None):
+    """Hilo de inferencia: procesa siempre el frame más reciente disponible"""
+    while not stop_event.is_set():
+        frame, frame_id, capture_timestamp = latest_slot.take()
+        if frame is None:
+            continue
+
+        try:
+            # PROCESAR POSE del frame más reciente (recortado a la región de la pose)
+            crop_region = None
+            if region is not None:
+                if region.update(tracker, frame.shape):
+                    pose.reset()
+                rgb_frame, crop_region = region.prepare(frame)
+            else:
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            results = pose.process(rgb_frame)
+            stats.inferred += 1
+            if stats.inferred == 1:
+                timeline.mark('first_inference')
+
+            # Preparar resultado con tracking mejorado y persistencia
+            tracking = tracker.update(frame_id, results.pose_landmarks, crop_region, capture_timestamp)
+            landmarks, confidence, frames_since = tracking[:3]
+
+            # PUBLICAR RESULTADO junto a su frame en memoria compartida
+            frame_manager.put_result(frame_id, *tracking)
+            frame_manager.beat('inference_heartbeat')
+            notifier.notify()
+
+            # Primer landmark: enviar las fases de arranque a la UI
+            if confidence == 'high' and timeline.mark('first_landmark'):
+                stdout_writer.write(encode_json_message({'type': 'startup', 'marks': dict(timeline.marks)}))
+
+            # Solo mostrar cada 50 inferencias para reducir overhead
+            if stats.inferred % 50 == 0:
+                print(f"Resultado frame {frame_id}: {'pose detectada' if confidence != 'none' else 'sin pose'} ({confidence})", file=sys.stderr)
+
+            # Copia opcional por stdout (depuración)
+            if wire_format == 'binary':
+                stdout_writer.write(encode_frame_result(
+                    frame_id, capture_timestamp, confidence, frames_since, frame.shape, landmarks
+                ))
+            elif wire_format == 'json':
+                stdout_writer.write(encode_json_message(make_result(
+                    frame_id, landmarks, confidence, frame.shape, frames_since, capture_timestamp
+                )))
+
+        except Exception as e:
+            print(f"Error procesando frame {frame_id}: {e}", file=sys.stderr)
+
+
+def main():
+    """Función principal del worker"""
+    args = parse_args()
+    print(f"Worker MediaPipe iniciado (formato: {args.wire_format})", file=sys.stderr)
+
+    stop_event = threading.Event()
+    threads = []
+    timeline = StartupTimeline(origin=WORKER_START)
+    timeline.mark('process_start', WORKER_START)
+    model = {}
+    loader = None
+
+    try:
+        stdout_writer = StdoutWriter()
+
+        smooth_landmarks = args.landmark_filter == 'none'
+        if args.standby:
+            load_pose_model(timeline, model, smooth_landmarks)
+            if 'error' in model:
+                raise model['error']
+
+            # Primera inferencia en vacío: inicializa el grafo antes de la activación
+            model['pose'].process(np.zeros((args.height, args.width, 3), dtype=np.uint8))
+            model['pose'].reset()
+
+            # Worker de reserva: esperar la orden del supervisor antes de tomar la cámara
+            stdout_writer.write(encode_json_message({'type': 'standby', 'status': 'ready'}))
+            print("Worker en reserva esperando activación", file=sys.stderr)
+            if not sys.stdin.readline():
+                # El proceso principal cerró el pipe
+                return
+            print("Worker de reserva activado", file=sys.stderr)
+        else:
+            # Cargar el modelo en paralelo con la apertura de la cámara
+            loader = threading.Thread(target=load_pose_model, name='carga-modelo',
+                                      args=(timeline, model, smooth_landmarks), daemon=True)
+            loader.start()
+
+        # Configurar captura de video
+        cap = open_camera(args.width, args.height)
+        if cap is None:
             print("Error: No se pudo abrir la cámara", file=sys.stderr)
             return
-        
-        # Configuración de cámara optimizada para alta velocidad
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 60)      # Intentar 60 FPS si la cámara lo soporta
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Buffer mínimo para reducir latencia
-        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))  # MJPEG para mayor velocidad
-        
-        print("Cámara inicializada en worker", file=sys.stderr)
-        
+        timeline.mark('camera_opened')
+
+        # La cámara puede no aceptar la resolución pedida: usar la real
+        frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or args.height,
+                       int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or args.width, 3)
+        print(f"Cámara inicializada en worker ({frame_shape[1]}x{frame_shape[0]})", file=sys.stderr)
+
         # Crear buffer de frames compartido
-        frame_manager = SharedFrameManager(frame_shape=(480, 640, 3))
+        frame_manager = SharedFrameManager(frame_shape=frame_shape)
         buffer_name = frame_manager.create_buffer()
-        
-        # Enviar nombre del buffer al proceso principal
+
+        # Enviar nombre y forma del buffer al proceso principal
         init_message = {
             'type': 'init',
             'shared_buffer_name': buffer_name,
+            'frame_shape': list(frame_shape),
             'status': 'ready'
         }
-        
-        init_json = json.dumps(init_message)
-        init_data = init_json.encode('utf-8')
-        sys.stdout.buffer.write(len(init_data).to_bytes(4, byteorder='little'))
-        sys.stdout.buffer.write(init_data)
-        sys.stdout.buffer.flush()
-        
+
+        stdout_writer.write(encode_json_message(init_message))
+
         print(f"Buffer compartido creado: {buffer_name}", file=sys.stderr)
-        
-        # Loop principal: capturar de cámara y procesar
-        frame_counter = 0
-        last_valid_landmarks = None  # Para interpolación cuando no hay detección
-        last_detection_frame = 0     # Frame donde se detectó la última pose
-        pose_persistence_frames = 10  # Reducido para más fluidez: 10 frames (~0.33 segundos)
-        
-        # Buffer de resultado actual para consistencia
-        current_result = {
-            'landmarks': None,
-            'pose_detected': False,
-            'pose_confidence': 'none',
-            'frame_shape': (480, 640, 3),
-            'frame_id': 0
-        }
-        
-        while True:
-            try:
-                # Capturar frame
-                ret, frame = cap.read()
-                if not ret:
-                    continue
-                
-                frame_counter += 1
-                
-                # Flipear horizontalmente para efecto espejo
-                frame = cv2.flip(frame, 1)
-                
-                # Escribir frame al buffer compartido (todos los frames)
-                frame_manager.put_frame(frame, frame_counter)
-                
-                # Solo mostrar cada 50 frames para reducir overhead de I/O
-                if frame_counter % 50 == 0:
-                    print(f"Frame {frame_counter} procesado", file=sys.stderr)
-                
-                # PROCESAR POSE EN TODOS LOS FRAMES para máxima fluidez
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = pose.process(rgb_frame)
-                
-                # Preparar resultado con tracking mejorado y persistencia
-                frames_since_detection = frame_counter - last_detection_frame
-                
-                if results.pose_landmarks:
-                    # NUEVA DETECCIÓN REAL
-                    landmarks = []
-                    for landmark in results.pose_landmarks.landmark:
-                        landmarks.append({
-                            'x': landmark.x,
-                            'y': landmark.y,
-                            'z': landmark.z,
-                            'visibility': landmark.visibility
-                        })
-                    
-                    # Actualizar landmarks válidos y frame de detección
-                    last_valid_landmarks = landmarks
-                    last_detection_frame = frame_counter
-                    
-                    current_result = {
-                        'landmarks': landmarks,
-                        'pose_detected': True,
-                        'pose_confidence': 'high',  # Alta confianza cuando se detecta
-                        'frame_shape': frame.shape,
-                        'frame_id': frame_counter
-                    }
-                    
-                elif last_valid_landmarks and frames_since_detection <= pose_persistence_frames:
-                    # MANTENER POSE ANTERIOR si está dentro del rango de persistencia
-                    if frames_since_detection <= 3:
-                        confidence_level = 'interpolated'
-                    elif frames_since_detection <= 7:
-                        confidence_level = 'fading'
-                    else:
-                        confidence_level = 'fading'
-                    
-                    current_result = {
-                        'landmarks': last_valid_landmarks,
-                        'pose_detected': True,
-                        'pose_confidence': confidence_level,
-                        'frame_shape': frame.shape,
-                        'frame_id': frame_counter,
-                        'frames_since_detection': frames_since_detection
-                    }
-                    
-                else:
-                    # NO HAY POSE o muy antigua
-                    current_result = {
-                        'landmarks': None,
-                        'pose_detected': False,
-                        'pose_confidence': 'none',
-                        'frame_shape': frame.shape,
-                        'frame_id': frame_counter
-                    }
-                
-                # ENVIAR RESULTADO SIEMPRE (para cada frame)
-                result_json = json.dumps(current_result)
-                result_data = result_json.encode('utf-8')
-                result_size = len(result_data)
-                
-                # Solo mostrar cada 50 frames para reducir overhead
-                if frame_counter % 50 == 0:
-                    confidence_text = current_result.get('pose_confidence', 'unknown')
-                    print(f"Resultado frame {frame_counter}: {'pose detectada' if current_result['pose_detected'] else 'sin pose'} ({confidence_text})", file=sys.stderr)
-                
-                # Escribir tamaño y datos
-                sys.stdout.buffer.write(result_size.to_bytes(4, byteorder='little'))
-                sys.stdout.buffer.write(result_data)
-                sys.stdout.buffer.flush()
-                
-                # Controlar FPS - OPTIMIZADO para máxima velocidad
-                time.sleep(0.01)  # Reducido para más velocidad: ~100 FPS teórico
-                
-            except KeyboardInterrupt:
-                print("Worker interrumpido por usuario", file=sys.stderr)
-                break
-            except Exception as e:
-                print(f"Error procesando frame {frame_counter}: {e}", file=sys.stderr)
-                continue
-        
+
+        # Hilos de captura e inferencia desacoplados
+        tracker = PoseTracker(persistence_frames=10,
+                              landmark_filter=create_landmark_filter(args.landmark_filter))
+        latest_slot = LatestFrameSlot()
+        region = None if args.no_roi else PoseRegion()
+        stats = WorkerStats(latest_slot, region)
+        notifier = FrameNotifier(args.notify_fd)
+
+        # La captura arranca ya: la UI muestra video mientras termina de cargar el modelo
+        threads.append(threading.Thread(
+            target=capture_loop, name='captura', daemon=True,
+            args=(cap, frame_manager, tracker, latest_slot, stats, stop_event, timeline, notifier)
+        ))
+        threads[0].start()
+
+        if loader is not None:
+            loader.join()
+        if 'error' in model:
+            raise model['error']
+
+        threads.append(threading.Thread(
+            target=inference_loop, name='inferencia', daemon=True,
+            args=(model['pose'], frame_manager, tracker, latest_slot, stats, stop_event,
+                  args.wire_format, stdout_writer, timeline, notifier, region)
+        ))
+        threads[1].start()
+
+        # Hilo principal: reportar contadores periódicamente
+        while all(thread.is_alive() for thread in threads):
+            time.sleep(STATS_INTERVAL)
+            snapshot = stats.snapshot()
+            print(f"Frames capturados: {snapshot['captured']} ({snapshot['capture_fps']:.1f} fps), "
+                  f"inferidos: {snapshot['inferred']} ({snapshot['inference_fps']:.1f} fps), "
+                  f"descartados: {snapshot['dropped']}, recortes: {snapshot['roi_crops']}", file=sys.stderr)
+            stdout_writer.write(encode_json_message(snapshot))
+
+    except KeyboardInterrupt:
+        print("Worker interrumpido por usuario", file=sys.stderr)
     except Exception as e:
         print(f"Error en worker: {e}", file=sys.stderr)
         import traceback
         traceback.print_exc(file=sys.stderr)
     finally:
+        # Detener hilos antes de liberar la cámara y la memoria compartida
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=2)
+
         # Limpiar recursos
         if 'cap' in locals():
             cap.release()
@@ -200,4 +398,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,46 @@
+"""
+Aplicación Adwaita de Kohai
+"""
+import gi
+gi.require_version('Gtk', '4.0')
+gi.require_version('Adw', '1')
+
+from gi.repository import Adw
+from .main_window import KohaiMainWindow
+
+
+class KohaiApplication(Adw.Application):
+    """Aplicación principal de Kohai"""
+    
+    def __init__(self, pose_detector=None):
+        super().__init__(application_id="com.kohai.karate-analyzer")
+        self.pose_detector = pose_detector
+        self.connect('activate', self.on_activate)
+        self.connect('shutdown', self.on_shutdown)
+    
+    def on_activate(self, app):
+        """Callback cuando la aplicación se activa"""
+        print("Activando aplicación...")
+        
+        try:
+            # Crear ventana principal de forma simple
+            self.win = KohaiMainWindow(application=app, pose_detector=self.pose_detector)
+            print("Ventana creada")
+            
+            # Configurar y mostrar inmediatamente
+            self.win.set_default_size(1200, 800)
+            self.win.present()
+            if self.pose_detector:
+                self.pose_detector.timeline.mark('window_presented')
+            
+            print(f"Ventana mostrada - Visible: {self.win.get_visible()}")
+            
+        except Exception as e:
+            print(f"Error creando ventana: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    def on_shutdown(self, app):
+        """Detener el worker aunque la ventana no llegue a cerrarse por el botón Salir"""
+        if self.pose_detector:
+            self.pose_detector.stop()
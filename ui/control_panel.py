@@ -1,6 +1,14 @@
 """
 Panel de control lateral con categorías, técnicas, grabación y métricas
+
+Las métricas llegan mucho más rápido de lo que se pueden leer: el panel
+se queda con la última pendiente y refresca como mucho metrics_rate
+veces por segundo (KOHAI_METRICS_RATE, 10 Hz por defecto), cambiando el
+texto de las filas existentes en lugar de recrearlas. get_metrics_stats()
+cuenta refrescos, actualizaciones descartadas y filas creadas o quitadas.
 """
+import os
+import time
 import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
@@ -20,7 +28,7 @@ class ControlPanel(Gtk.Box):
         'reference-loaded': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
     }
     
-    def __init__(self):
+    def __init__(self, metrics_rate=None):
         super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=10)
         self.set_margin_top(10)
         self.set_margin_bottom(10)
@@ -31,6 +39,26 @@ class ControlPanel(Gtk.Box):
         self.current_category = "stances"
         self.current_technique = "sanchin-dachi"
         
+        # Refresco de métricas: como mucho metrics_rate veces por segundo
+        if metrics_rate is None:
+            metrics_rate = float(os.environ.get('KOHAI_METRICS_RATE', '10'))
+        self.metrics_rate = metrics_rate
+        self._pending_metrics = None
+        self._metrics_pending = False    # Hay una actualización sin aplicar
+        self._metrics_source = None      # Refresco programado
+        self._last_metrics_refresh = 0.0
+        self._pose_status_markup = None
+        self.metrics_stats = {
+            'received': 0,         # Llamadas a update_metrics
+            'applied': 0,          # Refrescos del panel
+            'dropped': 0,          # Sustituidas por una más nueva antes de aplicarse
+            'rows_created': 0,
+            'rows_removed': 0,
+            'labels_updated': 0,   # set_markup con texto nuevo
+            'labels_unchanged': 0, # Texto igual al mostrado: sin tocar el widget
+        }
+        self._metrics_stats_start = time.monotonic()
+        
         # Datos de técnicas
         self.techniques_data = {
             "stances": [
@@ -65,7 +93,7 @@ class ControlPanel(Gtk.Box):
             ],
         }
         
-        # Mapa de métricas a mostrar por cada stance
+        # Mapa de métricas a mostrar por cada técnica (stances, golpes, patadas y katas)
         self.stance_metric_map = {
             'sanchin-dachi': [
                 ('stance_width_ratio', 'Ancho Stance', '{:.2f}x'),
@@ -91,6 +119,38 @@ class ControlPanel(Gtk.Box):
                 ('back_knee_angle', 'Rodilla Trasera', '{:.1f}°'),
             ]
         }
+        # Todos los golpes de puño muestran las métricas de StrikeAnalyzer
+        strike_metrics = [
+            ('peak_speed', 'Velocidad Pico', '{:.1f} m/s'),
+            ('peak_acceleration', 'Aceleración', '{:.0f} m/s²'),
+            ('straightness', 'Trayectoria Recta', '{:.0%}'),
+            ('arm_extension', 'Extensión Brazo', '{:.0%}'),
+            ('hikite_retraction', 'Retracción Hikite', '{:.2f} m'),
+            ('hip_rotation', 'Rotación Cadera', '{:.0f}°'),
+        ]
+        for technique, _ in self.techniques_data["golpes"]:
+            self.stance_metric_map[technique] = strike_metrics
+        # Y todas las patadas las de KickAnalyzer
+        kick_metrics = [
+            ('max_ankle_height', 'Altura Tobillo / Cadera', '{:+.2f} m'),
+            ('knee_extension', 'Extensión Rodilla', '{:.0f}°'),
+            ('peak_knee_angular_velocity', 'Vel. Angular Rodilla', '{:.0f}°/s'),
+            ('peak_hip_angular_velocity', 'Vel. Angular Cadera', '{:.0f}°/s'),
+            ('peak_foot_speed', 'Velocidad Pie', '{:.1f} m/s'),
+            ('support_sway', 'Balanceo Apoyo', '{:.3f} m'),
+            ('support_stability', 'Estabilidad', '{:.0%}'),
+        ]
+        for technique, _ in self.techniques_data["patadas"]:
+            self.stance_metric_map[technique] = kick_metrics
+        # Y las katas el alineamiento con su ejecución de referencia
+        kata_metrics = [
+            ('segment', 'Tramo', '{}'),
+            ('progress', 'Progreso', '{:.0%}'),
+            ('timing_offset', 'Retraso', '{:+.1f} s'),
+            ('cost', 'Desviación', '{:.2f}'),
+        ]
+        for technique, _ in self.techniques_data["katas"]:
+            self.stance_metric_map[technique] = kata_metrics
         
         self.setup_ui()
         
@@ -246,6 +306,13 @@ class ControlPanel(Gtk.Box):
         status_row.add_suffix(self.pose_status_label)
         group.add(status_row)
         
+        self.recognized_stance_label = Gtk.Label(label="--")
+        self.recognized_stance_label.set_halign(Gtk.Align.START)
+        
+        stance_row = Adw.ActionRow(title="🥋 Stance Reconocido")
+        stance_row.add_suffix(self.recognized_stance_label)
+        group.add(stance_row)
+        
         return group
     
     def setup_metrics_section(self):
@@ -259,8 +326,11 @@ class ControlPanel(Gtk.Box):
         score_row = Adw.ActionRow(title="🏆 Puntuación General")
         score_row.add_suffix(self.score_label)
         self.metrics_group.add(score_row)
+        self._score_markup = "--/100"
         
-        self.metrics_rows = []
+        # Filas de la técnica actual: clave -> [fila, label, texto mostrado]
+        self.metrics_rows = {}
+        self._metrics_rows_technique = None
         
         return self.metrics_group
     
@@ -308,62 +378,134 @@ class ControlPanel(Gtk.Box):
     # === ACTUALIZACIONES DE UI ===
 
     def update_pose_status(self, pose_data):
-        """Actualiza el label de estado de la pose."""
-        def _update():
-            if not pose_data:
-                status_text = '<span color="orange">Desconectado</span>'
-            elif pose_data.get('pose_detected'):
-                confidence = pose_data.get('pose_confidence', 'unknown')
-                if confidence == 'high':
-                    status_text = '<span color="green"><b>Detectada</b></span>'
-                elif confidence == 'interpolated':
-                    status_text = '<span color="yellow">Tracking...</span>'
-                elif confidence == 'fading':
-                    status_text = '<span color="orange">Perdiendo...</span>'
-                else:
-                    status_text = '<span color="green">Detectada</span>'
+        """Actualiza el label de estado de la pose (solo si cambia el texto)."""
+        if not pose_data:
+            status_text = '<span color="orange">Desconectado</span>'
+        elif pose_data.get('pose_detected'):
+            confidence = pose_data.get('pose_confidence', 'unknown')
+            if confidence == 'high':
+                status_text = '<span color="green"><b>Detectada</b></span>'
+            elif confidence == 'interpolated':
+                status_text = '<span color="yellow">Tracking...</span>'
+            elif confidence == 'fading':
+                status_text = '<span color="orange">Perdiendo...</span>'
             else:
-                status_text = '<span color="red">No Detectada</span>'
+                status_text = '<span color="green">Detectada</span>'
+        else:
+            status_text = '<span color="red">No Detectada</span>'
+        if status_text == self._pose_status_markup:
+            return
+        self._pose_status_markup = status_text
+        
+        def _update():
             self.pose_status_label.set_markup(status_text)
             return False
         GLib.idle_add(_update)
 
-    def update_metrics(self, metrics):
-        """Actualiza los widgets de métricas con nuevos datos."""
+    def update_recognized_stance(self, recognition):
+        """Actualiza el label del stance reconocido automáticamente."""
         def _update():
-            # Limpiar métricas anteriores
-            for row in self.metrics_rows:
-                self.metrics_group.remove(row)
-            self.metrics_rows.clear()
-
-            if not metrics:
-                self.score_label.set_markup("--/100")
+            stance = recognition.get('stance') if recognition else None
+            if stance is None:
+                self.recognized_stance_label.set_markup("--")
                 return False
+            names = dict(self.techniques_data.get("stances", []))
+            score = recognition.get('score', 0)
+            self.recognized_stance_label.set_markup(
+                f"<b>{names.get(stance, stance)}</b> <small>({score:.0f}/100)</small>"
+            )
+            return False
+        GLib.idle_add(_update)
 
-            # Actualizar puntuación
-            if 'score' in metrics:
-                score = metrics['score']
-                grade = metrics.get('grade', '')
-                score_text = f"<b>{score:.0f}</b>/100 <small>({grade})</small>"
-                self.score_label.set_markup(score_text)
+    def update_metrics(self, metrics):
+        """
+        Encola nuevas métricas: solo se aplica la más reciente, como mucho
+        metrics_rate veces por segundo.
+        """
+        self.metrics_stats['received'] += 1
+        if self._metrics_pending:
+            self.metrics_stats['dropped'] += 1
+        self._pending_metrics = metrics
+        self._metrics_pending = True
+        if self._metrics_source is None:
+            interval = 1.0 / self.metrics_rate if self.metrics_rate > 0 else 0.0
+            delay = max(0.0, self._last_metrics_refresh + interval - time.monotonic())
+            self._metrics_source = GLib.timeout_add(int(delay * 1000), self._flush_metrics)
 
-            # Obtener las métricas a mostrar para la técnica actual
-            metrics_to_display = self.stance_metric_map.get(self.current_technique, [])
+    def _flush_metrics(self):
+        """Aplica la última actualización pendiente"""
+        self._metrics_source = None
+        metrics, self._pending_metrics = self._pending_metrics, None
+        self._metrics_pending = False
+        self._last_metrics_refresh = time.monotonic()
+        self._apply_metrics(metrics)
+        
+        self.metrics_stats['applied'] += 1
+        # Solo mostrar cada 100 refrescos para reducir overhead de I/O
+        if self.metrics_stats['applied'] % 100 == 0:
+            stats = self.get_metrics_stats()
+            print(f"Panel: {stats['update_rate']:.1f} refrescos/s, "
+                  f"{stats['dropped']} descartadas de {stats['received']}, "
+                  f"filas creadas/quitadas {stats['rows_created']}/{stats['rows_removed']}, "
+                  f"labels cambiados {stats['labels_updated']}")
+        return False
 
-            # Crear y añadir nuevas filas de métricas
-            for key, title, fmt in metrics_to_display:
-                if key in metrics:
-                    value = metrics[key]
-                    value_str = fmt.format(value)
-                    label = Gtk.Label()
-                    label.set_halign(Gtk.Align.END)
-                    label.set_markup(f"<tt>{value_str}</tt>")
-                    row = Adw.ActionRow(title=title)
-                    row.add_suffix(label)
-                    self.metrics_group.add(row)
-                    self.metrics_rows.append(row)
-            return False
-        GLib.idle_add(_update)
+    def get_metrics_stats(self):
+        """Contadores del refresco de métricas y refrescos por segundo"""
+        elapsed = max(time.monotonic() - self._metrics_stats_start, 1e-6)
+        return dict(self.metrics_stats, update_rate=self.metrics_stats['applied'] / elapsed)
+
+    def _set_markup(self, label, markup, shown):
+        """set_markup solo si el texto cambia; devuelve el texto mostrado"""
+        if markup == shown:
+            self.metrics_stats['labels_unchanged'] += 1
+            return shown
+        label.set_markup(markup)
+        self.metrics_stats['labels_updated'] += 1
+        return markup
+
+    def _ensure_metric_rows(self):
+        """Crea las filas de la técnica actual (ocultas) si cambió la técnica"""
+        if self._metrics_rows_technique == self.current_technique:
+            return
+        for row, _, _ in self.metrics_rows.values():
+            self.metrics_group.remove(row)
+        self.metrics_stats['rows_removed'] += len(self.metrics_rows)
+        self.metrics_rows = {}
+        
+        for key, title, _ in self.stance_metric_map.get(self.current_technique, []):
+            label = Gtk.Label()
+            label.set_halign(Gtk.Align.END)
+            row = Adw.ActionRow(title=title)
+            row.add_suffix(label)
+            row.set_visible(False)
+            self.metrics_group.add(row)
+            self.metrics_rows[key] = [row, label, None]
+        self.metrics_stats['rows_created'] += len(self.metrics_rows)
+        self._metrics_rows_technique = self.current_technique
+
+    def _apply_metrics(self, metrics):
+        """Actualiza en su sitio la puntuación y las filas de métricas"""
+        self._ensure_metric_rows()
+        
+        if metrics and 'score' in metrics:
+            score = metrics['score']
+            grade = metrics.get('grade', '')
+            score_text = f"<b>{score:.0f}</b>/100 <small>({grade})</small>"
+        else:
+            # Sin métricas, o métricas sin puntuación (golpes y patadas)
+            score_text = "--/100"
+        self._score_markup = self._set_markup(self.score_label, score_text, self._score_markup)
+        
+        # Las filas sin valor en esta actualización se ocultan
+        for key, _, fmt in self.stance_metric_map.get(self.current_technique, []):
+            entry = self.metrics_rows[key]
+            row, label, shown = entry
+            if metrics and key in metrics:
+                entry[2] = self._set_markup(label, f"<tt>{fmt.format(metrics[key])}</tt>", shown)
+                row.set_visible(True)
+            else:
+                row.set_visible(False)
 
     # === MANEJADORES DE EVENTOS ===
 
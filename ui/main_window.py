@@ -13,8 +13,10 @@ from .control_panel import ControlPanel
 class KohaiMainWindow(Adw.ApplicationWindow):
     """Ventana principal de la aplicación Kohai"""
     
-    def __init__(self, **kwargs):
+    def __init__(self, pose_detector=None, **kwargs):
         super().__init__(**kwargs)
+        # Detector lanzado desde main.py en paralelo con el arranque de GTK
+        self.pose_detector = pose_detector
         
         # Configuración básica de ventana - tamaño más razonable
         self.set_title("Kohai - Karate Motion Analysis")
@@ -93,7 +95,7 @@ class KohaiMainWindow(Adw.ApplicationWindow):
         self.main_paned.set_resize_end_child(False)
         
         # Widget de video (lado izquierdo)
-        self.video_widget = VideoWidget()
+        self.video_widget = VideoWidget(pose_detector=self.pose_detector)
         self.main_paned.set_start_child(self.video_widget)
         
         # Panel de control (lado derecho) - con scroll
@@ -132,6 +134,7 @@ class KohaiMainWindow(Adw.ApplicationWindow):
         # Conectar señales del widget de video al panel de control
         self.video_widget.connect('pose-detected', self.on_pose_detected)
         self.video_widget.connect('metrics-updated', self.on_metrics_updated)
+        self.video_widget.connect('stance-recognized', self.on_stance_recognized)
     
     def on_window_mapped(self, widget):
         """
@@ -190,6 +193,10 @@ class KohaiMainWindow(Adw.ApplicationWindow):
         # Actualizar métricas en el panel de control
         self.control_panel.update_metrics(metrics)
     
+    def on_stance_recognized(self, video_widget, recognition):
+        """Maneja el reconocimiento automático del stance"""
+        self.control_panel.update_recognized_stance(recognition)
+    
     def on_overlay_toggled(self, control_panel, enabled):
         """Maneja el toggle del overlay de pose detection"""
         self.video_widget.set_overlay_enabled(enabled)
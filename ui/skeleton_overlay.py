@@ -0,0 +1,194 @@
+"""
+Video con esqueletos vectoriales dibujados en el snapshot de GTK
+
+VideoPaintable muestra la textura del último frame y encima la pose
+detectada y la de referencia como trazos y círculos de Gsk con opacidad
+de grupo. El coste depende del número de primitivas (unas 50 por
+esqueleto), no de los píxeles del frame, y como se dibuja a la resolución
+de pantalla los esqueletos siguen nítidos al escalar la ventana.
+
+Los puntos son coordenadas normalizadas (x, y) de MediaPipe, o None si
+el landmark no es visible. La referencia no cambia entre frames: su capa
+se graba una vez en un nodo de render y se reutiliza hasta que cambian la
+referencia o el tamaño dibujado.
+"""
+import math
+import gi
+gi.require_version('Gtk', '4.0')
+gi.require_version('Gsk', '4.0')
+gi.require_version('Graphene', '1.0')
+
+from gi.repository import Gdk, GObject, Graphene, Gsk, Gtk
+
+
+# Conexiones principales: torso, brazos, piernas y cabeza
+SKELETON_CONNECTIONS = [
+    (11, 12), (11, 23), (12, 24), (23, 24),
+    (11, 13), (13, 15), (12, 14), (14, 16),
+    (23, 25), (25, 27), (24, 26), (26, 28),
+    (0, 1), (1, 2), (2, 3), (0, 4), (4, 5), (5, 6),
+]
+
+# Grupos de puntos: torso, brazos, piernas y el resto
+POINT_GROUPS = ('torso', 'arms', 'legs', 'other')
+_GROUP_OF = {**{i: 'torso' for i in (11, 12, 23, 24)},
+             **{i: 'arms' for i in (13, 14, 15, 16)},
+             **{i: 'legs' for i in (25, 26, 27, 28)}}
+
+
+def _rgba(red, green, blue):
+    color = Gdk.RGBA()
+    color.red, color.green, color.blue, color.alpha = red / 255, green / 255, blue / 255, 1.0
+    return color
+
+
+# Estilo de la pose detectada: colores y radios (px del frame) por grupo
+POSE_STYLE = {
+    'points': {'torso': (_rgba(0, 0, 255), 6), 'arms': (_rgba(0, 255, 0), 5),
+               'legs': (_rgba(255, 0, 0), 5), 'other': (_rgba(255, 255, 0), 4)},
+    'line': _rgba(255, 255, 0),
+}
+
+# Opacidad, grosor de línea y factor de radio según la confianza
+CONFIDENCE_STYLE = {
+    'high': (1.0, 3, 1.0),
+    'interpolated': (0.8, 2, 0.9),
+    'fading': (0.5, 2, 0.7),
+}
+DEFAULT_CONFIDENCE_STYLE = (0.6, 2, 0.8)
+
+# Referencia: tonos azules, semitransparente
+REFERENCE_STYLE = {
+    'points': {'torso': (_rgba(100, 150, 255), 4), 'arms': (_rgba(0, 100, 200), 3),
+               'legs': (_rgba(0, 50, 150), 3), 'other': (_rgba(50, 120, 180), 2)},
+    'line': _rgba(50, 120, 200),
+}
+REFERENCE_OPACITY = 0.3
+REFERENCE_LINE_WIDTH = 2
+
+
+def append_skeleton(snapshot, points, style, width, height, scale,
+                    line_width, radius_scale=1.0):
+    """
+    Añade al snapshot un esqueleto: un trazo con todas las conexiones y un
+    relleno por grupo de puntos. width y height son el tamaño dibujado y
+    scale pasa píxeles del frame a píxeles de pantalla.
+    """
+    pixels = [(point[0] * width, point[1] * height) if point is not None else None
+              for point in points]
+
+    lines = Gsk.PathBuilder.new()
+    drawn = False
+    for start, end in SKELETON_CONNECTIONS:
+        if end < len(pixels) and pixels[start] and pixels[end]:
+            lines.move_to(*pixels[start])
+            lines.line_to(*pixels[end])
+            drawn = True
+    if drawn:
+        stroke = Gsk.Stroke.new(line_width * scale)
+        stroke.set_line_cap(Gsk.LineCap.ROUND)
+        snapshot.append_stroke(lines.to_path(), stroke, style['line'])
+
+    circles = {group: Gsk.PathBuilder.new() for group in POINT_GROUPS}
+    used = set()
+    for index, pixel in enumerate(pixels):
+        if pixel is None:
+            continue
+        group = _GROUP_OF.get(index, 'other')
+        radius = int(style['points'][group][1] * radius_scale) * scale
+        circles[group].add_circle(Graphene.Point().init(*pixel), radius)
+        used.add(group)
+    for group in POINT_GROUPS:
+        if group in used:
+            snapshot.append_fill(circles[group].to_path(), Gsk.FillRule.WINDING,
+                                 style['points'][group][0])
+
+
+class VideoPaintable(GObject.Object, Gdk.Paintable):
+    """Textura del frame con la pose detectada y la de referencia encima"""
+
+    def __init__(self):
+        super().__init__()
+        self.texture = None
+        self.pose_points = None
+        self.pose_confidence = 'high'
+        self.reference_points = None
+        # Capa de referencia grabada, tamaño (dibujado y del frame) para el
+        # que se grabó y número de grabaciones
+        self._reference_node = None
+        self._reference_size = None
+        self.reference_renders = 0
+
+    def set_texture(self, texture):
+        """Cambia el frame mostrado"""
+        resized = (self.texture is None or
+                   texture.get_width() != self.texture.get_width() or
+                   texture.get_height() != self.texture.get_height())
+        self.texture = texture
+        if resized:
+            self.invalidate_size()
+        self.invalidate_contents()
+
+    def set_pose(self, points, confidence='high'):
+        """Pose a dibujar sobre el frame (None para ninguna)"""
+        self.pose_points = points
+        self.pose_confidence = confidence
+        self.invalidate_contents()
+
+    def set_reference(self, points):
+        """
+        Pose de referencia a dibujar bajo la detectada: array (N, 2)
+        normalizado con NaN en los puntos no visibles, o None para ninguna.
+        """
+        if points is None:
+            self.reference_points = None
+        else:
+            self.reference_points = [None if math.isnan(x) or math.isnan(y) else (x, y)
+                                     for x, y in points.tolist()]
+        self._reference_node = None
+        self.invalidate_contents()
+
+    def _reference_layer(self, width, height):
+        """Nodo de render de la referencia, grabado de nuevo solo si cambia el tamaño"""
+        size = (width, height, self.texture.get_width())
+        if self._reference_node is None or self._reference_size != size:
+            recorder = Gtk.Snapshot.new()
+            recorder.push_opacity(REFERENCE_OPACITY)
+            append_skeleton(recorder, self.reference_points, REFERENCE_STYLE, width, height,
+                            width / self.texture.get_width(), REFERENCE_LINE_WIDTH)
+            recorder.pop()
+            self._reference_node = recorder.to_node()
+            self._reference_size = size
+            self.reference_renders += 1
+        return self._reference_node
+
+    def do_get_intrinsic_width(self):
+        return self.texture.get_width() if self.texture else 0
+
+    def do_get_intrinsic_height(self):
+        return self.texture.get_height() if self.texture else 0
+
+    def do_get_intrinsic_aspect_ratio(self):
+        if not self.texture:
+            return 0.0
+        return self.texture.get_width() / self.texture.get_height()
+
+    def do_snapshot(self, snapshot, width, height):
+        if self.texture is None:
+            return
+        snapshot.append_texture(self.texture, Graphene.Rect().init(0, 0, width, height))
+        # Píxeles de pantalla por píxel del frame: grosores y radios a escala
+        scale = width / self.texture.get_width()
+
+        if self.reference_points:
+            node = self._reference_layer(width, height)
+            if node is not None:
+                snapshot.append_node(node)
+
+        if self.pose_points:
+            alpha, line_width, radius_scale = CONFIDENCE_STYLE.get(
+                self.pose_confidence, DEFAULT_CONFIDENCE_STYLE)
+            snapshot.push_opacity(alpha)
+            append_skeleton(snapshot, self.pose_points, POSE_STYLE,
+                            width, height, scale, line_width, radius_scale)
+            snapshot.pop()
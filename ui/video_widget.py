@@ -5,13 +5,22 @@ import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('GObject', '2.0')
 
-from gi.repository import Gtk, GLib, GdkPixbuf, Gdk, GObject
+from gi.repository import Gtk, GLib, Gdk, GObject
 import cv2
 import numpy as np
 import threading
+import os
 import time
 from analysis.subprocess_pose_detector import SubprocessPoseDetector
 from analysis.stance_analyzer import StanceAnalyzer
+from analysis.stance_classifier import StanceClassifier
+from analysis.feature_cache import FeatureCache
+from analysis.strike_analyzer import StrikeAnalyzer
+from analysis.kick_analyzer import KickAnalyzer
+from analysis.technique_segmenter import TechniqueSegmenter
+from analysis.kata_alignment import KATA_REFERENCE_DIRECTORY, KataAligner, KataReference
+from analysis.landmark_protocol import array_to_landmarks
+from ui.skeleton_overlay import VideoPaintable
 
 
 class VideoWidget(Gtk.Box):
@@ -20,9 +29,10 @@ class VideoWidget(Gtk.Box):
     __gsignals__ = {
         'pose-detected': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
         'metrics-updated': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        'stance-recognized': (GObject.SignalFlags.RUN_FIRST, None, (object,)),
     }
     
-    def __init__(self):
+    def __init__(self, pose_detector=None):
         super().__init__(orientation=Gtk.Orientation.VERTICAL)
         print("Inicializando VideoWidget...")
         
@@ -36,20 +46,66 @@ class VideoWidget(Gtk.Box):
         
         # Componentes de análisis
         self.stance_analyzer = StanceAnalyzer()
+        # Rasgos por detección compartidos por overlay, reconocimiento y
+        # análisis: las poses repetidas entre inferencias no se recalculan
+        self.feature_cache = FeatureCache(self.stance_analyzer)
+        # Reconocimiento continuo del stance (práctica libre y katas)
+        self.stance_classifier = StanceClassifier(self.stance_analyzer)
+        self.stance_classifier.load_references("data/references")
+        self.last_recognition = None
+        # Golpes y patadas: cinemática incremental sobre cada detección nueva;
+        # el segmentador decide cuándo empieza y termina cada técnica y el
+        # analizador de la categoría solo mide esos segmentos
+        self.technique_segmenter = TechniqueSegmenter()
+        self.strike_analyzer = StrikeAnalyzer()
+        self.kick_analyzer = KickAnalyzer()
+        self.dynamic_analyzers = {
+            "golpes": (self.strike_analyzer, "golpe"),
+            "patadas": (self.kick_analyzer, "patada"),
+        }
+        self.last_kinematics_frame = None
+        # Katas: alineamiento DTW en línea contra la ejecución de referencia
+        self.kata_aligner = None
+        self.last_kata_frame = None
         
-        # IMPORTANTE: No inicializar el detector aquí para evitar problemas con GTK
-        # Se iniciará cuando la ventana esté completamente cargada
-        self.pose_detector = None
+        # IMPORTANTE: No crear el detector aquí para evitar problemas con GTK.
+        # main.py lo lanza antes de importar GTK; si no, se crea cuando la
+        # ventana esté completamente cargada
+        self.pose_detector = pose_detector
         
         # Estado del procesamiento
         self.last_processed_frame = None
         self.overlay_enabled = True
         self.frame_skip_counter = 0
-        self.last_frame_from_worker = None  # Para almacenar último frame del worker
+        self.last_frame_from_worker = None  # frame_counter del último frame mostrado
+        
+        # Presentación guiada por el worker: cada aviso de su pipe pide un
+        # tick del reloj de frames, y el tick presenta como mucho un frame
+        # nuevo por refresco de pantalla
+        self._notify_source = None   # Vigilancia del pipe de avisos
+        self._poll_source = None     # Sondeo de respaldo sin pipe
+        self._tick_id = None         # Tick pendiente del reloj de frames
+        
+        # Camino de render: memoria compartida -> bytes (BGR) -> GLib.Bytes.
+        # Los píxeles no se tocan (esqueletos y estado van encima), así que
+        # cada frame cuesta dos copias completas: la nuestra y la de GLib
+        self._message_shown = None
+        self.render_stats = {
+            'frames': 0,
+            'frame_copies': 0,      # Copias completas de frames presentados
+            'bytes_copied': 0,      # Memoria compartida -> bytes
+            'bytes_uploaded': 0,    # Copia de entrega a GTK (GLib.Bytes.new)
+            'discarded_frames': 0,  # Frames rotos descartados por el seqlock
+            'collapsed_results': 0, # Resultados sustituidos antes de analizarse
+            'techniques': 0,        # Técnicas dinámicas segmentadas y analizadas
+        }
+        # Resultado pendiente de _emit_pose_signal (un solo idle en cola)
+        self._pending_pose_result = None
         
         # Datos de referencia
         self.reference_data = None
         self.reference_landmarks = None
+        self.reference_points = None  # (N, 2) normalizado, preparado al cargar la referencia
         self.show_reference_overlay = True
         
         # Estados para suavidad de pose
@@ -76,29 +132,6 @@ class VideoWidget(Gtk.Box):
         # Esto evita que GTK se bloquee esperando a la cámara o al subproceso
         GLib.idle_add(self._async_start_everything)
     
-    def process_frame(self, frame):
-        """Procesa un frame y actualiza el overlay"""
-        if self.pose_detector:
-            pose_result = self.pose_detector.process_frame(frame)
-            if pose_result:
-                self.last_pose_result = pose_result
-                self.last_pose_timestamp = time.time()
-
-                # Enviar landmarks al StanceAnalyzer
-                metrics = self.stance_analyzer.analyze(pose_result)
-                self.emit('metrics-updated', metrics)
-
-                # Dibujar overlay
-                self.draw_overlay(frame, pose_result)
-
-        return frame
-
-    def draw_overlay(self, frame, pose_result):
-        """Dibuja los landmarks en el frame"""
-        for landmark in pose_result['landmarks']:
-            x, y = int(landmark[0] * frame.shape[1]), int(landmark[1] * frame.shape[0])
-            cv2.circle(frame, (x, y), 5, (0, 255, 0), -1)
-    
     def _async_start_everything(self):
         """Inicia cámara y detector de forma asíncrona sin bloquear GTK"""
         try:
@@ -118,6 +151,9 @@ class VideoWidget(Gtk.Box):
                 self.pose_detector.start()
                 print("Detector iniciado de forma asíncrona")
             
+            # 4. Presentar frames según los avisos del worker
+            self._watch_worker_frames()
+            
         except Exception as e:
             print(f"Error en inicialización asíncrona: {e}")
             import traceback
@@ -131,8 +167,11 @@ class VideoWidget(Gtk.Box):
         # Contenedor principal con clase CSS
         self.add_css_class("video-container")
         
-        # Imagen para mostrar el video
+        # Imagen para mostrar el video: la textura del frame con los
+        # esqueletos dibujados encima como vectores (VideoPaintable)
+        self.video_paintable = VideoPaintable()
         self.video_image = Gtk.Picture()
+        self.video_image.set_paintable(self.video_paintable)
         self.video_image.set_hexpand(True)
         self.video_image.set_vexpand(True)
         self.video_image.set_content_fit(Gtk.ContentFit.CONTAIN)
@@ -152,6 +191,7 @@ class VideoWidget(Gtk.Box):
         # Label para métricas en tiempo real
         self.metrics_label = Gtk.Label()
         self.metrics_label.set_markup('<span size="small" color="white">Video: Activo</span>')
+        self._status_markup = None
         self.metrics_label.set_halign(Gtk.Align.START)
         self.metrics_label.set_valign(Gtk.Align.START)
         self.metrics_label.set_margin_top(10)
@@ -168,6 +208,16 @@ class VideoWidget(Gtk.Box):
         self.recording_label.set_visible(False)
         self.overlay.add_overlay(self.recording_label)
         
+        # Label que acompaña al esqueleto de referencia
+        self.reference_label = Gtk.Label()
+        self.reference_label.set_markup('<span weight="bold" color="#3278c8">REFERENCIA</span>')
+        self.reference_label.set_halign(Gtk.Align.START)
+        self.reference_label.set_valign(Gtk.Align.END)
+        self.reference_label.set_margin_bottom(10)
+        self.reference_label.set_margin_start(10)
+        self.reference_label.set_visible(False)
+        self.overlay.add_overlay(self.reference_label)
+        
         self.append(self.overlay)
         
         # Aplicar CSS
@@ -193,46 +243,89 @@ class VideoWidget(Gtk.Box):
     def init_camera(self):
         """Ya no necesitamos cámara aquí - el worker la maneja directamente"""
         try:
-            # Solo crear un frame dummy para mostrar algo inicial
-            dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(dummy_frame, "Conectando con detector...", 
-                       (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            
             self.running = True
             
-            # Timer para actualizar UI - MÁXIMA FLUIDEZ
-            GLib.timeout_add(16, self.update_frame)  # ~60 FPS para máxima responsividad
+            # Sin temporizador: los frames se presentan al avisar el worker
+            # (_watch_worker_frames, una vez creado el detector)
             
             # Mostrar frame inicial
-            self.update_video_display(dummy_frame)
+            self._show_message_frame("Conectando con detector...", (50, 240))
             
             print("Sistema de video inicializado (esperando frames del worker)")
                 
         except Exception as e:
             print(f"Error inicializando sistema de video: {e}")
     
+    def _watch_worker_frames(self):
+        """Vigila el pipe de avisos del worker como fuente de GLib"""
+        if self._notify_source is not None or self._poll_source is not None:
+            return
+        notify_fd = getattr(self.pose_detector, 'notify_fd', None)
+        if notify_fd is not None:
+            self._notify_source = GLib.unix_fd_add_full(
+                GLib.PRIORITY_DEFAULT, notify_fd,
+                GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR,
+                self._on_worker_notify
+            )
+        else:
+            # Detector sin pipe de avisos: sondear, pero presentar igualmente en el tick
+            self._poll_source = GLib.timeout_add(16, self._request_present)
+    
+    def _on_worker_notify(self, fd, condition):
+        """Aviso de frame nuevo: vaciar el pipe y pedir un tick"""
+        if condition & (GLib.IOCondition.HUP | GLib.IOCondition.ERR):
+            self._notify_source = None
+            return GLib.SOURCE_REMOVE
+        # Varios avisos entre dos refrescos se presentan juntos en un solo tick
+        self.pose_detector.drain_notifications()
+        self._request_present()
+        return GLib.SOURCE_CONTINUE
+    
+    def _request_present(self):
+        """Pide presentar en el próximo refresco (un solo tick pendiente)"""
+        if not self.running:
+            self._poll_source = None
+            return GLib.SOURCE_REMOVE
+        if self._tick_id is None:
+            self._tick_id = self.video_image.add_tick_callback(self._on_tick)
+        return GLib.SOURCE_CONTINUE
+    
+    def _on_tick(self, widget, frame_clock):
+        """Tick del reloj de frames: presentar el frame nuevo, si lo hay"""
+        self._tick_id = None
+        self.update_frame()
+        # El tick no se repite: el reloj solo se despierta con otro aviso
+        return GLib.SOURCE_REMOVE
+    
     def update_frame(self):
         """Actualiza UI con frames y resultados del worker"""
         if not self.running:
             return False
         
         try:
-            display_frame = None
-            current_pose_result = None
+            if not self.pose_detector:
+                # Si no tenemos detector, mostrar mensaje de espera
+                self._show_message_frame("Esperando detector...", (180, 240))
+                return True
             
-            # Obtener TODOS los resultados disponibles para usar el más reciente
-            if self.pose_detector:
-                try:
-                    # Leer todos los resultados disponibles para evitar lag
+            current_pose_result = None
+            fresh_result = False
+            
+            try:
+                if self.pose_detector.results_in_shared_memory:
+                    # Frame y landmarks del mismo slot: par consistente
+                    view = self.pose_detector.get_latest_frame_view(require_result=True)
+                    if view is not None:
+                        current_pose_result = view.result()
+                        fresh_result = True
+                else:
+                    # Modo depuración: resultados por el pipe de stdout
                     while True:
                         result = self.pose_detector.get_result()
                         if result is None:
                             break
                         current_pose_result = result  # Quedarse con el más reciente
-                        # Actualizar timestamp y estado si tenemos resultado válido
-                        if result.get('pose_detected'):
-                            self.last_pose_result = result
-                            self.last_pose_timestamp = time.time()
+                        fresh_result = True
                     
                     # Si no tenemos resultado nuevo, usar el último válido si no ha expirado
                     if (current_pose_result is None and 
@@ -240,128 +333,286 @@ class VideoWidget(Gtk.Box):
                         (time.time() - self.last_pose_timestamp) < self.pose_timeout):
                         current_pose_result = self.last_pose_result
                     
-                    # Obtener frame desde memoria compartida
-                    shared_frame, frame_counter = self.pose_detector.get_latest_frame()
-                    
-                    if shared_frame is not None:
-                        # Usar frame de memoria compartida como base
-                        base_frame = shared_frame.copy()
-                        self.last_frame_from_worker = base_frame
-                    elif self.last_frame_from_worker is not None:
-                        # Usar último frame disponible
-                        base_frame = self.last_frame_from_worker
-                    else:
-                        # Frame dummy si aún no tenemos frames
-                        base_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                        cv2.putText(base_frame, "Conectando...", 
-                                   (250, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                    
-                    # Escalar a tamaño de UI
-                    display_frame = cv2.resize(base_frame, (640, 480))
+                    view = self.pose_detector.get_latest_frame_view(require_result=False)
+                
+                if view is None:
+                    # Sin frame nuevo: la imagen mostrada sigue vigente
+                    if self.last_frame_from_worker is None:
+                        self._show_message_frame("Conectando...", (250, 240))
+                    return True
+                
+                # Copia completa del frame a un bytes, en BGR tal cual: la
+                # textura se crea en B8G8R8 y no hace falta convertir
+                pixels = view.to_bytes()
+                if pixels is None:
+                    # El worker reutilizó el slot durante la copia: descartar
+                    self.render_stats['discarded_frames'] += 1
+                    return True
+                frame_shape = view.frame.shape
+                self.render_stats['bytes_copied'] += view.bytes_copied
+                self.render_stats['frame_copies'] += 1
+                self.last_frame_from_worker = view.frame_counter
+                self._message_shown = None
+                
+                # Actualizar timestamp y estado si tenemos resultado válido
+                if fresh_result and current_pose_result.get('pose_detected'):
+                    self.last_pose_result = current_pose_result
+                    self.last_pose_timestamp = time.time()
+                
+                # Esqueletos vectoriales sobre la textura, con nivel de confianza
+                if self._update_skeleton_overlay(current_pose_result):
+                    self.pose_detector.timeline.mark('first_landmark_shown')
+                
+                # Si hay resultado de pose, añadir su estado
+                if current_pose_result:
+                    # Añadir texto de estado con información de confianza y persistencia
+                    confidence = current_pose_result.get('pose_confidence', 'unknown')
+                    frames_since = current_pose_result.get('frames_since_detection', 0)
                     
-                    # Si hay resultado de pose, procesar landmarks
-                    if current_pose_result:
-                        # Si hay landmarks y overlay habilitado, dibujar con nivel de confianza
-                        if (current_pose_result.get('pose_detected') and 
-                            current_pose_result.get('landmarks') and 
-                            self.overlay_enabled):
-                            confidence = current_pose_result.get('pose_confidence', 'high')
-                            display_frame = self._draw_pose_landmarks(display_frame, current_pose_result['landmarks'], confidence)
-                            
-                        # Añadir texto de estado con información de confianza y persistencia
-                        confidence = current_pose_result.get('pose_confidence', 'unknown')
-                        frames_since = current_pose_result.get('frames_since_detection', 0)
-                        
-                        if current_pose_result.get('pose_detected'):
-                            if confidence == 'high':
-                                status = "POSE DETECTADA"
-                                color = (0, 255, 0)  # Verde brillante para detección real
-                            elif confidence == 'interpolated':
-                                status = f"POSE TRACKING ({frames_since})"
-                                color = (0, 255, 255)  # Amarillo para interpolado reciente
-                            elif confidence == 'fading':
-                                status = f"POSE FADING ({frames_since})"
-                                color = (0, 150, 255)  # Naranja para pose antigua
-                            else:
-                                status = "POSE DETECTADA"
-                                color = (0, 200, 0)  # Verde más suave
+                    # Estado en el label superpuesto: el frame no se modifica
+                    if current_pose_result.get('pose_detected'):
+                        if confidence == 'high':
+                            status = "POSE DETECTADA"
+                            color = "#00ff00"  # Verde brillante para detección real
+                        elif confidence == 'interpolated':
+                            status = f"POSE TRACKING ({frames_since})"
+                            color = "#ffff00"  # Amarillo para interpolado reciente
+                        elif confidence == 'fading':
+                            status = f"POSE FADING ({frames_since})"
+                            color = "#ff9600"  # Naranja para pose antigua
                         else:
-                            status = "Sin pose"
-                            color = (0, 0, 255)  # Rojo
-                        
-                        cv2.putText(display_frame, status, (10, 30), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-                        
-                        # Emitir señal de pose detectada de forma asíncrona
-                        GLib.idle_add(self._emit_pose_signal, current_pose_result)
+                            status = "POSE DETECTADA"
+                            color = "#00c800"  # Verde más suave
                     else:
-                        # Sin resultado de pose, mostrar video en vivo
-                        cv2.putText(display_frame, "Video en vivo", (10, 30), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                        status = "Sin pose"
+                        color = "#ff0000"  # Rojo
                     
-                except Exception as e:
-                    print(f"Error procesando resultado: {e}")
-                    pass  # Ignorar errores para evitar bloqueos
-            
-            # Si no tenemos frame, mostrar mensaje de espera
-            if display_frame is None:
-                display_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-                cv2.putText(display_frame, "Esperando detector...", 
-                           (180, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-            
-            # Actualizar UI
-            self.update_video_display(display_frame)
+                    self._set_status(status, color)
+                    
+                    # Emitir señal de pose detectada solo para resultados nuevos
+                    if fresh_result:
+                        self._queue_pose_signal(current_pose_result)
+                else:
+                    # Sin resultado de pose, mostrar video en vivo
+                    self._set_status("Video en vivo", "#ffffff")
+                
+            except Exception as e:
+                print(f"Error procesando resultado: {e}")
+                return True  # Ignorar errores para evitar bloqueos
+            
+            # Actualizar UI: GLib.Bytes.new hace la segunda y última copia
+            self.update_video_display(pixels, frame_shape, Gdk.MemoryFormat.B8G8R8)
+            self.render_stats['bytes_uploaded'] += len(pixels)
+            self.render_stats['frame_copies'] += 1
+            self.render_stats['frames'] += 1
+            if self.render_stats['frames'] == 1:
+                self.pose_detector.timeline.mark('first_frame_shown')
+            
+            # Solo mostrar cada 300 frames para reducir overhead de I/O
+            if self.render_stats['frames'] % 300 == 0:
+                stats = self.get_render_stats()
+                print(f"Render: {stats['copies_per_frame']:.1f} copias completas/frame, "
+                      f"{stats['bytes_copied_per_frame']:.0f} B copiados/frame, "
+                      f"{stats['bytes_uploaded_per_frame']:.0f} B subidos/frame, "
+                      f"{stats['discarded_frames']} descartados, "
+                      f"{stats['collapsed_results']} resultados agrupados, "
+                      f"{stats['techniques']} técnicas analizadas")
             
         except Exception as e:
             print(f"Error en update_frame: {e}")
         
         return True  # Continuar el timer
     
+    def _set_status(self, text, color):
+        """Texto de estado sobre el video (solo si cambia)"""
+        markup = f'<span weight="bold" color="{color}">{text}</span>'
+        if markup != self._status_markup:
+            self._status_markup = markup
+            self.metrics_label.set_markup(markup)
+    
+    def _show_message_frame(self, text, origin):
+        """Muestra un frame negro con un mensaje (solo si cambia el mensaje)"""
+        if self._message_shown == text:
+            return
+        self.video_paintable.set_pose(None)
+        self._set_status("", "#ffffff")
+        message_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(message_frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self.update_video_display(message_frame.tobytes(), message_frame.shape)
+        self._message_shown = text
+    
+    def get_render_stats(self):
+        """Estadísticas del camino de render: copias completas y bytes por frame"""
+        frames = max(1, self.render_stats['frames'])
+        return dict(
+            self.render_stats,
+            copies_per_frame=self.render_stats['frame_copies'] / frames,
+            bytes_copied_per_frame=self.render_stats['bytes_copied'] / frames,
+            bytes_uploaded_per_frame=self.render_stats['bytes_uploaded'] / frames,
+        )
+    
+    def _queue_pose_signal(self, result):
+        """Encola el resultado para analizarlo; sustituye al pendiente si lo hay"""
+        if self._pending_pose_result is not None:
+            self.render_stats['collapsed_results'] += 1
+        else:
+            GLib.idle_add(self._emit_pending_pose_signal)
+        self._pending_pose_result = result
+    
+    def _emit_pending_pose_signal(self):
+        """Analiza y publica el resultado pendiente más reciente"""
+        result, self._pending_pose_result = self._pending_pose_result, None
+        if result is None:
+            return False
+        return self._emit_pose_signal(result)
+    
     def _emit_pose_signal(self, result):
         """Emite señal de pose de forma asíncrona"""
         try:
             self.emit('pose-detected', result)
+            frame_features = self.feature_cache.lookup(result)
+            self.recognize_stance(result, frame_features)
             
             # Analizar stance si corresponde
             if (result.get('pose_detected') and 
                 self.current_category == "stances" and 
-                result.get('landmarks')):
+                result.get('landmarks') is not None):
                 self.analyze_stance_from_landmarks(
                     result['landmarks'], 
-                    result['processed_frame']
+                    result.get('processed_frame'),
+                    frame_features
                 )
+            elif self.current_category in self.dynamic_analyzers:
+                self.analyze_dynamics_from_result(result)
+            elif self.current_category == "katas":
+                self.align_kata_from_result(result)
         except:
             pass  # Ignorar errores
         
         return False  # No repetir
     
-    def analyze_stance_from_landmarks(self, landmarks, frame):
-        """Analiza stance desde landmarks deserializados"""
+    def recognize_stance(self, result, frame_features=None):
+        """Reconoce el stance de la pose actual y lo publica si cambia"""
+        if frame_features is None:
+            landmarks = result.get('landmarks') if result.get('pose_detected') else None
+            recognition = self.stance_classifier.recognize(landmarks)
+        else:
+            # Puntuaciones de la detección; la histéresis avanza en cada resultado
+            classifier = self.stance_classifier
+            
+            def score():
+                points = frame_features.key_points
+                if points is None or points.ndim != 2:
+                    return None
+                return classifier.score_features(points, frame_features.stance_features)
+            
+            # Añadir referencias cambia los candidatos: forma parte de la clave
+            scores = frame_features.cached(('stance_scores', len(classifier.candidates)), score)
+            recognition = classifier.update(scores)
+        
+        # Solo se publica al cambiar el stance o su puntuación redondeada
+        published = (recognition['stance'], round(recognition['score']))
+        if published != self.last_recognition:
+            self.last_recognition = published
+            self.emit('stance-recognized', recognition)
+    
+    def analyze_dynamics_from_result(self, result):
+        """
+        Alimenta el segmentador y el analizador de la categoría actual
+        (golpes o patadas) y publica las métricas de cada técnica terminada
+        """
+        analyzer, label = self.dynamic_analyzers[self.current_category]
+        if not result.get('pose_detected') or result.get('landmarks') is None:
+            return
+        
+        # Entre inferencias el worker repite la última pose: solo cuentan
+        # las detecciones nuevas, con el timestamp de su propio frame
+        detection_frame = result.get('detection_frame', result.get('frame_id'))
+        if detection_frame == self.last_kinematics_frame:
+            return
+        self.last_kinematics_frame = detection_frame
+        
+        height, width = result.get('frame_shape', (480, 640))[:2]
+        analyzer.aspect_ratio = self.technique_segmenter.aspect_ratio = height / width
+        timestamp = result.get('detection_timestamp') or result.get('timestamp', time.time())
+        landmarks = result['landmarks']
+        # Sin filtro temporal el worker envía velocidad 0: el segmentador la estima
+        velocity = result.get('velocity')
+        if velocity is not None and not velocity.any():
+            velocity = None
+        
+        try:
+            analyzer.push(timestamp, landmarks)
+            segments = self.technique_segmenter.update(timestamp, landmarks, velocity,
+                                                       detection_frame)
+            for segment in segments:
+                for metrics in analyzer.analyze_segment(segment):
+                    metrics['segment'] = segment
+                    self.render_stats['techniques'] += 1
+                    self.emit('metrics-updated', metrics)
+        except Exception as e:
+            print(f"Error analizando {label}: {e}")
+    
+    def align_kata_from_result(self, result):
+        """Avanza el alineamiento de la kata y publica posición, retraso y costes"""
+        if (self.kata_aligner is None or not result.get('pose_detected') or
+                result.get('landmarks') is None):
+            return
+        
+        # Solo detecciones nuevas, como en los golpes
+        detection_frame = result.get('detection_frame', result.get('frame_id'))
+        if detection_frame == self.last_kata_frame:
+            return
+        self.last_kata_frame = detection_frame
+        
+        height, width = result.get('frame_shape', (480, 640))[:2]
+        self.kata_aligner.aspect_ratio = height / width
+        timestamp = result.get('detection_timestamp') or result.get('timestamp', time.time())
+        
+        try:
+            alignment = self.kata_aligner.update(timestamp, result['landmarks'])
+            if alignment is not None:
+                self.emit('metrics-updated', alignment)
+        except Exception as e:
+            print(f"Error alineando kata: {e}")
+    
+    def load_kata_reference(self, kata):
+        """Prepara el alineamiento de la kata si hay una ejecución de referencia grabada"""
+        self.kata_aligner = None
+        path = os.path.join(KATA_REFERENCE_DIRECTORY, f"{kata}.npz")
+        if not os.path.exists(path):
+            print(f"Sin referencia para la kata {kata} ({path})")
+            return
+        try:
+            self.kata_aligner = KataAligner(KataReference.load(path, kata))
+            print(f"Referencia de kata cargada: {kata} ({len(self.kata_aligner.reference)} frames)")
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error cargando referencia de kata {path}: {e}")
+    
+    def reset_kata_alignment(self):
+        """Vuelve al principio de la kata (al empezar una grabación)"""
+        if self.kata_aligner is not None:
+            self.kata_aligner.reset()
+        return False  # No repetir
+    
+    def analyze_stance_from_landmarks(self, landmarks, frame, frame_features=None):
+        """Analiza stance desde landmarks deserializados (array (33, 4))"""
         if self.current_category != "stances" or not self.current_technique:
             return
         
         try:
-            # Convertir landmarks de dict a objeto similar a MediaPipe
-            landmark_objects = []
-            for lm in landmarks:
-                # Crear objeto simple con las propiedades necesarias
-                class Landmark:
-                    def __init__(self, x, y, z, visibility):
-                        self.x = x
-                        self.y = y
-                        self.z = z
-                        self.visibility = visibility
-                
-                landmark_objects.append(Landmark(lm['x'], lm['y'], lm['z'], lm['visibility']))
-            
-            # Analizar stance
-            metrics = self.stance_analyzer.analyze_stance(
-                self.current_technique, 
-                landmark_objects
-            )
+            if frame_features is None:
+                # El analizador trabaja directamente sobre el array (33, 4)
+                metrics = self.stance_analyzer.analyze_stance(self.current_technique, landmarks)
+            else:
+                key = ('stance_metrics', self.current_technique)
+                if key in frame_features:
+                    return  # Pose repetida: sus métricas ya están publicadas
+                metrics = frame_features.cached(key, lambda: self.stance_analyzer.analyze_stance(
+                    self.current_technique, landmarks, frame_features.stance_features))
             
             if metrics:
-                print(f"Métricas calculadas: {metrics}")
+                # El panel limita su refresco y cuenta las actualizaciones
                 self.emit('metrics-updated', metrics)
                 
         except Exception as e:
@@ -370,247 +621,92 @@ class VideoWidget(Gtk.Box):
     def set_overlay_enabled(self, enabled):
         """Activa/desactiva el overlay de pose detection"""
         self.overlay_enabled = enabled
+        self._update_reference_overlay()
         print(f"Overlay: {'ON' if enabled else 'OFF'}")
     
-    def draw_metrics_overlay(self, frame, metrics):
-        """Dibuja métricas sobre el frame"""
-        if not metrics:
-            return frame
-        
-        y_offset = 30
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        
-        # Score general
-        if 'score' in metrics:
-            color = (0, 255, 0) if metrics['score'] >= 80 else (0, 255, 255) if metrics['score'] >= 60 else (0, 0, 255)
-            cv2.putText(frame, f"Score: {metrics['score']:.0f}/100", 
-                       (10, y_offset), font, 0.7, color, 2)
-            y_offset += 30
-        
-        # Feedback principal
-        if 'feedback' in metrics and metrics['feedback']:
-            feedback_text = metrics['feedback'][0]  # Primer feedback
-            cv2.putText(frame, feedback_text[:40], 
-                       (10, y_offset), font, 0.5, (0, 255, 255), 1)
-        
-        return frame
+    def _update_skeleton_overlay(self, result):
+        """
+        Pasa la pose del resultado al VideoPaintable.
+        Devuelve True si hay pose que dibujar.
+        """
+        points = None
+        if (self.overlay_enabled and result and result.get('pose_detected') and
+                result.get('landmarks') is not None):
+            # Puntos normalizados de la caché: GTK los escala al tamaño mostrado
+            points = self.feature_cache.lookup(result).overlay_points(0.3)
+        self.video_paintable.set_pose(points, (result or {}).get('pose_confidence', 'high'))
+        return points is not None
     
-    def _draw_pose_landmarks(self, frame, landmarks, confidence='high'):
-        """Dibuja landmarks de pose con efectos visuales basados en confianza"""
-        try:
-            height, width = frame.shape[:2]
-            
-            # Primero dibujar la referencia si está disponible y habilitada
-            if (self.reference_landmarks and self.show_reference_overlay and 
-                self.overlay_enabled):
-                frame = self._draw_reference_overlay(frame, self.reference_landmarks)
-            
-            # Ajustar opacidad y colores basado en confianza
-            if confidence == 'high':
-                alpha = 1.0
-                line_thickness = 3
-                point_radius_mult = 1.0
-            elif confidence == 'interpolated':
-                alpha = 0.8
-                line_thickness = 2
-                point_radius_mult = 0.9
-            elif confidence == 'fading':
-                alpha = 0.5
-                line_thickness = 2
-                point_radius_mult = 0.7
-            else:
-                alpha = 0.6
-                line_thickness = 2
-                point_radius_mult = 0.8
-            
-            # Preparar puntos para dibujo eficiente
-            points = []
-            for landmark in landmarks:
-                if landmark['visibility'] > 0.3:  # Umbral más bajo para más puntos
-                    x = int(landmark['x'] * width)
-                    y = int(landmark['y'] * height)
-                    points.append((x, y))
-                else:
-                    points.append(None)
-            
-            # Crear overlay para efectos de transparencia
-            overlay = frame.copy()
-            
-            # Dibujar puntos con colores ajustados por confianza
-            for i, point in enumerate(points):
-                if point:
-                    # Color basado en la importancia del landmark
-                    if i in [11, 12, 23, 24]:  # Torso - azul
-                        color = (255, 0, 0)
-                        radius = int(6 * point_radius_mult)
-                    elif i in [13, 14, 15, 16]:  # Brazos - verde
-                        color = (0, 255, 0)
-                        radius = int(5 * point_radius_mult)
-                    elif i in [25, 26, 27, 28]:  # Piernas - rojo
-                        color = (0, 0, 255)
-                        radius = int(5 * point_radius_mult)
-                    else:  # Otros - amarillo
-                        color = (0, 255, 255)
-                        radius = int(4 * point_radius_mult)
-                    
-                    cv2.circle(overlay, point, radius, color, -1)
-            
-            # Dibujar conexiones principales con grosor ajustado
-            important_connections = [
-                # Torso principal
-                (11, 12), (11, 23), (12, 24), (23, 24),
-                # Brazos principales  
-                (11, 13), (13, 15), (12, 14), (14, 16),
-                # Piernas principales
-                (23, 25), (25, 27), (24, 26), (26, 28),
-                # Cabeza principal
-                (0, 1), (1, 2), (2, 3), (0, 4), (4, 5), (5, 6)
-            ]
-            
-            for connection in important_connections:
-                if (connection[0] < len(points) and connection[1] < len(points) and
-                    points[connection[0]] and points[connection[1]]):
-                    cv2.line(overlay, points[connection[0]], points[connection[1]], 
-                            (0, 255, 255), line_thickness)  # Líneas amarillas
-            
-            # Aplicar overlay con transparencia
-            cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-            
-            return frame
-            
-        except Exception as e:
-            print(f"Error dibujando landmarks: {e}")
-            return frame  # Devolver frame original en caso de error
+    def _update_reference_overlay(self):
+        """
+        Pasa la referencia preparada al VideoPaintable, que graba su capa una
+        vez: solo se llama al cargar la referencia o al cambiar el overlay
+        """
+        points = None
+        if self.overlay_enabled and self.show_reference_overlay:
+            points = self.reference_points
+        self.video_paintable.set_reference(points)
+        self.reference_label.set_visible(points is not None)
     
-    def _draw_reference_overlay(self, frame, reference_landmarks):
-        """Dibuja la pose de referencia como overlay semitransparente"""
+    def _reference_points(self, reference_landmarks):
+        """
+        Puntos (x, y) normalizados de la referencia como array (N, 2), con
+        NaN en los no visibles, o None si no se puede dibujar
+        """
         try:
-            height, width = frame.shape[:2]
-            
-            # Crear overlay para la referencia
-            ref_overlay = frame.copy()
-            
-            # Manejar diferentes formatos de landmarks de referencia
-            points = []
-            
             # Si reference_landmarks es un diccionario (datos promedio o formato incorrecto)
             if isinstance(reference_landmarks, dict):
                 # Verificar si es un formato incorrecto (un solo landmark promedio)
                 if 'x' in reference_landmarks and 'y' in reference_landmarks:
                     print("Advertencia: Formato de referencia incorrecto detectado (landmarks promedio en lugar de lista)")
                     # No se puede dibujar un solo punto promedio, necesitamos 33 landmarks
-                    return frame
+                    return None
                 else:
                     # Convertir diccionario a lista de landmarks
-                    landmark_list = []
-                    # Asumiendo que las claves son índices de landmarks
-                    for key in sorted(reference_landmarks.keys()):
-                        if isinstance(key, str) and key.isdigit():
-                            landmark_list.append(reference_landmarks[key])
-                    reference_landmarks = landmark_list
+                    # Asumiendo que las claves son índices de landmarks (orden numérico)
+                    keys = [key for key in reference_landmarks
+                            if isinstance(key, str) and key.isdigit()]
+                    reference_landmarks = [reference_landmarks[key] for key in sorted(keys, key=int)]
             
             # Verificar que tenemos suficientes landmarks para dibujar
             if not reference_landmarks or len(reference_landmarks) < 10:
                 print(f"Advertencia: Insuficientes landmarks de referencia ({len(reference_landmarks) if reference_landmarks else 0})")
-                return frame
+                return None
             
-            # Procesar landmarks de referencia
+            points = np.full((len(reference_landmarks), 2), np.nan)
             for i, landmark in enumerate(reference_landmarks):
                 if isinstance(landmark, dict):
                     # Formato dict con x, y, z, visibility
                     if landmark.get('visibility', 0) > 0.5:
-                        x = int(landmark['x'] * width)
-                        y = int(landmark['y'] * height)
-                        points.append((x, y))
-                    else:
-                        points.append(None)
+                        points[i] = landmark['x'], landmark['y']
                 elif isinstance(landmark, (list, tuple)) and len(landmark) >= 2:
                     # Formato lista/tupla [x, y, ...]
-                    x = int(landmark[0] * width)
-                    y = int(landmark[1] * height)
-                    points.append((x, y))
-                else:
-                    points.append(None)
-            
-            # Dibujar puntos de referencia con colores distintivos (azules)
-            for i, point in enumerate(points):
-                if point:
-                    # Colores distintivos para la referencia en tonos azules
-                    if i in [11, 12, 23, 24]:  # Torso - azul claro
-                        color = (255, 150, 100)  # BGR: azul claro
-                        radius = 4
-                    elif i in [13, 14, 15, 16]:  # Brazos - azul
-                        color = (200, 100, 0)  # BGR: azul
-                        radius = 3
-                    elif i in [25, 26, 27, 28]:  # Piernas - azul oscuro
-                        color = (150, 50, 0)  # BGR: azul oscuro
-                        radius = 3
-                    else:  # Otros - azul suave
-                        color = (180, 120, 50)  # BGR: azul suave
-                        radius = 2
-                    
-                    cv2.circle(ref_overlay, point, radius, color, -1)
-            
-            # Dibujar conexiones de referencia
-            important_connections = [
-                # Torso principal
-                (11, 12), (11, 23), (12, 24), (23, 24),
-                # Brazos principales  
-                (11, 13), (13, 15), (12, 14), (14, 16),
-                # Piernas principales
-                (23, 25), (25, 27), (24, 26), (26, 28),
-                # Cabeza principal
-                (0, 1), (1, 2), (2, 3), (0, 4), (4, 5), (5, 6)
-            ]
-            
-            for connection in important_connections:
-                if (connection[0] < len(points) and connection[1] < len(points) and
-                    points[connection[0]] and points[connection[1]]):
-                    cv2.line(ref_overlay, points[connection[0]], points[connection[1]], 
-                            (200, 120, 50), 2)  # Líneas azules
-            
-            # Aplicar overlay de referencia con transparencia baja
-            cv2.addWeighted(ref_overlay, 0.3, frame, 0.7, 0, frame)
-            
-            # Agregar texto indicando que es la referencia
-            cv2.putText(frame, "REFERENCIA", (10, height - 20), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (200, 120, 50), 2)
-            
-            return frame
+                    points[i] = landmark[0], landmark[1]
+            return points
             
         except Exception as e:
-            print(f"Error dibujando overlay de referencia: {e}")
-            return frame
+            print(f"Error preparando overlay de referencia: {e}")
+            return None
     
-    def update_video_display(self, frame):
-        """Actualiza la imagen mostrada en la UI"""
+    def update_video_display(self, pixels, shape, memory_format=Gdk.MemoryFormat.R8G8B8):
+        """
+        Actualiza la imagen mostrada en la UI. pixels es un bytes con el
+        frame contiguo de forma shape (alto, ancho, canales).
+        """
         try:
-            # Convertir BGR a RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Asegurar que el frame sea contiguo en memoria
-            rgb_frame = np.ascontiguousarray(rgb_frame)
-            
-            # Crear GdkPixbuf con datos copiados
-            height, width, channels = rgb_frame.shape
-            
-            # Crear una copia de los datos para evitar problemas de threading
-            data = rgb_frame.copy().tobytes()
-            
-            pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-                data,
-                GdkPixbuf.Colorspace.RGB,
-                False,
-                8,
-                width,
-                height,
-                width * channels
-            )
+            height, width, channels = shape
+            
+            # GLib.Bytes.new copia los píxeles a memoria de GLib: es la copia
+            # de entrega a GTK, que se cuenta aparte. pixels ya es un bytes,
+            # así que no hay serialización adicional aquí
+            data = GLib.Bytes.new(pixels)
             
-            # Actualizar en el hilo principal de GTK
-            if pixbuf:
-                texture = Gdk.Texture.new_for_pixbuf(pixbuf)
-                self.video_image.set_paintable(texture)
+            # La textura usa el GBytes tal cual: sin GdkPixbuf intermedio.
+            # Los esqueletos se dibujan encima en el snapshot (VideoPaintable)
+            texture = Gdk.MemoryTexture.new(
+                width, height, memory_format, data, width * channels
+            )
+            self.video_paintable.set_texture(texture)
             
         except Exception as e:
             print(f"Error actualizando display: {e}")
@@ -620,6 +716,8 @@ class VideoWidget(Gtk.Box):
         self.current_category = category
         self.current_technique = technique
         print(f"Técnica activa establecida: {category} -> {technique}")
+        if category == "katas":
+            self.load_kata_reference(technique)
 
     def set_active_reference(self, reference):
         """Establece la referencia activa desde el ControlPanel"""
@@ -641,8 +739,8 @@ class VideoWidget(Gtk.Box):
             # Capturar 3 imágenes consecutivas
             captured_landmarks = []
             for _ in range(3):
-                if self.last_pose_result:
-                    captured_landmarks.append(self.last_pose_result['landmarks'])
+                if self.last_pose_result and self.last_pose_result.get('landmarks') is not None:
+                    captured_landmarks.append(self.last_pose_result['landmarks'].copy())
                 time.sleep(0.1)  # Pausa breve entre capturas
 
             # Calcular promedio de landmarks
@@ -654,50 +752,18 @@ class VideoWidget(Gtk.Box):
         threading.Thread(target=capture_thread, daemon=True).start()
 
     def calculate_average_landmarks(self, landmarks_list):
-        """Calcula el promedio de una lista de landmarks"""
-        import numpy as np
-
+        """Calcula el promedio de una lista de arrays de landmarks (33, 4)"""
         # Verificar que landmarks_list no esté vacío
         if not landmarks_list:
             raise ValueError("La lista de landmarks está vacía")
 
-        # Cada elemento en landmarks_list debería ser una lista de 33 landmarks
-        if not landmarks_list[0] or len(landmarks_list[0]) == 0:
+        # Cada elemento en landmarks_list debería ser un array de 33 landmarks
+        if len(landmarks_list[0]) == 0:
             raise ValueError("Los landmarks están vacíos")
 
-        num_landmarks = len(landmarks_list[0])  # Debería ser 33
-        num_captures = len(landmarks_list)
-        
-        # Inicializar arrays para promediar
-        averaged_landmarks = []
-        
-        # Calcular promedio para cada landmark (0-32)
-        for landmark_idx in range(num_landmarks):
-            x_values = []
-            y_values = []
-            z_values = []
-            visibility_values = []
-            
-            # Recopilar valores de todas las capturas para este landmark
-            for capture_landmarks in landmarks_list:
-                if landmark_idx < len(capture_landmarks):
-                    landmark = capture_landmarks[landmark_idx]
-                    x_values.append(landmark['x'])
-                    y_values.append(landmark['y'])
-                    z_values.append(landmark['z'])
-                    visibility_values.append(landmark['visibility'])
-            
-            # Calcular promedios
-            avg_landmark = {
-                'x': np.mean(x_values),
-                'y': np.mean(y_values),
-                'z': np.mean(z_values),
-                'visibility': np.mean(visibility_values)
-            }
-            
-            averaged_landmarks.append(avg_landmark)
-        
-        return averaged_landmarks
+        # Promediar todas las capturas de una vez y volver al formato JSON de referencias
+        averaged = np.mean(np.stack(landmarks_list), axis=0)
+        return array_to_landmarks(averaged)
 
     def save_captured_data(self, averaged_landmarks):
         """Guarda los landmarks promedio y metadatos en un archivo JSON"""
@@ -724,6 +790,16 @@ class VideoWidget(Gtk.Box):
             json.dump(data, f, indent=4)
 
         print(f"Datos capturados guardados en {filename}")
+        
+        # La captura pasa a ser referencia del reconocimiento de stances
+        if self.current_category == "stances":
+            GLib.idle_add(self._add_stance_reference, self.current_technique, averaged_landmarks)
+    
+    def _add_stance_reference(self, technique, landmarks):
+        """Añade una referencia al clasificador de stances desde el hilo de GTK"""
+        if self.stance_classifier.add_reference(technique, landmarks):
+            print(f"Referencia de '{technique}' añadida al reconocimiento de stances")
+        return False  # No repetir
     
     def start_recording(self, countdown, duration):
         """Inicia grabación de kata/técnica con countdown"""
@@ -737,6 +813,7 @@ class VideoWidget(Gtk.Box):
             
             GLib.idle_add(self.hide_countdown)
             GLib.idle_add(self.show_recording_indicator)
+            GLib.idle_add(self.reset_kata_alignment)
             
             # Grabar por duration segundos
             self.recording = True
@@ -775,6 +852,17 @@ class VideoWidget(Gtk.Box):
         """Limpia recursos al cerrar"""
         self.running = False
         
+        # Dejar de vigilar el pipe antes de que el detector lo cierre
+        if self._notify_source is not None:
+            GLib.source_remove(self._notify_source)
+            self._notify_source = None
+        if self._poll_source is not None:
+            GLib.source_remove(self._poll_source)
+            self._poll_source = None
+        if self._tick_id is not None:
+            self.video_image.remove_tick_callback(self._tick_id)
+            self._tick_id = None
+        
         # Detener el proceso de pose detection
         if self.pose_detector:
             self.pose_detector.stop()
@@ -820,11 +908,17 @@ class VideoWidget(Gtk.Box):
         try:
             self.reference_data = reference_data
             self.reference_landmarks = reference_data.get('landmarks', [])
+            # Formato resuelto una sola vez: la capa se graba al dibujarla
+            self.reference_points = self._reference_points(self.reference_landmarks)
+            self._update_reference_overlay()
             
             technique = reference_data.get('technique', 'Desconocida')
             timestamp = reference_data.get('timestamp', 'Desconocido')
             
             print(f"Referencia cargada: {technique} (capturada: {timestamp})")
+            
+            if reference_data.get('category', 'stances') == 'stances':
+                self._add_stance_reference(technique, self.reference_landmarks)
             print(f"Landmarks de referencia: {len(self.reference_landmarks) if isinstance(self.reference_landmarks, list) else 'datos de landmarks disponibles'}")
             
             # Si la referencia no coincide con la técnica actual, mostrar advertencia
@@ -835,5 +929,7 @@ class VideoWidget(Gtk.Box):
             print(f"Error cargando datos de referencia: {e}")
             self.reference_data = None
             self.reference_landmarks = None
+            self.reference_points = None
+            self._update_reference_overlay()
 # Registrar el tipo para señales
 GObject.type_register(VideoWidget)